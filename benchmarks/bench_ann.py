@@ -0,0 +1,152 @@
+"""
+Benchmark recall / latenta pentru IVFPQIndex (src/ann_index.py) fata de cautarea exacta.
+
+Date sintetice: un amestec de clustere gaussiene (ca embeddings-urile tile-urilor, grupate pe
+tipuri de teren), query-uri = puncte din date cu zgomot. Pentru fiecare nprobe (cu si fara
+refine exact) raporteaza recall@k fata de vecinii exacti si percentilele latentei per query.
+
+    python -m benchmarks.bench_ann --n 200000 --dim 256 --nlist 1024 --m 32
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from benchmarks.common import PERCENTILES, RESULTS_DIR, git_commit, peak_rss_mb
+from src.ann_index import IVFPQIndex
+
+
+def clustered_vectors(
+    n: int, dim: int, clusters: int = 200, intrinsic_dim: int = 16, seed: int = 0
+) -> np.ndarray:
+    """
+    Gaussian clusters in a random intrinsic_dim subspace of dim, plus a little isotropic noise:
+    like real embeddings, the data has far fewer degrees of freedom than dimensions.
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(intrinsic_dim, dim)).astype(np.float32)
+    centers = rng.normal(size=(clusters, intrinsic_dim)).astype(np.float32) * 3
+    latent = centers[rng.integers(0, clusters, n)] + rng.normal(size=(n, intrinsic_dim)).astype(np.float32)
+    return latent @ basis + 0.1 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def exact_search(data: np.ndarray, queries: np.ndarray, k: int, metric: str, chunk: int = 65536):
+    """Brute force top-k ids (Q, k), scanning data in chunks with one matmul per chunk."""
+    if metric == "cosine":
+        data = data / np.linalg.norm(data, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    q = torch.from_numpy(queries)
+    best_dist = torch.full((len(q), k), float("inf"))
+    best_ids = torch.full((len(q), k), -1, dtype=torch.int64)
+    for s in range(0, len(data), chunk):
+        block = torch.from_numpy(data[s : s + chunk])
+        dist = (block * block).sum(1)[None, :] - 2 * q @ block.T
+        ids = torch.arange(s, s + len(block)).expand(len(q), -1)
+        dist = torch.cat([best_dist, dist], 1)
+        ids = torch.cat([best_ids, ids], 1)
+        best_dist, pos = dist.topk(k, dim=1, largest=False)
+        best_ids = ids.gather(1, pos)
+    return best_ids.numpy()
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    ms = np.asarray(latencies) * 1000
+    result = {f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES}
+    result["mean_ms"] = float(ms.mean())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--m", type=int, default=32)
+    parser.add_argument("--pca-dim", type=int, default=None)
+    parser.add_argument("--metric", choices=("l2", "cosine"), default="cosine")
+    parser.add_argument("--train-size", type=int, default=50_000)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--output", type=Path, default=None, help="default: benchmarks/results/ann_<timestamp>.json")
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = data[rng.integers(0, args.n, args.queries)] + rng.normal(
+        scale=0.1, size=(args.queries, args.dim)
+    ).astype(np.float32)
+
+    start = time.perf_counter()
+    truth = exact_search(data, queries, args.k, args.metric)
+    exact_seconds = (time.perf_counter() - start) / args.queries
+    print(f"exact: {exact_seconds * 1000:.2f} ms/query")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        index = IVFPQIndex(tmp, nlist=args.nlist, m=args.m, metric=args.metric, pca_dim=args.pca_dim)
+        start = time.perf_counter()
+        index.train(data[rng.choice(args.n, min(args.train_size, args.n), replace=False)])
+        train_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for s in range(0, args.n, 65536):
+            index.add(data[s : s + 65536])
+        add_seconds = time.perf_counter() - start
+        print(f"train {train_seconds:.1f}s, add {add_seconds:.1f}s ({args.n / add_seconds:.0f} vectors/s)")
+
+        # reincarcat de pe disc, ca in productie (memmap)
+        index = IVFPQIndex(tmp)
+        index.search(queries[:1], args.k)  # construieste listele inversate, netemporizat
+        for nprobe in args.nprobe:
+            for refine in (None, data):
+                found, latencies = [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    _, ids = index.search(query[None], args.k, nprobe, refine=refine)
+                    latencies.append(time.perf_counter() - start)
+                    found.append(ids[0])
+                result = {
+                    "nprobe": nprobe,
+                    "refine": refine is not None,
+                    "recall_at_k": recall_at_k(np.stack(found), truth),
+                    **latency_summary(latencies),
+                }
+                result["speedup_vs_exact"] = exact_seconds * 1000 / result["mean_ms"]
+                results.append(result)
+                print(
+                    f"nprobe={nprobe:>4} refine={result['refine']!s:>5}: recall@{args.k} "
+                    f"{result['recall_at_k']:.3f}, p50 {result['p50_ms']:.2f} ms, "
+                    f"p99 {result['p99_ms']:.2f} ms, x{result['speedup_vs_exact']:.1f} vs exact"
+                )
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "config": vars(args) | {"output": None},
+        "exact_ms_per_query": exact_seconds * 1000,
+        "train_seconds": train_seconds,
+        "add_vectors_per_second": args.n / add_seconds,
+        "bytes_per_vector": args.m + 8 + 4,  # cod PQ + id + lista
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    output = args.output or RESULTS_DIR / f"ann_{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
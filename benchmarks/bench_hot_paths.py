@@ -0,0 +1,252 @@
+"""
+Benchmark pentru caile critice: tiling, normalizare, inferenta backbone si
+integrate_and_infer cap-coada.
+
+Ruleaza pe scene sintetice (dimensiune si numar de canale configurabile), fara retea si
+fara weights: implicit foloseste StubBackbone, un FPN mic cu aceeasi forma a iesirii ca
+backbone-ul Satlas (lista de 4 feature maps). Cu --backbone satlas se incarca modelul real.
+
+Raporteaza tiles/s, percentilele latentei si memoria (RSS curent, esantionat) pe fiecare etapa,
+si salveaza rezultatul ca JSON (benchmarks/results/) ca rulari diferite sa poata fi comparate:
+
+    python -m benchmarks.bench_hot_paths --height 4096 --width 4096 --channels 3
+    python -m benchmarks.bench_hot_paths --compare benchmarks/results/<vechi>.json
+"""
+
+import argparse
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from src.feature_extractor import (
+    DEFAULT_BATCH_SIZE,
+    get_cached_backbone,
+    infer_batches,
+    integrate_and_infer,
+)
+from src.transformation import (
+    TARGET_PATCH_SIZE,
+    BatchNormalizer,
+    tile_image,
+    tile_image_stack,
+    transform_for_inference,
+)
+
+from benchmarks.common import PERCENTILES, RESULTS_DIR, current_rss_mb, git_commit, peak_rss_mb
+
+
+class StubBackbone(torch.nn.Module):
+    """Small stand-in for the Satlas FPN backbone: 4 feature maps at strides 4, 8, 16, 32."""
+
+    def __init__(self, in_channels: int = 3, width: int = 16):
+        super().__init__()
+        self.stem = torch.nn.Conv2d(in_channels, width, kernel_size=4, stride=4)
+        self.stages = torch.nn.ModuleList(
+            torch.nn.Conv2d(width, width, kernel_size=3, stride=2, padding=1) for _ in range(3)
+        )
+
+    def forward(self, x):
+        x = torch.relu(self.stem(x))
+        features = [x]
+        for stage in self.stages:
+            x = torch.relu(stage(x))
+            features.append(x)
+        return features
+
+
+def synthetic_scene(height: int, width: int, channels: int, seed: int = 0) -> np.ndarray:
+    """Random uint8 scene (H, W, C) with a block of zeros, like the no-data borders of real scenes."""
+    rng = np.random.default_rng(seed)
+    scene = rng.integers(0, 256, size=(height, width, channels), dtype=np.uint8)
+    scene[: height // 8] = 0
+    return scene
+
+
+class StageTimer:
+    """
+    Latencies of one stage and its memory: current RSS sampled before the stage and after
+    every call (the lifetime ru_maxrss would only ever show the heaviest stage so far).
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.rss_start_mb = self.rss_peak_mb = current_rss_mb()
+
+    def call(self, fn, *args):
+        start = time.perf_counter()
+        out = fn(*args)
+        self.latencies.append(time.perf_counter() - start)
+        self.rss_peak_mb = max(self.rss_peak_mb, current_rss_mb())
+        return out
+
+    def summary(self, items: int) -> dict:
+        """Latency percentiles (ms), throughput in items (tiles) per second and RSS of the stage."""
+        latencies_ms = np.asarray(self.latencies) * 1000
+        result = {f"p{p}_ms": float(np.percentile(latencies_ms, p)) for p in PERCENTILES}
+        result["mean_ms"] = float(latencies_ms.mean())
+        result["calls"] = len(self.latencies)
+        total = float(np.sum(self.latencies))
+        result["tiles_per_second"] = items / total if total else 0.0
+        result["rss_peak_mb"] = self.rss_peak_mb
+        result["rss_growth_mb"] = self.rss_peak_mb - self.rss_start_mb
+        return result
+
+
+def run_benchmarks(
+    scene: np.ndarray,
+    model,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    stride: int | None = None,
+    repeats: int = 5,
+) -> dict:
+    tiles, _ = tile_image_stack(scene, stride=stride)
+    n_tiles = len(tiles)
+    results = {}
+
+    # tiling: o scena per apel, cu tile-urile materializate (TileStack singur e doar un view)
+    timer = StageTimer()
+    for _ in range(repeats):
+        timer.call(lambda: np.asarray(tile_image_stack(scene, stride=stride)[0]))
+    results["tile_image_stack"] = timer.summary(n_tiles * repeats)
+
+    def consume_generator():
+        for _ in tile_image(scene, stride=stride):
+            pass
+
+    timer = StageTimer()
+    for _ in range(repeats):
+        timer.call(consume_generator)
+    results["tile_image"] = timer.summary(n_tiles * repeats)
+
+    # normalizare si forward: un batch per apel
+    batches = [tiles[s : s + batch_size] for s in range(0, n_tiles, batch_size)]
+    timer = StageTimer()
+    for _ in range(repeats):
+        normalized = [
+            timer.call(lambda p: torch.cat([transform_for_inference(tile) for tile in p]), patches)
+            for patches in batches
+        ]
+    results["transform_for_inference"] = timer.summary(n_tiles * repeats)
+
+    normalizer = BatchNormalizer()
+    timer = StageTimer()
+    for _ in range(repeats):
+        for patches in batches:
+            timer.call(normalizer, patches)
+    results["batch_normalizer"] = timer.summary(n_tiles * repeats)
+
+    with torch.inference_mode():
+        model(normalized[0])  # incalzire, netemporizata
+        timer = StageTimer()
+        for _ in range(repeats):
+            for batch in normalized:
+                timer.call(model, batch)
+    results["backbone_forward"] = timer.summary(n_tiles * repeats)
+
+    # cap-coada
+    def consume_batches():
+        for _ in infer_batches(scene, model, batch_size, stride=stride):
+            pass
+
+    timer = StageTimer()
+    for _ in range(repeats):
+        timer.call(consume_batches)
+    results["infer_batches"] = timer.summary(n_tiles * repeats)
+
+    timer = StageTimer()
+    for _ in range(repeats):
+        timer.call(lambda: integrate_and_infer(scene, batch_size, stride=stride, model=model))
+    results["integrate_and_infer"] = timer.summary(n_tiles * repeats)
+    return results
+
+
+def compare(current: dict, previous: dict):
+    """Prints the tiles/sec and p50 change of every stage present in both runs."""
+    print(f"\nvs {previous.get('commit')} ({previous.get('timestamp')}):")
+    for stage, result in current["results"].items():
+        old = previous.get("results", {}).get(stage)
+        if old is None:
+            continue
+        speedup = result["tiles_per_second"] / old["tiles_per_second"] if old["tiles_per_second"] else 0.0
+        print(
+            f"  {stage:>24}: x{speedup:.2f} tiles/s, "
+            f"p50 {old['p50_ms']:.2f} -> {result['p50_ms']:.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--stride", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--backbone", choices=("stub", "satlas"), default="stub")
+    parser.add_argument("--output", type=Path, default=None, help="default: benchmarks/results/<timestamp>.json")
+    parser.add_argument("--compare", type=Path, default=None, help="previous JSON result to compare against")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.backbone == "satlas":
+        model = get_cached_backbone()
+        if model is None:
+            raise SystemExit("Could not load the Satlas backbone")
+    else:
+        model = StubBackbone(args.channels).eval()
+
+    scene = synthetic_scene(args.height, args.width, args.channels)
+    results = run_benchmarks(scene, model, args.batch_size, args.stride, args.repeats)
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "config": {
+            "height": args.height,
+            "width": args.width,
+            "channels": args.channels,
+            "patch_size": TARGET_PATCH_SIZE,
+            "stride": args.stride,
+            "batch_size": args.batch_size,
+            "repeats": args.repeats,
+            "backbone": args.backbone,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "numpy": np.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    for stage, result in results.items():
+        print(
+            f"{stage:>24}: {result['tiles_per_second']:10.1f} tiles/s  "
+            f"p50 {result['p50_ms']:8.2f} ms  p90 {result['p90_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms  RSS +{result['rss_growth_mb']:6.0f} MB"
+        )
+    print(f"peak RSS: {report['peak_rss_mb']:.0f} MB")
+
+    output = args.output or RESULTS_DIR / f"{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved {output}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Utilitare comune benchmark-urilor (fara dependinte grele, doar stdlib): directorul de
+rezultate, percentilele raportate, commit-ul curent si memoria (RSS).
+"""
+
+import os
+import resource
+import subprocess
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+PERCENTILES = (50, 90, 99)
+
+
+def peak_rss_mb() -> float:
+    """Lifetime peak RSS of the process (MB): only meaningful for the whole run, never goes down."""
+    # ru_maxrss e in KB pe Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident memory of the process (MB); peak_rss_mb() where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -7,7 +7,11 @@ cod pentru a lua o imagine din satelit si a o aduce
 in formatul respectiv (transformarea bounding box-urilor)
 """
 
+import hashlib
+import json
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # mapare clase din xml -> id numeric
@@ -32,60 +36,201 @@ def convert_bbox_to_yolo(xmin, ymin, xmax, ymax, img_w, img_h):
     return x_c / img_w, y_c / img_h, w / img_w, h / img_h
 
 
-def convert_xml_to_yolo(xml_path: Path, labels_out_dir: Path):
+def parse_voc_xml(xml_path: Path):
+    """
+    citeste un xml voc in streaming (iterparse), fara sa tina tot arborele in memorie
+    intoarce (filename, img_w, img_h, [(class_name, xmin, ymin, xmax, ymax), ...])
+    """
+    filename = None
+    img_w = img_h = None
+    objects = []
+
+    for _, elem in ET.iterparse(xml_path, events=("end",)):
+        tag = elem.tag
+        if tag == "filename":
+            filename = elem.text
+        elif tag == "size":
+            img_w = int(elem.find("width").text)
+            img_h = int(elem.find("height").text)
+        elif tag == "object":
+            bbox = elem.find("bndbox")
+            objects.append(
+                (
+                    elem.find("name").text,
+                    float(bbox.find("xmin").text),
+                    float(bbox.find("ymin").text),
+                    float(bbox.find("xmax").text),
+                    float(bbox.find("ymax").text),
+                )
+            )
+            elem.clear()  # eliberam obiectul deja citit
+
+    return filename, img_w, img_h, objects
+
+
+def convert_xml_to_yolo(xml_path: Path, labels_out_dir: Path, write: bool = True):
     """
     converteste un singur fisier xml voc in fisier txt yolo
+    intoarce numarul de obiecte pe clasa (doar clasele cunoscute)
     """
+    _, class_counts = _convert(xml_path, labels_out_dir, write)
+    return class_counts
 
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
 
-    # citim numele imaginii
-    filename = root.find("filename").text
-    txt_name = filename.replace(".jpg", ".txt").replace(".png", ".txt")
+def _convert(xml_path: Path, labels_out_dir: Path, write: bool):
+    # ca convert_xml_to_yolo, dar intoarce si (txt_name, marimea txt-ului scris) pentru manifest
 
-    # citim dimensiunea imaginii din tagul <size>
-    size = root.find("size")
-    img_w = int(size.find("width").text)
-    img_h = int(size.find("height").text)
+    # citim numele imaginii, dimensiunea (tagul <size>) si obiectele
+    filename, img_w, img_h, objects = parse_voc_xml(xml_path)
+    txt_name = filename.replace(".jpg", ".txt").replace(".png", ".txt")
 
     yolo_lines = []
+    class_counts = {}
 
-    for obj in root.findall("object"):
-        class_name = obj.find("name").text
-
+    for class_name, xmin, ymin, xmax, ymax in objects:
         # ignoram obiectele cu clasa necunoscuta
         if class_name not in CLASS_TO_ID:
             continue
 
         class_id = CLASS_TO_ID[class_name]
-
-        bbox = obj.find("bndbox")
-        xmin = float(bbox.find("xmin").text)
-        ymin = float(bbox.find("ymin").text)
-        xmax = float(bbox.find("xmax").text)
-        ymax = float(bbox.find("ymax").text)
+        class_counts[class_name] = class_counts.get(class_name, 0) + 1
 
         x_c, y_c, w, h = convert_bbox_to_yolo(xmin, ymin, xmax, ymax, img_w, img_h)
         yolo_lines.append(f"{class_id} {x_c:.6f} {y_c:.6f} {w:.6f} {h:.6f}")
 
-    labels_out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = labels_out_dir / txt_name
-    out_path.write_text("\n".join(yolo_lines), encoding="utf-8")
+    if write:
+        labels_out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = labels_out_dir / txt_name
+        out_path.write_text("\n".join(yolo_lines), encoding="utf-8")
+
+    output = {"name": txt_name, "size": len("\n".join(yolo_lines).encode("utf-8"))}
+    return output, class_counts
+
+
+MANIFEST_NAME = ".manifest.json"
+
 
+def _file_hash(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
 
-def batch_convert(xml_folder: Path, labels_out_dir: Path):
+
+def _convert_one(args):
+    # ruleaza in procesele din pool; intoarce tot ce trebuie pus in manifest
+    xml_file, labels_out_dir, write = args
+    stat = xml_file.stat()
+    output, class_counts = _convert(xml_file, labels_out_dir, write)
+    return xml_file.name, {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": _file_hash(xml_file),
+        "output": output,
+        "classes": class_counts,
+    }
+
+
+def _output_ok(entry: dict, labels_out_dir: Path) -> bool:
+    # txt-ul generat trebuie sa existe inca si sa aiba marimea scrisa (altfel il regeneram)
+    output = entry.get("output")
+    if output is None:
+        return False  # manifest vechi, fara numele txt-ului
+    path = labels_out_dir / output["name"]
+    return path.is_file() and path.stat().st_size == output["size"]
+
+
+def _load_manifest(labels_out_dir: Path) -> dict:
+    path = labels_out_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+
+def batch_convert(
+    xml_folder: Path,
+    labels_out_dir: Path,
+    workers: int | None = 1,
+    incremental: bool = True,
+    dry_run: bool = False,
+):
     """
     converteste toate fisierele xml dintr-un folder in yolo
+
+    workers: numarul de procese (None = toate nucleele, 1 = fara pool)
+    incremental: sarim fisierele neschimbate fata de manifest (mtime + marime, apoi sha1) al caror
+                 txt exista inca; txt-urile xml-urilor sterse din sursa sunt sterse si ele
+    dry_run: parseaza si aduna statistici, dar nu scrie nimic pe disc
+    intoarce un dict cu statistici (fisiere convertite / sarite, obiecte pe clasa, fisiere/s)
     """
     xml_folder = Path(xml_folder)
     labels_out_dir = Path(labels_out_dir)
-    labels_out_dir.mkdir(parents=True, exist_ok=True)
-
-    for xml_file in xml_folder.glob("*.xml"):
-        convert_xml_to_yolo(xml_file, labels_out_dir)
-
-    print(f"[ok] conversie finalizata pentru {xml_folder} -> {labels_out_dir}")
+    if not dry_run:
+        labels_out_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    old_manifest = _load_manifest(labels_out_dir) if incremental else {}
+    manifest = {}
+    todo = []
+
+    xml_files = sorted(xml_folder.glob("*.xml"))
+    for xml_file in xml_files:
+        entry = old_manifest.get(xml_file.name)
+        if entry is not None and _output_ok(entry, labels_out_dir):
+            stat = xml_file.stat()
+            unchanged = entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+            # mtime schimbat (ex. copiere) dar acelasi continut -> tot sarim
+            if not unchanged and entry["size"] == stat.st_size:
+                unchanged = entry["sha1"] == _file_hash(xml_file)
+                if unchanged:
+                    entry = {**entry, "mtime_ns": stat.st_mtime_ns}
+            if unchanged:
+                manifest[xml_file.name] = entry
+                continue
+        todo.append((xml_file, labels_out_dir, not dry_run))
+
+    # xml-uri disparute din sursa -> stergem si txt-ul lor
+    source_names = {xml_file.name for xml_file in xml_files}
+    removed = [entry for name, entry in old_manifest.items() if name not in source_names]
+    if not dry_run:
+        for entry in removed:
+            if entry.get("output"):
+                (labels_out_dir / entry["output"]["name"]).unlink(missing_ok=True)
+
+    if workers == 1 or len(todo) < 2:
+        for name, entry in map(_convert_one, todo):
+            manifest[name] = entry
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for name, entry in pool.map(_convert_one, todo, chunksize=64):
+                manifest[name] = entry
+
+    if not dry_run:
+        (labels_out_dir / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+
+    elapsed = time.perf_counter() - start
+    class_totals = {name: 0 for name in CLASS_TO_ID}
+    for entry in manifest.values():
+        for class_name, count in entry["classes"].items():
+            class_totals[class_name] += count
+
+    stats = {
+        "converted": len(todo),
+        "skipped": len(manifest) - len(todo),
+        "removed": len(removed),
+        "seconds": elapsed,
+        "files_per_second": len(todo) / elapsed if elapsed else 0.0,
+        "class_counts": class_totals,
+    }
+
+    prefix = "[dry-run]" if dry_run else "[ok]"
+    print(
+        f"{prefix} conversie finalizata pentru {xml_folder} -> {labels_out_dir}: "
+        f"{stats['converted']} convertite, {stats['skipped']} sarite, {stats['removed']} sterse, "
+        f"{elapsed:.2f}s ({stats['files_per_second']:.0f} fisiere/s)"
+    )
+    print(f"{prefix} obiecte pe clasa: {class_totals}")
+    return stats
 
 
 if __name__ == "__main__":
@@ -94,4 +239,4 @@ if __name__ == "__main__":
     xml_dir = Path(r"D:\sateliti\MVRSD_dataset\data\labels\train\xml")
     labels_out = Path(r"D:\sateliti\MVRSD_dataset\data_transf\labels\train")
 
-    batch_convert(xml_dir, labels_out)
+    batch_convert(xml_dir, labels_out, workers=None)
@@ -0,0 +1,453 @@
+# src/ann_index.py
+"""
+Index aproximativ de vecini apropiati (ANN) peste embeddings de tile-uri: IVF + PQ.
+
+  - IVF: k-means grosier cu nlist centroizi; fiecare vector intra in lista centroidului cel mai
+    apropiat, iar o cautare verifica doar cele mai apropiate nprobe liste
+  - PQ: reziduul (vector - centroid) e impartit in m sub-vectori, fiecare codat pe un octet
+    (256 de centroizi per sub-spatiu) -> un vector de D float-uri devine m octeti
+  - distanta aproximativa (ADC): pentru fiecare lista vizitata se calculeaza o tabela (m, 256)
+    de distante query -> centroizi PQ, iar distanta unui candidat e suma a m valori din tabela
+  - optional, candidatii sunt reordonati cu distanta exacta (refine) pe vectorii originali
+    (de ex. EmbeddingStore.matrix(), memmap)
+
+Pe disc (root/): meta.json, quantizers.npz (PCA optional, centroizi, codebook-uri) si fisierele
+append-only codes.bin (N, m) uint8, ids.bin (N,) int64, lists.bin (N,) int32, citite cu np.memmap.
+Listele inversate sunt tot pe disc: ivf.<generatie>.{codes,ids}.bin contin primele sorted_count
+randuri ordonate pe liste (ivf.<generatie>.offsets.npy = inceputul fiecarei liste), iar cautarea
+citeste din memmap doar listele vizitate. Randurile adaugate dupa (coada) sunt grupate in memorie;
+cand coada trece de MERGE_TAIL_ROWS e interclasata intr-o generatie noua.
+Ca la EmbeddingStore, meta.json e scris ultimul, deci un add intrerupt nu corupe indexul.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import torch
+
+DEFAULT_INDEX_DIR = Path("dataset") / "ann"
+METRICS = ("l2", "cosine")
+KSUB = 256  # centroizi per sub-spatiu PQ (coduri pe un octet)
+MERGE_TAIL_ROWS = int(os.getenv("ANN_MERGE_TAIL_ROWS", 1 << 18))  # coada maxima tinuta in memorie
+MERGE_CHUNK_ROWS = 1 << 20  # randuri mutate odata la interclasare
+
+
+def _nearest(x: torch.Tensor, centroids: torch.Tensor, chunk: int = 65536) -> torch.Tensor:
+    """Index of the nearest centroid of every row of x (squared L2), in chunks."""
+    c_norms = (centroids * centroids).sum(1)
+    out = torch.empty(len(x), dtype=torch.int64)
+    for s in range(0, len(x), chunk):
+        block = x[s : s + chunk]
+        # ||x||^2 e acelasi pentru toti centroizii, nu schimba argmin
+        out[s : s + chunk] = (c_norms[None, :] - 2 * block @ centroids.T).argmin(1)
+    return out
+
+
+def kmeans(x: torch.Tensor, k: int, iters: int = 20, seed: int = 0) -> torch.Tensor:
+    """Lloyd k-means (k, D); empty clusters are re-seeded with random points."""
+    if len(x) < k:
+        raise ValueError(f"Need at least {k} training vectors, got {len(x)}")
+    generator = torch.Generator().manual_seed(seed)
+    centroids = x[torch.randperm(len(x), generator=generator)[:k]].clone()
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        sums = torch.zeros_like(centroids).index_add_(0, assign, x)
+        counts = torch.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids = sums / counts.clamp(min=1)[:, None].to(x.dtype)
+        if empty.any():
+            refill = torch.randint(len(x), (int(empty.sum()),), generator=generator)
+            centroids[empty] = x[refill]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(
+        self,
+        root=DEFAULT_INDEX_DIR,
+        nlist: int = 1024,
+        m: int = 16,
+        metric: str = "cosine",
+        pca_dim: int | None = None,
+    ):
+        """
+        Opens the index in root, or prepares a new one with the given parameters
+        (an existing index keeps its own). pca_dim reduces the embeddings with PCA
+        (learned in train) before quantization; the reduced dim must be divisible by m.
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.root / "meta.json"
+        self.quantizers_path = self.root / "quantizers.npz"
+        self.codes_path = self.root / "codes.bin"
+        self.ids_path = self.root / "ids.bin"
+        self.lists_path = self.root / "lists.bin"
+
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            # index scris inainte de listele pe disc: tot continutul e coada, pana la urmatorul add
+            self.meta.setdefault("sorted_count", 0)
+            self.meta.setdefault("generation", 0)
+        else:
+            if metric not in METRICS:
+                raise ValueError(f"metric must be one of {METRICS}, got {metric!r}")
+            self.meta = {
+                "nlist": nlist,
+                "m": m,
+                "metric": metric,
+                "pca_dim": pca_dim,
+                "dim": None,
+                "count": 0,
+                "sorted_count": 0,  # randuri acoperite de listele inversate de pe disc
+                "generation": 0,
+                "scenes": [],
+            }
+
+        self.pca_mean = self.pca_components = None
+        self.centroids = self.codebooks = None
+        if self.quantizers_path.exists():
+            q = np.load(self.quantizers_path)
+            self.centroids = q["centroids"]
+            self.codebooks = q["codebooks"]
+            if "pca_components" in q:
+                self.pca_mean = q["pca_mean"]
+                self.pca_components = q["pca_components"]
+        self._truncate_to_count()
+        self._remove_stale_layouts()
+        self._layout = None
+        self._tail = None
+
+    # ---- antrenare ----
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """float32, unit length for cosine (squared L2 on unit vectors = 2 - 2 cos)."""
+        x = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        if self.meta["metric"] == "cosine":
+            x = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+        return x
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """_normalize + PCA reduction if configured."""
+        x = self._normalize(vectors)
+        if self.pca_components is not None:
+            x = (x - self.pca_mean) @ self.pca_components.T
+        return x
+
+    def train(self, sample: np.ndarray, iters: int = 20, seed: int = 0):
+        """Learns PCA (optional), the IVF centroids and the PQ codebooks from a sample (S, D)."""
+        if self.meta["count"]:
+            raise ValueError("Index already has vectors; train a new index instead")
+        self.meta["dim"] = int(np.asarray(sample).reshape(len(sample), -1).shape[1])
+        self.pca_mean = self.pca_components = None
+        x = self._prepare(sample)
+
+        pca_dim = self.meta["pca_dim"]
+        if pca_dim is not None and pca_dim < x.shape[1]:
+            mean = x.mean(0)
+            _, _, v = torch.svd_lowrank(torch.from_numpy(x - mean), q=pca_dim, niter=4)
+            self.pca_mean = mean
+            self.pca_components = v.T.numpy().astype(np.float32)  # (pca_dim, D)
+            x = (x - mean) @ self.pca_components.T
+
+        m = self.meta["m"]
+        if x.shape[1] % m:
+            raise ValueError(f"Dim {x.shape[1]} is not divisible by m={m}")
+        xt = torch.from_numpy(np.ascontiguousarray(x))
+        centroids = kmeans(xt, self.meta["nlist"], iters, seed)
+        residuals = xt - centroids[_nearest(xt, centroids)]
+        dsub = x.shape[1] // m
+        codebooks = torch.stack(
+            [kmeans(residuals[:, j * dsub : (j + 1) * dsub].contiguous(), KSUB, iters, seed + j) for j in range(m)]
+        )
+
+        self.centroids = centroids.numpy()
+        self.codebooks = codebooks.numpy()  # (m, KSUB, dsub)
+        arrays = {"centroids": self.centroids, "codebooks": self.codebooks}
+        if self.pca_components is not None:
+            arrays.update(pca_mean=self.pca_mean, pca_components=self.pca_components)
+        tmp_path = self.root / "quantizers.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.quantizers_path)
+        self._write_meta()
+
+    # ---- adaugare ----
+
+    def _encode(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(list of every vector (N,), PQ codes of its residual (N, m) uint8)."""
+        xt = torch.from_numpy(np.ascontiguousarray(x))
+        centroids = torch.from_numpy(self.centroids)
+        lists = _nearest(xt, centroids)
+        residuals = xt - centroids[lists]
+        m, _, dsub = self.codebooks.shape
+        codes = np.empty((len(x), m), dtype=np.uint8)
+        for j in range(m):
+            codebook = torch.from_numpy(self.codebooks[j])
+            codes[:, j] = _nearest(residuals[:, j * dsub : (j + 1) * dsub].contiguous(), codebook).numpy()
+        return lists.numpy().astype(np.int32), codes
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray | None = None) -> int:
+        """
+        Appends vectors (N, D). ids are what search returns (default: consecutive numbers
+        continuing the index, i.e. EmbeddingStore rows when the whole store is added in order).
+        """
+        count = self.meta["count"]
+        if ids is None:
+            ids = np.arange(count, count + len(vectors), dtype=np.int64)
+        added = self._append(vectors, ids)
+        self._commit(count + added)
+        return added
+
+    def add_from_store(self, store, scene_ids: list[str] | None = None, batch_rows: int = 65536) -> int:
+        """
+        Adds the scenes of an EmbeddingStore not indexed yet; ids are the store rows.
+        Each scene is committed together with its rows (one meta.json write), so a run
+        interrupted mid-scene adds that scene again from scratch instead of twice.
+        """
+        added = 0
+        for scene_id in scene_ids if scene_ids is not None else store.scene_ids():
+            if scene_id in self.meta["scenes"]:
+                continue
+            rows = store.scene_rows(scene_id)
+            matrix = store.matrix()
+            scene_added = 0
+            for s in range(rows.start, rows.stop, batch_rows):
+                stop = min(s + batch_rows, rows.stop)
+                scene_added += self._append(matrix[s:stop], np.arange(s, stop))
+            self._commit(self.meta["count"] + scene_added, scene_id)
+            added += scene_added
+        return added
+
+    def _append(self, vectors: np.ndarray, ids: np.ndarray) -> int:
+        """Writes the codes of vectors past the committed rows; they count only after _commit."""
+        if not self.is_trained:
+            raise ValueError("Index is not trained")
+        vectors = np.asarray(vectors).reshape(len(vectors), -1)
+        if vectors.shape[1] != self.meta["dim"]:
+            raise ValueError(f"Expected vectors of dim {self.meta['dim']}, got {vectors.shape[1]}")
+        ids = np.asarray(ids, dtype=np.int64)
+
+        lists, codes = self._encode(self._prepare(vectors))
+        with open(self.codes_path, "ab") as f:
+            f.write(codes.tobytes())
+        with open(self.ids_path, "ab") as f:
+            f.write(ids.tobytes())
+        with open(self.lists_path, "ab") as f:
+            f.write(lists.tobytes())
+        return len(vectors)
+
+    def _commit(self, count: int, scene_id: str | None = None):
+        """Makes rows [0, count) (and scene_id) part of the index with one meta.json write."""
+        tail = count - self.meta["sorted_count"]
+        if tail > 0 and tail >= MERGE_TAIL_ROWS:
+            self._merge(count)
+        self.meta["count"] = count
+        if scene_id is not None:
+            self.meta["scenes"].append(scene_id)
+        self._write_meta()
+        self._remove_stale_layouts()
+        self._tail = None
+
+    def _merge(self, count: int):
+        """
+        Writes a new generation of the list-sorted layout covering rows [0, count): the
+        previous layout and the tail merged list by list, in chunks (no full copy in memory).
+        Becomes current when meta.json (sorted_count, generation) is written.
+        """
+        m, nlist = self.meta["m"], self.meta["nlist"]
+        sorted_count = self.meta["sorted_count"]
+        codes, ids, lists = self._memmaps(count)
+        tail_lists = np.asarray(lists[sorted_count:])
+        tail_order = np.argsort(tail_lists, kind="stable")
+        tail_offsets = np.searchsorted(tail_lists[tail_order], np.arange(nlist + 1))
+        layout = self._sorted_layout()
+        old_offsets = layout[2] if layout is not None else np.zeros(nlist + 1, dtype=np.int64)
+
+        generation = self.meta["generation"] + 1
+        codes_path, ids_path, offsets_path = self._layout_paths(generation)
+        new_codes = np.memmap(codes_path, dtype=np.uint8, mode="w+", shape=(count, m))
+        new_ids = np.memmap(ids_path, dtype=np.int64, mode="w+", shape=(count,))
+        # randul i din lista l (layout vechi) coboara cu randurile din coada ale listelor < l
+        for s in range(0, sorted_count, MERGE_CHUNK_ROWS):
+            rows = np.arange(s, min(s + MERGE_CHUNK_ROWS, sorted_count))
+            pos = rows + tail_offsets[np.searchsorted(old_offsets, rows, side="right") - 1]
+            new_codes[pos] = layout[0][rows[0] : rows[-1] + 1]
+            new_ids[pos] = layout[1][rows[0] : rows[-1] + 1]
+        # al r-lea rand din coada (ordonata pe liste) ajunge la old_offsets[l + 1] + r, la finalul listei l
+        for s in range(0, len(tail_order), MERGE_CHUNK_ROWS):
+            part = tail_order[s : s + MERGE_CHUNK_ROWS]
+            pos = old_offsets[tail_lists[part] + 1] + np.arange(s, s + len(part))
+            new_codes[pos] = codes[sorted_count + part]
+            new_ids[pos] = ids[sorted_count + part]
+        new_codes.flush()
+        new_ids.flush()
+        np.save(offsets_path, old_offsets + tail_offsets)
+
+        self.meta["sorted_count"] = count
+        self.meta["generation"] = generation
+        self._layout = None
+
+    # ---- cautare ----
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def _memmaps(self, count: int | None = None):
+        count = self.meta["count"] if count is None else count
+        m = self.meta["m"]
+        codes = np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(count, m))
+        ids = np.memmap(self.ids_path, dtype=np.int64, mode="r", shape=(count,))
+        lists = np.memmap(self.lists_path, dtype=np.int32, mode="r", shape=(count,))
+        return codes, ids, lists
+
+    def _layout_paths(self, generation: int) -> tuple[Path, Path, Path]:
+        prefix = f"ivf.{generation}"
+        return (
+            self.root / f"{prefix}.codes.bin",
+            self.root / f"{prefix}.ids.bin",
+            self.root / f"{prefix}.offsets.npy",
+        )
+
+    def _sorted_layout(self):
+        """(codes, ids, offsets) of the first sorted_count rows, grouped by list; memmaps, or None."""
+        if self.meta["sorted_count"] == 0:
+            return None
+        if self._layout is None:
+            count, m = self.meta["sorted_count"], self.meta["m"]
+            codes_path, ids_path, offsets_path = self._layout_paths(self.meta["generation"])
+            self._layout = (
+                np.memmap(codes_path, dtype=np.uint8, mode="r", shape=(count, m)),
+                np.memmap(ids_path, dtype=np.int64, mode="r", shape=(count,)),
+                np.load(offsets_path),
+            )
+        return self._layout
+
+    def _inverted_lists(self) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Segments (codes, ids, offsets): the entries of list l in a segment are
+        codes[offsets[l]:offsets[l + 1]]. The on-disk layout is read through memmaps;
+        only the tail added since the last merge is grouped in memory (m + 8 bytes per vector).
+        """
+        segments = []
+        layout = self._sorted_layout()
+        if layout is not None:
+            segments.append(layout)
+        sorted_count = self.meta["sorted_count"]
+        if self.meta["count"] > sorted_count:
+            if self._tail is None:
+                codes, ids, lists = self._memmaps()
+                tail_lists = np.asarray(lists[sorted_count:])
+                order = np.argsort(tail_lists, kind="stable")
+                offsets = np.searchsorted(tail_lists[order], np.arange(self.meta["nlist"] + 1))
+                self._tail = (np.asarray(codes[sorted_count + order]), np.asarray(ids[sorted_count + order]), offsets)
+            segments.append(self._tail)
+        return segments
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        nprobe: int = 16,
+        refine: np.ndarray | None = None,
+        refine_factor: int = 4,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (distances (Q, k), ids (Q, k)) of the approximate k nearest neighbours of every query;
+        missing results are id -1. Distances are squared L2 (on normalized vectors for cosine).
+        refine: the original vectors indexed by id (e.g. EmbeddingStore.matrix()); the best
+        k * refine_factor candidates are then re-ranked with exact distances.
+        """
+        if self.meta["count"] == 0:
+            raise ValueError("Index is empty")
+        queries = np.asarray(queries).reshape(-1, self.meta["dim"])
+        q = self._prepare(queries)
+        segments = self._inverted_lists()
+        m, _, dsub = self.codebooks.shape
+        n_candidates = k * refine_factor if refine is not None else k
+        nprobe = min(nprobe, self.meta["nlist"])
+
+        # ||q||^2 e constant per query -> nu schimba ordinea centroizilor
+        coarse = (self.centroids**2).sum(1)[None, :] - 2 * q @ self.centroids.T  # (Q, nlist)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        all_dist = np.full((len(q), k), np.inf, dtype=np.float32)
+        all_ids = np.full((len(q), k), -1, dtype=np.int64)
+        codebook_sq = (self.codebooks**2).sum(-1)  # (m, KSUB)
+        sub_offset = np.arange(m) * KSUB
+        for qi in range(len(q)):
+            lists = probes[qi]
+            # intrarile listelor vizitate: felii contigue din fiecare segment
+            cand_codes, cand_ids, owners = [], [], []
+            for codes, ids, offsets in segments:
+                starts, stops = offsets[lists], offsets[lists + 1]
+                for p in np.flatnonzero(stops > starts):
+                    cand_codes.append(codes[starts[p] : stops[p]])
+                    cand_ids.append(ids[starts[p] : stops[p]])
+                    owners.append(np.full(stops[p] - starts[p], p * m * KSUB))
+            if not cand_codes:
+                continue
+            # tabelele ADC ale tuturor listelor vizitate deodata: (nprobe, m, KSUB),
+            # ||r - c||^2 = ||r||^2 - 2 r.c + ||c||^2
+            residuals = (q[qi] - self.centroids[lists]).reshape(len(lists), m, dsub)
+            tables = (
+                (residuals**2).sum(-1)[:, :, None]
+                - 2 * np.einsum("pmd,mkd->pmk", residuals, self.codebooks)
+                + codebook_sq[None]
+            )
+            # index plat in tables: (lista, subspatiu, cod)
+            flat = np.concatenate(owners)[:, None] + sub_offset[None, :] + np.concatenate(cand_codes)
+            dists = tables.reshape(-1)[flat].sum(1)
+            if len(dists) > n_candidates:
+                top = np.argpartition(dists, n_candidates - 1)[:n_candidates]
+                top = top[np.argsort(dists[top])]
+            else:
+                top = np.argsort(dists)
+            cand_ids = np.concatenate(cand_ids)[top]
+            cand_dist = dists[top]
+
+            if refine is not None:
+                # distanta exacta in spatiul original (fara PCA)
+                exact = self._normalize(np.asarray(refine[np.sort(cand_ids)]))
+                cand_ids = np.sort(cand_ids)
+                query = self._normalize(queries[qi : qi + 1])
+                cand_dist = ((exact - query) ** 2).sum(1)
+                best = np.argsort(cand_dist)[:k]
+                cand_ids, cand_dist = cand_ids[best], cand_dist[best]
+            else:
+                cand_ids, cand_dist = cand_ids[:k], cand_dist[:k]
+            all_ids[qi, : len(cand_ids)] = cand_ids
+            all_dist[qi, : len(cand_dist)] = cand_dist
+        return all_dist, all_ids
+
+    # ---- intern ----
+
+    def _write_meta(self):
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _truncate_to_count(self):
+        """Drops rows left behind by an add that crashed before meta.json was updated."""
+        count = self.meta["count"]
+        for path, row_bytes in (
+            (self.codes_path, self.meta["m"]),
+            (self.ids_path, 8),
+            (self.lists_path, 4),
+        ):
+            if path.exists() and path.stat().st_size > count * row_bytes:
+                with open(path, "r+b") as f:
+                    f.truncate(count * row_bytes)
+
+    def _remove_stale_layouts(self):
+        """Deletes list-sorted layouts other than the current generation (replaced, or left by a crashed merge)."""
+        current = set(self._layout_paths(self.meta["generation"])) if self.meta["sorted_count"] else set()
+        for path in self.root.glob("ivf.*"):
+            if path not in current:
+                os.remove(path)
@@ -1,19 +1,85 @@
 #so the purpose of this deps.py is to ensure that the requests from a logged in user who has the privileges
 #we check that a user is valid at login, but we also have to make sure that the resources cannont be accessed if the user isnt logged
 
+import os
+
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import select
+from sqlalchemy import event, inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
 from src.core.database import get_db
 from src.core.security import decode_access_token
-from src.models.user import User
+from src.models.user import Role, User
+from src.schemas.role import UserRole
 
 # --- 1. OAuth2 Bearer Scheme ---
 # This tells FastAPI how to expect the token (in the Authorization header as "Bearer <token>")
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="/api/users/token")
 
+# --- Principal cache ---
+# email (the token's 'sub') -> column values of the active user, so protected endpoints don't run a SELECT
+# on every call. The token itself is still decoded (signature + expiry) on every request, that part is cheap.
+# The cache is per process: with several workers a deactivation elsewhere is seen after at most the TTL.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 30))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", 10000))
+_user_cache = TTLCache(maxsize=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+# hashed_password is left out: it is only needed at login, which always reads the user from the database.
+# The entry also keeps the role name, so is_admin doesn't need its own SELECT on roles.
+_USER_COLUMNS = [attr.key for attr in inspect(User).column_attrs if attr.key != "hashed_password"]
+
+
+def invalidate_cached_user(email: str):
+    _user_cache.pop(email, None)
+
+
+@event.listens_for(User.is_active, "set")
+def _on_user_active_set(target, value, oldvalue, initiator):
+    # deactivating a user through the ORM drops it from the cache right away
+    if not value and target.email is not None:
+        invalidate_cached_user(target.email)
+
+
+@event.listens_for(User.role_id, "set")
+@event.listens_for(User.hashed_password, "set")
+def _on_user_credentials_set(target, value, oldvalue, initiator):
+    # a role change must not keep the old privileges, a password change ends the cached session
+    if value != oldvalue:
+        target.__dict__.pop("role_name", None)
+        if target.email is not None:
+            invalidate_cached_user(target.email)
+
+
+@event.listens_for(User.email, "set")
+def _on_user_email_set(target, value, oldvalue, initiator):
+    # tokens carry the email: the old one must stop resolving to this user
+    if isinstance(oldvalue, str) and value != oldvalue:
+        invalidate_cached_user(oldvalue)
+
+
+@event.listens_for(User, "before_delete")
+def _on_user_delete(mapper, connection, target):
+    invalidate_cached_user(target.email)
+
+
+async def _cached_user(db: AsyncSession, email: str) -> User | None:
+    """
+    User from the cache, attached to db without a query (lazy relationships still work).
+    hashed_password is not loaded on these objects; role_name is set from the cached entry.
+    """
+    values = _user_cache.get(email)
+    if values is None:
+        return None
+    values = dict(values)
+    role_name = values.pop("role_name")
+    user = User(**values)
+    make_transient_to_detached(user)
+    user = await db.merge(user, load=False)
+    user.role_name = role_name
+    return user
+
 
 # 2. Get Current User Dependency (The Gatekeeper)
 async def get_current_user(
@@ -42,14 +108,44 @@ async def get_current_user(
     if user_email is None:
         raise credentials_exception
 
-    # 3. Look up the user in the database
-    user = (await db.execute(select(User).where(User.email == user_email))).scalar_one_or_none()
-    
+    # 3. Look up the user (cache first, then the database)
+    user = await _cached_user(db, user_email)
     if user is None:
-        raise credentials_exception # User not found
-        
-    if not user.is_active:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
+        # the role name comes in the same query, for is_admin
+        row = (
+            await db.execute(
+                select(User, Role.name).join(Role, Role.id == User.role_id).where(User.email == user_email)
+            )
+        ).one_or_none()
+    
+        if row is None:
+            raise credentials_exception # User not found
+        user, role_name = row
+        user.role_name = role_name
+            
+        if not user.is_active:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
+
+        # only active users are cached
+        _user_cache[user_email] = {**{key: getattr(user, key) for key in _USER_COLUMNS}, "role_name": role_name}
     
     # Success: Return the full SQLAlchemy User object
-    return user
\ No newline at end of file
+    return user
+
+
+async def is_admin(db: AsyncSession, user: User) -> bool:
+    # set by get_current_user (from the principal cache or its own query); other callers fall back to a SELECT
+    role_name = getattr(user, "role_name", None)
+    if role_name is None:
+        role_name = (await db.execute(select(Role.name).where(Role.id == user.role_id))).scalar_one_or_none()
+    return role_name == UserRole.admin.value
+
+
+# 3. Admin-only Dependency
+async def get_current_admin(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> User:
+    if not await is_admin(db, current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
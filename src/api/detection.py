@@ -0,0 +1,188 @@
+import base64
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+import asyncpg
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api.deps import get_current_user, is_admin
+from src.core.bulk_ingest import DetectionRow, bulk_insert_detections, naive_utc
+from src.core.database import AsyncSessionLocal, get_db
+from src.models.aoi import AreaOfInterest
+from src.models.detection import Detection
+from src.models.user import User
+from src.schemas.detection import DetectionBatchIn, DetectionBatchOut, DetectionOut, DetectionPage
+
+# router initialization
+router = APIRouter(prefix="/detections", tags=["Detections"])
+
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 1000 # the NDJSON stream reads keyset pages of this size, each one a short query
+
+logger = logging.getLogger(__name__)
+
+
+# --- Query filters ---
+@dataclass
+class DetectionFilters:
+    aoi_id: int | None = Query(None)
+    bbox: str | None = Query(None, description="min_lon,min_lat,max_lon,max_lat (EPSG:4326)")
+    start: datetime | None = Query(None)
+    end: datetime | None = Query(None)
+    type: list[str] | None = Query(None)
+    min_score: float | None = Query(None, ge=0, le=1)
+
+
+def _parse_bbox(bbox: str) -> list[float]:
+    try:
+        values = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        values = []
+    if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    return values
+
+
+# the cursor is the (timestamp, id) of the last row sent, opaque for the client
+def encode_cursor(timestamp: datetime, detection_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{detection_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        timestamp, detection_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(detection_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
+def _detection_query(filters: DetectionFilters, owner_id: int | None):
+    """
+    SELECT for the filters, newest first. The order (timestamp DESC, id DESC) matches the
+    (aoi_id, timestamp, id) and (timestamp, id) indexes; bbox goes through the GiST index on geom.
+    owner_id=None (admin) does not restrict the AOIs.
+    """
+    stmt = select(
+        Detection.id,
+        Detection.timestamp,
+        Detection.score,
+        Detection.type,
+        Detection.aoi_id,
+        Detection.image_id,
+        Detection.model_id,
+        func.ST_AsGeoJSON(Detection.geom).label("geometry"),
+    )
+    if owner_id is not None:
+        stmt = stmt.join(AreaOfInterest, AreaOfInterest.id == Detection.aoi_id).where(AreaOfInterest.user_id == owner_id)
+    if filters.aoi_id is not None:
+        stmt = stmt.where(Detection.aoi_id == filters.aoi_id)
+    if filters.bbox is not None:
+        envelope = func.ST_MakeEnvelope(*_parse_bbox(filters.bbox), 4326)
+        stmt = stmt.where(func.ST_Intersects(Detection.geom, envelope))
+    if filters.start is not None:
+        stmt = stmt.where(Detection.timestamp >= naive_utc(filters.start))
+    if filters.end is not None:
+        stmt = stmt.where(Detection.timestamp < naive_utc(filters.end))
+    if filters.type:
+        stmt = stmt.where(Detection.type.in_(filters.type))
+    if filters.min_score is not None:
+        stmt = stmt.where(Detection.score >= filters.min_score)
+    return stmt.order_by(Detection.timestamp.desc(), Detection.id.desc())
+
+
+async def _fetch_page(db: AsyncSession, stmt, after: tuple[datetime, int] | None, limit: int) -> list[dict]:
+    if after is not None:
+        # keyset: only rows strictly after the cursor in (timestamp DESC, id DESC) order
+        stmt = stmt.where(tuple_(Detection.timestamp, Detection.id) < tuple_(*after))
+    rows = (await db.execute(stmt.limit(limit))).mappings().all()
+    return [{**row, "geometry": json.loads(row["geometry"])} for row in rows]
+
+
+# Bulk ingestion of the detections of one scene (output of the inference pipeline)
+@router.post("/bulk", response_model=DetectionBatchOut, status_code=status.HTTP_201_CREATED)
+async def ingest_detections(
+    batch: DetectionBatchIn,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    # only the owner of the AOI (or an admin) can write detections into it
+    owner_id = (await db.execute(select(AreaOfInterest.user_id).where(AreaOfInterest.id == batch.aoi_id))).scalar_one_or_none()
+    if owner_id != current_user.id and not await is_admin(db, current_user):
+        # same answer for a missing AOI and someone else's AOI, the ids of other users are not exposed
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AOI not found.")
+    # the ownership check is done, the connection goes back to the pool before the bulk insert
+    await db.rollback()
+
+    rows = [
+        DetectionRow(d.type, d.score, bytes.fromhex(d.geom_wkb), d.timestamp)
+        for d in batch.detections
+    ]
+    try:
+        result = await bulk_insert_detections(
+            rows,
+            aoi_id=batch.aoi_id,
+            image_id=batch.image_id,
+            model_id=batch.model_id,
+            create_alerts=batch.create_alerts,
+        )
+    except asyncpg.ForeignKeyViolationError:
+        # aoi_id / image_id / model_id does not exist
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AOI, image or model not found.")
+    except asyncpg.PostgresError:
+        # invalid WKB, wrong geometry type (detections.geom is POLYGON), ...
+        # the database error text stays in the logs, it can describe the schema
+        logger.warning("Rejected detection batch for aoi %s", batch.aoi_id, exc_info=True)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid detection batch.")
+
+    return result
+
+
+# Paginated query (JSON): pass next_cursor back as cursor to get the next page
+@router.get("", response_model=DetectionPage)
+async def list_detections(
+    filters: DetectionFilters = Depends(),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    owner_id = None if await is_admin(db, current_user) else current_user.id
+    after = decode_cursor(cursor) if cursor else None
+    items = await _fetch_page(db, _detection_query(filters, owner_id), after, limit)
+
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor(items[-1]["timestamp"], items[-1]["id"])
+    return DetectionPage(items=items, next_cursor=next_cursor)
+
+
+# All matching detections as NDJSON (one DetectionOut per line), for exports / large AOIs
+@router.get("/stream")
+async def stream_detections(
+    filters: DetectionFilters = Depends(),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    owner_id = None if await is_admin(db, current_user) else current_user.id
+    stmt = _detection_query(filters, owner_id)
+
+    async def generate():
+        # own session: the response outlives the request dependencies
+        async with AsyncSessionLocal() as session:
+            after = None
+            while True:
+                page = await _fetch_page(session, stmt, after, STREAM_PAGE_SIZE)
+                # one chunk per page, the transaction is not kept open between pages
+                await session.rollback()
+                if page:
+                    yield "".join(DetectionOut(**item).model_dump_json() + "\n" for item in page)
+                if len(page) < STREAM_PAGE_SIZE:
+                    break
+                after = (page[-1]["timestamp"], page[-1]["id"])
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends
+
+from src.api.deps import get_current_admin
+from src.core.database import engine
+from src.core.db_metrics import db_metrics
+from src.models.user import User
+
+# internal endpoints (admin only, hidden from the public OpenAPI schema)
+router = APIRouter(prefix="/internal", tags=["Internal"], include_in_schema=False)
+
+
+# Database metrics: per-statement latency histograms (slowest total first), slow queries, pool wait and usage
+@router.get("/metrics")
+async def get_metrics(
+    reset: bool = False,
+    current_user: User = Depends(get_current_admin),
+):
+    snapshot = {"database": db_metrics.snapshot(engine.sync_engine.pool)}
+    if reset:
+        # start a new measurement window (e.g. before a load test)
+        db_metrics.reset()
+    return snapshot
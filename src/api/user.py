@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
 from src.core.database import get_db
-from src.core.security import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from src.core.security import get_password_hash_async, verify_password_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from src.models.user import User, Role
 from src.schemas.user import UserCreate, UserOut, Token
 from src.schemas.role import UserRole
@@ -41,7 +41,7 @@ async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_db
     db_user = User(
         email=user_data.email,
         full_name=user_data.full_name,
-        hashed_password=get_password_hash(user_data.password), #hashed password
+        hashed_password=await get_password_hash_async(user_data.password), #hashed password (off the event loop)
         role_id=user_role_id,
     )
     db.add(db_user)
@@ -69,7 +69,7 @@ async def login_for_access_token(
     user = (await db.execute(select(User).where(User.email == form_data.username))).scalar_one_or_none()
     
     # verify credentials
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -0,0 +1,326 @@
+# src/change_detection.py
+"""
+Detectie de schimbari in timp pe embeddings de tile-uri (aceeasi grila AOI, date diferite).
+
+Pentru fiecare tile (y, x) tinem un baseline: media embedding-urilor vazute pana acum si
+varianta pe fiecare dimensiune (Welford, sau medie exponentiala cu `decay`).
+O scena noua e comparata doar cu baseline-ul, toate tile-urile deodata (operatii pe matrice),
+apoi baseline-ul e actualizat cu ea - nu recalculam tot istoricul.
+
+Scoruri:
+  - "cosine":      1 - cos(embedding, media tile-ului)
+  - "mahalanobis": distanta Mahalanobis cu covarianta diagonala, impartita la sqrt(D)
+                   (un z-score RMS; covarianta completa D x D nu incape pentru embeddings FPN)
+
+Starea e salvata in root, ca procesarea sa continue dupa restart:
+  - keys.bin, count.bin, mean.bin, var.bin: cate un rand per tile, deschise cu np.memmap;
+    capacitatea creste geometric, randurile sunt actualizate pe loc (nu rescriem tot la fiecare scena)
+  - undo.*.npz: valorile vechi ale randurilor modificate de la ultimul save (jurnal de undo)
+  - meta.json:  dim, numarul de randuri, versiunea si scenele procesate
+
+save() scrie meta.json atomic (os.replace) si e singurul punct de commit: o scena e in
+"scenes" exact atunci cand actualizarea ei e in baseline. Daca procesul moare inainte,
+la redeschidere randurile sunt restaurate din jurnal si randurile noi ignorate.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_CHANGE_DIR = Path("dataset") / "change"
+METRICS = ("cosine", "mahalanobis")
+KEY_STRIDE = 1 << 32  # cheie int64 = y * KEY_STRIDE + x
+VAR_EPS = 1e-6
+STATE_DTYPES = {"keys": np.int64, "count": np.int64, "mean": np.float32, "var": np.float32}
+MIN_CAPACITY = 1024  # randuri alocate la prima scena, apoi capacitatea se dubleaza
+
+
+@dataclass
+class ChangeReport:
+    scene_id: str
+    coords: np.ndarray  # (N, 2) coltul (y, x) al fiecarui tile
+    scores: np.ndarray  # (N,) NaN unde tile-ul nu are inca destul istoric
+    threshold: float
+    flagged: np.ndarray  # (N,) bool, scores > threshold
+
+    def top(self, k: int = 10) -> list[tuple[tuple[int, int], float]]:
+        """The k highest-scoring tiles as ((y, x), score)."""
+        order = np.argsort(-np.nan_to_num(self.scores, nan=-np.inf))[:k]
+        return [(tuple(self.coords[i].tolist()), float(self.scores[i])) for i in order]
+
+
+def _tile_keys(coords: np.ndarray) -> np.ndarray:
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+    return coords[:, 0] * KEY_STRIDE + coords[:, 1]
+
+
+def robust_threshold(scores: np.ndarray, k: float = 3.0) -> float:
+    """median + k * MAD of the finite scores (MAD scaled to a standard deviation)."""
+    finite = scores[np.isfinite(scores)]
+    if len(finite) == 0:
+        return np.inf
+    median = np.median(finite)
+    mad = 1.4826 * np.median(np.abs(finite - median))
+    return float(median + k * mad)
+
+
+class ChangeDetector:
+    def __init__(
+        self,
+        root=DEFAULT_CHANGE_DIR,
+        metric: str = "cosine",
+        decay: float | None = None,
+        min_history: int | None = None,
+    ):
+        """
+        One detector per AOI grid, state kept in root.
+        decay=None keeps the plain running mean/variance of all dates; a value in (0, 1)
+        weights recent dates more (EWMA), so slow seasonal drift is absorbed by the baseline.
+        Tiles seen fewer than min_history times get a NaN score (default 1 for cosine,
+        2 for mahalanobis, which needs a variance).
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}, got {metric!r}")
+        if decay is not None and not 0 < decay < 1:
+            raise ValueError("decay must be in (0, 1)")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.metric = metric
+        self.decay = decay
+        if min_history is None:
+            min_history = 1 if metric == "cosine" else 2
+        self.min_history = max(1, min_history)
+        self.meta_path = self.root / "meta.json"
+
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"dim": None, "rows": 0, "version": 0, "scenes": []}
+        if "rows" not in self.meta:
+            self._migrate_npy()
+
+        self._arrays = {}
+        self._committed_rows = self.meta["rows"]
+        self._journal_seq = 0
+        if self.meta["dim"] is not None:
+            self._open_arrays(max(self.meta["rows"], MIN_CAPACITY))
+        self._recover()
+        self._view()
+
+    # ---- stare pe disc ----
+
+    def _open_arrays(self, capacity: int):
+        """(Re)opens the state files as read-write memmaps of `capacity` rows, extending them if needed."""
+        dim = self.meta["dim"]
+        self._arrays = {}
+        for name, dtype in STATE_DTYPES.items():
+            shape = (capacity,) if name in ("keys", "count") else (capacity, dim)
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            path = self.root / f"{name}.bin"
+            with open(path, "ab") as f:
+                if f.tell() < nbytes:
+                    f.truncate(nbytes)
+            self._arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _view(self):
+        """keys / count / mean / var: views of the first meta["rows"] rows of the memmaps."""
+        rows = self.meta["rows"]
+        if self._arrays:
+            self.keys, self.count, self.mean, self.var = (self._arrays[name][:rows] for name in STATE_DTYPES)
+        else:
+            self.keys = np.zeros(0, dtype=np.int64)
+            self.count = np.zeros(0, dtype=np.int64)
+            self.mean = np.zeros((0, 0), dtype=np.float32)
+            self.var = np.zeros((0, 0), dtype=np.float32)
+        self._order = np.argsort(self.keys)
+
+    def _journal(self, rows: np.ndarray):
+        """Saves the current values of the committed rows about to be modified (undo log)."""
+        rows = rows[rows < self._committed_rows]
+        path = self.root / f"undo.{self._journal_seq:06d}.npz"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=self.meta["version"],
+                rows=rows,
+                count=self.count[rows],
+                mean=self.mean[rows],
+                var=self.var[rows],
+            )
+        os.replace(tmp_path, path)
+        self._journal_seq += 1
+
+    def _recover(self):
+        """
+        Undoes the updates that were not committed: journals of the current version are
+        replayed newest first; journals of an older version belong to a committed save.
+        """
+        journals = sorted(self.root.glob("undo.*.npz"))
+        for path in reversed(journals):
+            with np.load(path) as undo:
+                if int(undo["version"]) != self.meta["version"] or not self._arrays:
+                    continue
+                rows = undo["rows"]
+                for name in ("count", "mean", "var"):
+                    self._arrays[name][rows] = undo[name]
+        if journals:
+            for array in self._arrays.values():
+                array.flush()
+            for path in journals:
+                os.remove(path)
+
+    def _migrate_npy(self):
+        # stare scrisa de versiunea veche (keys/count/mean/var .npy rescrise la fiecare save)
+        arrays = {name: np.load(self.root / f"{name}.npy") for name in STATE_DTYPES}
+        self.meta.update(rows=len(arrays["keys"]), version=0)
+        if self.meta["dim"] is not None:
+            self._open_arrays(max(self.meta["rows"], MIN_CAPACITY))
+            for name, array in arrays.items():
+                self._arrays[name][: len(array)] = array
+                self._arrays[name].flush()
+            self._arrays = {}
+        self._write_meta()
+        for name in STATE_DTYPES:
+            os.remove(self.root / f"{name}.npy")
+
+    # ---- baseline ----
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Baseline row of every key, -1 for tiles not seen yet."""
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        sorted_keys = self.keys[self._order]
+        pos = np.clip(np.searchsorted(sorted_keys, keys), 0, len(sorted_keys) - 1)
+        rows = self._order[pos]
+        return np.where(sorted_keys[pos] == keys, rows, -1)
+
+    def _add_tiles(self, keys: np.ndarray, dim: int):
+        start = self.meta["rows"]
+        stop = start + len(keys)
+        if self.meta["dim"] is None:
+            self.meta["dim"] = dim
+            self._open_arrays(max(stop, MIN_CAPACITY))
+        capacity = len(self._arrays["keys"])
+        if stop > capacity:
+            self._open_arrays(max(stop, 2 * capacity))
+        # randurile de dupa commit pot avea valori ramase dintr-o actualizare anulata
+        self._arrays["keys"][start:stop] = keys
+        for name in ("count", "mean", "var"):
+            self._arrays[name][start:stop] = 0
+        self.meta["rows"] = stop
+        self._view()
+
+    def score(self, coords, embeddings: np.ndarray) -> np.ndarray:
+        """Distance of every tile to its baseline, (N,); does not change the baseline."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(coords), -1)
+        rows = self._lookup(_tile_keys(coords))
+        scores = np.full(len(rows), np.nan, dtype=np.float32)
+        known = rows >= 0
+        known[known] = self.count[rows[known]] >= self.min_history
+        if not known.any():
+            return scores
+
+        x = embeddings[known]
+        mean = self.mean[rows[known]]
+        if self.metric == "cosine":
+            dot = np.einsum("nd,nd->n", x, mean)
+            norms = np.linalg.norm(x, axis=1) * np.linalg.norm(mean, axis=1)
+            scores[known] = 1.0 - dot / np.maximum(norms, 1e-12)
+        else:
+            diff = x - mean
+            var = self.var[rows[known]]
+            scores[known] = np.sqrt(np.einsum("nd,nd->n", diff, diff / (var + VAR_EPS)) / x.shape[1])
+        return scores
+
+    def update(self, coords, embeddings: np.ndarray):
+        """
+        Adds one observation per tile to the baseline (new tiles are added to the grid).
+        The rows are updated in place; the change is kept after a restart only once save() commits it.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(coords), -1)
+        if self.meta["dim"] is not None and embeddings.shape[1] != self.meta["dim"]:
+            raise ValueError(f"Expected embeddings of dim {self.meta['dim']}, got {embeddings.shape[1]}")
+        keys = _tile_keys(coords)
+        rows = self._lookup(keys)
+        new = rows < 0
+        if new.any():
+            start = len(self.keys)
+            self._add_tiles(keys[new], embeddings.shape[1])
+            rows[new] = np.arange(start, start + int(new.sum()))
+        self._journal(rows)
+
+        x = embeddings
+        count = self.count[rows] + 1
+        mean = self.mean[rows]
+        var = self.var[rows]
+        delta = x - mean
+        if self.decay is None:
+            # Welford: media si varianta (populatie) actualizate cu o observatie
+            mean = mean + delta / count[:, None]
+            var = var + (delta * (x - mean) - var) / count[:, None]
+        else:
+            # prima observatie initializeaza media, apoi medie exponentiala
+            alpha = np.where(count == 1, 1.0, self.decay)[:, None].astype(np.float32)
+            mean = mean + alpha * delta
+            var = (1 - alpha) * (var + alpha * delta * delta)
+
+        self.count[rows] = count
+        self.mean[rows] = mean
+        self.var[rows] = var
+
+    # ---- scene ----
+
+    def process_scene(
+        self, scene_id: str, coords, embeddings: np.ndarray, threshold: float | None = None
+    ) -> ChangeReport | None:
+        """
+        Scores a new date against the baseline, then folds it into the baseline and saves
+        the state. Scenes must arrive in acquisition order; a scene already processed is
+        skipped (returns None). threshold=None uses robust_threshold over this scene's scores.
+        """
+        if scene_id in self.meta["scenes"]:
+            return None
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+        scores = self.score(coords, embeddings)
+        self.update(coords, embeddings)
+        self.meta["scenes"].append(scene_id)
+        self.save()
+
+        threshold = robust_threshold(scores) if threshold is None else threshold
+        with np.errstate(invalid="ignore"):
+            flagged = scores > threshold
+        return ChangeReport(scene_id, coords, scores, threshold, flagged)
+
+    def process_store(self, store, scene_ids: list[str], threshold: float | None = None) -> list[ChangeReport]:
+        """Processes scenes of an EmbeddingStore (in the given, chronological order) not seen yet."""
+        reports = []
+        for scene_id in scene_ids:
+            if scene_id in self.meta["scenes"]:
+                continue
+            embeddings, index = store.read_scene(scene_id)
+            coords = np.stack([index["y"], index["x"]], axis=1)
+            reports.append(self.process_scene(scene_id, coords, embeddings, threshold))
+        return reports
+
+    def save(self):
+        """Commits the updates since the last save (and the scenes added to meta) in one rename."""
+        for array in self._arrays.values():
+            array.flush()
+        self.meta["version"] += 1
+        self._write_meta()
+        self._committed_rows = self.meta["rows"]
+        # jurnalele au versiunea veche: dupa commit nu mai sunt folosite la recover
+        for path in self.root.glob("undo.*.npz"):
+            os.remove(path)
+        self._journal_seq = 0
+
+    def _write_meta(self):
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
@@ -0,0 +1,123 @@
+#bulk ingestion for detections: one scene can give thousands of rows (each with a polygon and an alert),
+#adding them one ORM object at a time through AsyncSessionLocal is far too slow, so here we go straight to asyncpg:
+#  1. COPY the batch into a temporary staging table (binary protocol, one round trip)
+#  2. one INSERT ... SELECT moves it into detections and, in the same statement (CTE), creates the alerts
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple
+
+from src.core.database import engine
+from src.models.alert import Alert
+from src.models.detection import Detection
+
+BULK_BATCH_SIZE = int(os.getenv("DETECTION_BULK_BATCH_SIZE", 5000))
+STAGING_TABLE = "detection_staging"
+
+
+class DetectionRow(NamedTuple):
+    type: str
+    score: float
+    geom_wkb: bytes # WKB/EWKB polygon, EPSG:4326
+    timestamp: datetime | None = None
+
+
+# tabela temporara traieste cat conexiunea (deci o refolosim din pool), randurile doar cat tranzactia
+_CREATE_STAGING = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    ord integer NOT NULL,
+    type text,
+    score double precision,
+    geom bytea NOT NULL,
+    ts timestamp
+) ON COMMIT DELETE ROWS
+"""
+
+# id-urile sunt luate din secventa in CTE-ul staged, ca sa le putem intoarce in ordinea din request
+_INSERT_FROM_STAGING = f"""
+WITH staged AS (
+    SELECT ord, type, score, geom, ts, nextval(pg_get_serial_sequence('{Detection.__tablename__}', 'id')) AS id
+    FROM {STAGING_TABLE}
+), inserted AS (
+    INSERT INTO {Detection.__tablename__} (id, timestamp, score, type, geom, aoi_id, image_id, model_id)
+    SELECT id, coalesce(ts, now()), score, type, ST_SetSRID(ST_GeomFromEWKB(geom), 4326), $1, $2, $3
+    FROM staged
+    RETURNING id, type
+), alerts AS (
+    INSERT INTO {Alert.__tablename__} (status, type, detection_id)
+    SELECT 'new', type, id FROM inserted WHERE $4::boolean
+    RETURNING id
+)
+SELECT
+    (SELECT array_agg(id ORDER BY ord) FROM staged) AS detection_ids,
+    (SELECT count(*) FROM alerts) AS alerts
+"""
+
+
+def naive_utc(value: datetime | None) -> datetime | None:
+    # detections.timestamp is "timestamp without time zone"
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def bulk_insert_detections(
+    rows: Iterable[DetectionRow],
+    aoi_id: int,
+    image_id: int,
+    model_id: int,
+    create_alerts: bool = True,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> dict:
+    """
+    Inserts detections (and one 'new' Alert per detection) in batches of batch_size.
+    Everything runs in a single transaction, so a failed batch leaves nothing behind.
+    Returns the new ids (in input order), the number of alerts and per-batch timings.
+    """
+    rows = list(rows)
+    detection_ids: list[int] = []
+    alerts = 0
+    batches = []
+    start = time.perf_counter()
+
+    async with engine.connect() as conn:
+        # the asyncpg connection under SQLAlchemy, for COPY and for managing the transaction ourselves
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+        async with pg.transaction():
+            await pg.execute(_CREATE_STAGING)
+            for s in range(0, len(rows), batch_size):
+                batch_start = time.perf_counter()
+                batch = rows[s : s + batch_size]
+                await pg.copy_records_to_table(
+                    STAGING_TABLE,
+                    records=[
+                        (i, row.type, row.score, row.geom_wkb, naive_utc(row.timestamp))
+                        for i, row in enumerate(batch)
+                    ],
+                    columns=["ord", "type", "score", "geom", "ts"],
+                )
+                copied = time.perf_counter()
+
+                result = await pg.fetchrow(_INSERT_FROM_STAGING, aoi_id, image_id, model_id, create_alerts)
+                await pg.execute(f"TRUNCATE {STAGING_TABLE}")
+                done = time.perf_counter()
+
+                detection_ids += result["detection_ids"] or []
+                alerts += result["alerts"]
+                batches.append({
+                    "rows": len(batch),
+                    "alerts": result["alerts"],
+                    "copy_ms": (copied - batch_start) * 1000,
+                    "insert_ms": (done - copied) * 1000,
+                    "total_ms": (done - batch_start) * 1000,
+                })
+
+    return {
+        "inserted": len(detection_ids),
+        "alerts": alerts,
+        "detection_ids": detection_ids,
+        "batches": batches,
+        "total_ms": (time.perf_counter() - start) * 1000,
+    }
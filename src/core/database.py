@@ -3,6 +3,8 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
 
+from src.core.db_metrics import TimedAsyncQueuePool, instrument_engine
+
 #database url from .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -11,8 +13,33 @@ if not DATABASE_URL:
 #SQLAlchemy Base class
 Base = declarative_base()
 
-# echo=True prints SQL queries to the console (good for debugging)
-engine = create_async_engine(DATABASE_URL, echo=True)
+# pool / driver settings, all overridable from .env
+# DB_ECHO=1 prints SQL queries to the console (good for debugging, too noisy for production)
+DB_ECHO = os.getenv("DB_ECHO", "0").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30)) # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800)) # seconds, reconnect before server/proxy idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+# prepared statements cached per connection (SQLAlchemy's asyncpg adapter and asyncpg itself);
+# set 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=DB_ECHO,
+    poolclass=TimedAsyncQueuePool, # measures the wait for a free connection
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    },
+)
+instrument_engine(engine) # per-statement timings, slow query log (see db_metrics.py)
 
 # expire_on_commit=False prevents objects from being "detached" after commit
 AsyncSessionLocal = sessionmaker(
@@ -27,10 +54,18 @@ async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+def create_missing_indexes(sync_conn):
+    """Creates every index declared on the models that is not in the database yet."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
 # Function to be called during FastAPI startup lifespan event
 async def create_db_and_tables():
     """Creates all tables defined by Base metadata."""
     async with engine.begin() as conn:
         # This checks Base.metadata and creates tables if they don't exist
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips tables that already exist, so indexes added to a model later are created here
+        await conn.run_sync(create_missing_indexes)
         print("✅ Database tables created/checked.")
\ No newline at end of file
@@ -0,0 +1,183 @@
+#query timing and pool metrics for the SQLAlchemy engine (exposed by /api/internal/metrics)
+#  - per-statement latency histograms, from the before/after_cursor_execute events
+#  - slow queries logged as warnings (DB_SLOW_QUERY_MS)
+#  - how long requests wait for a pool connection (TimedAsyncQueuePool) + pool gauges
+#raw asyncpg calls (core/bulk_ingest.py) bypass SQLAlchemy and are not counted here, they report their own timings
+
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+MAX_TRACKED_STATEMENTS = 200 # statements past this share the "other" histogram
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+logger = logging.getLogger("src.core.db.slow")
+
+
+class Histogram:
+    """Latency histogram with fixed buckets (ms); percentiles are the upper bound of their bucket (capped at max)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1) # last bucket: > BUCKETS_MS[-1]
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        target = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(float(BUCKETS_MS[i]), self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": {f"le_{b}": n for b, n in zip(BUCKETS_MS, self.counts)} | {"inf": self.counts[-1]},
+        }
+
+
+class DatabaseMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements: dict[str, Histogram] = {}
+            self.checkout_wait = Histogram()
+            self.slow_queries = 0
+            self.errors = 0
+            self.checkout_timeouts = 0
+            self.checkout_errors = 0
+            self.connections_opened = 0
+
+    def observe_statement(self, statement: str, ms: float):
+        key = statement_key(statement)
+        with self._lock:
+            histogram = self.statements.get(key)
+            if histogram is None:
+                key = key if len(self.statements) < MAX_TRACKED_STATEMENTS else "other"
+                histogram = self.statements.setdefault(key, Histogram())
+            histogram.observe(ms)
+            if ms >= SLOW_QUERY_MS:
+                self.slow_queries += 1
+        if ms >= SLOW_QUERY_MS:
+            logger.warning("Slow query (%.1f ms): %s", ms, key)
+
+    def observe_checkout(self, ms: float):
+        with self._lock:
+            self.checkout_wait.observe(ms)
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool=None) -> dict:
+        with self._lock:
+            statements = sorted(
+                ((key, h.snapshot()) for key, h in self.statements.items()),
+                key=lambda item: item[1]["total_ms"],
+                reverse=True, # where the time goes first
+            )
+            result = {
+                "statements": [{"statement": key, **snap} for key, snap in statements],
+                "slow_query_threshold_ms": SLOW_QUERY_MS,
+                "slow_queries": self.slow_queries,
+                "errors": self.errors,
+                "pool": {
+                    "checkout_wait": self.checkout_wait.snapshot(),
+                    "checkout_timeouts": self.checkout_timeouts,
+                    "checkout_errors": self.checkout_errors,
+                    "connections_opened": self.connections_opened,
+                },
+            }
+        if pool is not None:
+            result["pool"] |= {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            }
+        return result
+
+
+db_metrics = DatabaseMetrics()
+
+
+_WHITESPACE = re.compile(r"\s+")
+_PARAM_LIST = re.compile(r"\$\d+(?:\s*(?:::\w+)?\s*,\s*\$\d+)+") # IN ($1, $2, ...) expanded by SQLAlchemy
+
+
+def statement_key(statement: str) -> str:
+    """One key per query shape: whitespace collapsed, expanded parameter lists folded, truncated."""
+    key = _WHITESPACE.sub(" ", statement).strip()
+    key = _PARAM_LIST.sub("$...", key)
+    return key[:300]
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            # pool_timeout expired with no free connection
+            db_metrics.count("checkout_timeouts")
+            raise
+        except Exception:
+            # the pool had room but opening the connection failed (database down, bad credentials, ...)
+            db_metrics.count("checkout_errors")
+            raise
+        finally:
+            db_metrics.observe_checkout((time.perf_counter() - start) * 1000)
+
+
+def instrument_engine(engine):
+    """Attaches the timing events to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        db_metrics.observe_statement(statement, (time.perf_counter() - start) * 1000)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # the statement failed: after_cursor_execute never runs for it
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        db_metrics.count("errors")
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        db_metrics.count("connections_opened")
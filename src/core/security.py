@@ -1,6 +1,8 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 from typing import Any
 
@@ -8,6 +10,9 @@ from typing import Any
 SECRET_KEY = os.getenv("SECRET_KEY", "default-secret-key-change-me")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# argon2 takes tens of ms of CPU per call; it runs on this many threads (argon2-cffi releases the GIL),
+# so logins never block the event loop and at most this many hashes run at the same time
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
 
 # CryptContext for password hashing
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
@@ -21,6 +26,17 @@ def get_password_hash(password: str) -> str:
     #function that hashes password - this should be used when creating new users (authentication)
     return pwd_context.hash(password)
 
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+
+#async versions for the request handlers - same functions, run on the bounded executor
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 #JWT token functions
 def create_access_token(data: dict[str, Any], expires_delta: timedelta | None = None) -> str:
     """Creates a signed JWT access token."""
@@ -0,0 +1,229 @@
+# src/downloader.py
+"""
+Descarcare concurenta a pachetelor de imagini Spectator.
+
+- o singura requests.Session cu pool de conexiuni (reutilizam conexiunile TCP/TLS)
+- un pool de thread-uri comun pentru toate fisierele din toate pachetele
+- scriere in bucati (streaming) intr-un fisier .part, apoi rename atomic
+- reluare cu HTTP Range daca exista deja un .part
+- fisierele deja descarcate sunt sarite (verificare dupa marime / checksum cand le stim)
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+PART_SUFFIX = ".part"
+CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+@dataclass
+class DownloadReport:
+    downloaded: int = 0
+    resumed: int = 0
+    skipped: int = 0
+    failed: list = field(default_factory=list)  # (url, mesaj eroare)
+    bytes: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        mb_s = self.bytes / max(self.seconds, 1e-9) / 1e6
+        return (
+            f"{self.downloaded} downloaded, {self.resumed} resumed, {self.skipped} skipped, "
+            f"{len(self.failed)} failed, {self.bytes / 1e6:.1f} MB in {self.seconds:.1f}s ({mb_s:.1f} MB/s)"
+        )
+
+
+def _range_total(response) -> int | None:
+    """Total size from a 416 response's Content-Range header ("bytes */<size>"), if present."""
+    content_range = response.headers.get("Content-Range", "")
+    total = content_range.rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _file_checksum(path: str, algorithm: str = "md5") -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageryDownloader:
+    def __init__(
+        self,
+        api_key: str | None = None,
+        max_workers: int = 8,
+        chunk_size: int = CHUNK_SIZE,
+        timeout: float = 60,
+        retries: int = 3,
+        session: requests.Session | None = None,
+    ):
+        """
+        max_workers bounds the number of files downloaded at the same time (across
+        all packages); the session's connection pool is sized to match.
+        A custom session can be passed in (e.g. for tests against a local server).
+        """
+        self.api_key = api_key
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=max_workers,
+                pool_maxsize=max_workers,
+                max_retries=Retry(
+                    total=retries,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=("GET", "HEAD"),
+                ),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def _params(self) -> dict:
+        return {"api_key": self.api_key} if self.api_key else {}
+
+    def list_files(self, base_url: str) -> list[dict]:
+        """File list of one imagery package (the JSON returned by its download_url)."""
+        response = self.session.get(base_url, params=self._params(), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def download_file(
+        self,
+        url: str,
+        output_path: str,
+        expected_size: int | None = None,
+        expected_checksum: str | None = None,
+        checksum_algorithm: str = "md5",
+    ) -> tuple[str, int]:
+        """
+        Downloads url to output_path and returns (status, bytes_written), status being
+        "skipped", "downloaded" or "resumed".
+
+        output_path only ever appears through an atomic rename of the .part file, so an
+        existing file is complete unless it no longer matches the expected size/checksum.
+        """
+        if os.path.exists(output_path):
+            size_ok = expected_size is None or os.path.getsize(output_path) == expected_size
+            checksum_ok = (
+                expected_checksum is None
+                or _file_checksum(output_path, checksum_algorithm) == expected_checksum.lower()
+            )
+            if size_ok and checksum_ok:
+                return "skipped", 0
+
+        part_path = output_path + PART_SUFFIX
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(
+            url, params=self._params(), headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == 416 and offset and offset == (expected_size or _range_total(response)):
+                # .part-ul era deja complet, doar rename-ul lipsea
+                # (marimea reala vine din expected_size sau din Content-Range: bytes */<size>)
+                written = 0
+            elif response.status_code == 416 and offset:
+                # offset dincolo de marimea fisierului: .part-ul nu e bun, urmatoarea incercare o ia de la zero
+                os.remove(part_path)
+                response.raise_for_status()
+            else:
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # serverul a ignorat Range -> o luam de la capat
+                    offset = 0
+                written = 0
+                with open(part_path, "ab" if offset else "wb") as out:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        out.write(chunk)
+                        written += len(chunk)
+
+        if expected_size is not None and os.path.getsize(part_path) != expected_size:
+            raise IOError(
+                f"Size mismatch for {output_path}: got {os.path.getsize(part_path)}, expected {expected_size}"
+            )
+        if expected_checksum is not None:
+            actual = _file_checksum(part_path, checksum_algorithm)
+            if actual != expected_checksum.lower():
+                os.remove(part_path)  # continut gresit, nu are sens sa-l reluam
+                raise IOError(f"Checksum mismatch for {output_path}")
+
+        os.replace(part_path, output_path)
+        return ("resumed" if offset else "downloaded"), written
+
+    def download_packages(self, items: list[dict], output_dir) -> DownloadReport:
+        """
+        Downloads every file of every imagery package in items (the search results saved
+        by sar_loader.save_metadata) into output_dir/<identifier>/.
+        """
+        report = DownloadReport()
+        start = time.perf_counter()
+
+        packages = []
+        for item in items:
+            base_url = item.get("download_url")
+            identifier = item.get("identifier")
+            if not base_url or not identifier:
+                print("Missing download_url, skipping entry.")
+                continue
+            packages.append((base_url, identifier))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # 1. listele de fisiere pentru toate pachetele, in paralel
+            listings = {pool.submit(self.list_files, url): (url, ident) for url, ident in packages}
+            file_jobs = {}
+            for future in as_completed(listings):
+                base_url, identifier = listings[future]
+                try:
+                    files = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    print(f"Failed to fetch file list for {identifier}: {e}")
+                    report.failed.append((base_url, str(e)))
+                    continue
+
+                region_output_dir = os.path.join(output_dir, identifier)
+                os.makedirs(region_output_dir, exist_ok=True)
+
+                # 2. fiecare fisier merge in acelasi pool (pachetele nu se asteapta unul pe altul)
+                for file_info in files:
+                    file_path = file_info.get("path")
+                    file_name = file_info.get("name")
+                    if not file_path or not file_name:
+                        continue
+                    file_url = f"{base_url.rstrip('/')}/{file_path.lstrip('/')}"
+                    output_path = os.path.join(region_output_dir, file_name)
+                    job = pool.submit(
+                        self.download_file,
+                        file_url,
+                        output_path,
+                        file_info.get("size"),
+                        file_info.get("md5") or file_info.get("checksum"),
+                    )
+                    file_jobs[job] = (file_url, f"{identifier}/{file_name}")
+
+            for future in as_completed(file_jobs):
+                file_url, label = file_jobs[future]
+                try:
+                    status, written = future.result()
+                except (requests.RequestException, IOError) as e:
+                    print(f"   ✗ {label}: {e}")
+                    report.failed.append((file_url, str(e)))
+                    continue
+                print(f"   → {status} {label}")
+                setattr(report, status, getattr(report, status) + 1)
+                report.bytes += written
+
+        report.seconds = time.perf_counter() - start
+        return report
@@ -0,0 +1,245 @@
+# src/embedding_store.py
+"""
+Stocare compacta pe disc a vectorilor de caracteristici (embeddings).
+
+In loc de Dict[(y, x), np.ndarray] tinut in memorie, scriem:
+  - embeddings.bin: matrice (N, D) append-only, citita cu np.memmap (float16 sau float32)
+  - index.bin:      pentru fiecare rand -> scena, (y, x) si geotransform-ul tile-ului
+  - meta.json:      dim, dtype, numarul de randuri, intervalul de randuri al fiecarei scene
+                    si scenele terminate ("complete"; o scena scrisa pe batch-uri e partiala pana atunci)
+
+Randurile unei scene sunt contigue, deci citirea unei scene este un slice (fara copie).
+Un singur proces scrie la un moment dat (nu avem lock intre procese).
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_STORE_DIR = Path("dataset") / "features"  # acelasi folder ca FEATURES_DIR din sar_loader
+STORE_DTYPES = ("float16", "float32")
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("scene", "<i4"),  # pozitia scenei in meta["scenes"]
+        ("y", "<i4"),
+        ("x", "<i4"),
+        ("transform", "<f8", (6,)),  # Affine (a, b, c, d, e, f), NaN daca lipseste
+    ]
+)
+
+
+class EmbeddingStore:
+    def __init__(self, root=DEFAULT_STORE_DIR, dim: int | None = None, dtype: str = "float16"):
+        """
+        Opens (or creates) the store in root. dim is taken from the first append
+        when not given; dtype is only used for a new store, an existing store keeps its own.
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.matrix_path = self.root / "embeddings.bin"
+        self.index_path = self.root / "index.bin"
+        self.meta_path = self.root / "meta.json"
+
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if dim is not None and self.meta["dim"] is not None and dim != self.meta["dim"]:
+                raise ValueError(f"Store in {self.root} has dim {self.meta['dim']}, not {dim}")
+            # store scris inainte de flag-ul "complete": scenele lui sunt considerate terminate
+            self.meta.setdefault("complete", list(self.meta["scenes"]))
+        else:
+            if dtype not in STORE_DTYPES:
+                raise ValueError(f"dtype must be one of {STORE_DTYPES}, got {dtype!r}")
+            self.meta = {"dim": dim, "dtype": dtype, "count": 0, "scenes": {}, "complete": []}
+            self._write_meta()
+
+        self.dtype = np.dtype(self.meta["dtype"])
+        self._truncate_to_count()
+        self._matrix = None
+        self._index = None
+
+    # ---- scriere ----
+
+    def append(self, scene_id: str, coords, embeddings: np.ndarray, transforms=None) -> tuple[int, int]:
+        """
+        Bulk-appends len(coords) rows for scene_id and returns their (start, stop) rows.
+
+        coords: (N, 2) tile corners (y, x); embeddings: (N, D); transforms: optional list
+        of N affine transforms (anything whose first 6 values are a..f).
+        A scene may be appended in several batches, but only while it is the last scene
+        written, so that its rows stay contiguous; call mark_complete after its last batch.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+        embeddings = np.asarray(embeddings).reshape(len(coords), -1)
+        n, dim = embeddings.shape
+        if self.meta["dim"] is None:
+            self.meta["dim"] = dim
+        elif dim != self.meta["dim"]:
+            raise ValueError(f"Expected embeddings of dim {self.meta['dim']}, got {dim}")
+
+        scenes = self.meta["scenes"]
+        count = self.meta["count"]
+        if scene_id in scenes:
+            scene_idx, scene_start, scene_stop = scenes[scene_id]
+            if scene_stop != count:
+                raise ValueError(
+                    f"Scene {scene_id!r} is already stored and is not the last scene; the store is append-only"
+                )
+        else:
+            scene_idx, scene_start = len(scenes), count
+
+        index = np.zeros(n, dtype=INDEX_DTYPE)
+        index["scene"] = scene_idx
+        index["y"] = coords[:, 0]
+        index["x"] = coords[:, 1]
+        if transforms is None:
+            index["transform"] = np.nan
+        else:
+            index["transform"] = [tuple(t)[:6] for t in transforms]
+
+        with open(self.matrix_path, "ab") as f:
+            f.write(np.ascontiguousarray(embeddings, dtype=self.dtype).tobytes())
+        with open(self.index_path, "ab") as f:
+            f.write(index.tobytes())
+
+        # meta.json e scris ultimul: daca procesul moare inainte, randurile in plus sunt ignorate
+        scenes[scene_id] = [scene_idx, scene_start, count + n]
+        self.meta["count"] = count + n
+        self._write_meta()
+        self._matrix = self._index = None
+        return count, count + n
+
+    def mark_complete(self, scene_id: str):
+        """Records that every row of scene_id has been appended."""
+        if scene_id not in self.meta["scenes"]:
+            raise KeyError(f"Scene {scene_id!r} not in store {self.root}")
+        if scene_id not in self.meta["complete"]:
+            self.meta["complete"].append(scene_id)
+            self._write_meta()
+
+    def is_complete(self, scene_id: str) -> bool:
+        return scene_id in self.meta["complete"]
+
+    def discard_incomplete_scene(self) -> str | None:
+        """
+        Removes the last scene if it was never marked complete (the process died while it
+        was being appended) and returns its id, so the scene can be written again.
+        """
+        scenes = self.meta["scenes"]
+        last = max(scenes, key=lambda s: scenes[s][2], default=None)
+        if last is None or self.is_complete(last):
+            return None
+        self.discard_last_scene(last)
+        return last
+
+    def discard_last_scene(self, scene_id: str):
+        """
+        Removes the rows of scene_id (e.g. a scene whose read failed halfway). Only the last
+        scene written can be removed, the store is otherwise append-only.
+        """
+        scenes = self.meta["scenes"]
+        if scene_id not in scenes:
+            return
+        _, start, stop = scenes[scene_id]
+        if stop != self.meta["count"]:
+            raise ValueError(f"Scene {scene_id!r} is not the last scene, it cannot be removed")
+        del scenes[scene_id]
+        if scene_id in self.meta["complete"]:
+            self.meta["complete"].remove(scene_id)
+        self.meta["count"] = start
+        self._write_meta()
+        self._truncate_to_count()
+        self._matrix = self._index = None
+
+    def append_features(self, scene_id: str, features: dict, transforms=None) -> tuple[int, int]:
+        """Appends the {(y, x): vector} dict returned by integrate_and_infer, as a complete scene."""
+        coords = list(features.keys())
+        rows = self.append(scene_id, coords, np.stack([features[c] for c in coords]), transforms)
+        self.mark_complete(scene_id)
+        return rows
+
+    # ---- citire ----
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def dim(self):
+        return self.meta["dim"]
+
+    def scene_ids(self) -> list[str]:
+        return list(self.meta["scenes"].keys())
+
+    def matrix(self) -> np.ndarray:
+        """Read-only memmap of all rows, shape (N, D)."""
+        if self._matrix is None:
+            count = self.meta["count"]
+            if count == 0:
+                return np.empty((0, self.meta["dim"] or 0), dtype=self.dtype)
+            self._matrix = np.memmap(
+                self.matrix_path, dtype=self.dtype, mode="r", shape=(count, self.meta["dim"])
+            )
+        return self._matrix
+
+    def index(self) -> np.ndarray:
+        """Read-only memmap of the sidecar index, one INDEX_DTYPE record per row."""
+        if self._index is None:
+            count = self.meta["count"]
+            if count == 0:
+                return np.empty(0, dtype=INDEX_DTYPE)
+            self._index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", shape=(count,))
+        return self._index
+
+    def scene_rows(self, scene_id: str) -> slice:
+        if scene_id not in self.meta["scenes"]:
+            raise KeyError(f"Scene {scene_id!r} not in store {self.root}")
+        _, start, stop = self.meta["scenes"][scene_id]
+        return slice(start, stop)
+
+    def read_scene(self, scene_id: str) -> tuple[np.ndarray, np.ndarray]:
+        """(embeddings, index) of one scene, both zero-copy memmap views."""
+        rows = self.scene_rows(scene_id)
+        return self.matrix()[rows], self.index()[rows]
+
+    def read_range(self, scene_id: str, y_range=None, x_range=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of scene_id whose tile corner lies in [y0, y1) x [x0, x1) (None = no limit).
+        Returns views when the selected rows are contiguous (e.g. a band of tile rows
+        stored in row-major order), otherwise a gathered copy.
+        """
+        embeddings, index = self.read_scene(scene_id)
+        mask = np.ones(len(index), dtype=bool)
+        if y_range is not None:
+            mask &= (index["y"] >= y_range[0]) & (index["y"] < y_range[1])
+        if x_range is not None:
+            mask &= (index["x"] >= x_range[0]) & (index["x"] < x_range[1])
+
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return embeddings[:0], index[:0]
+        if rows[-1] - rows[0] + 1 == len(rows):
+            return embeddings[rows[0] : rows[-1] + 1], index[rows[0] : rows[-1] + 1]
+        return embeddings[rows], index[rows]
+
+    # ---- intern ----
+
+    def _write_meta(self):
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _truncate_to_count(self):
+        """Drops bytes left behind by an append that crashed before meta.json was updated."""
+        count = self.meta["count"]
+        dim = self.meta["dim"] or 0
+        for path, row_bytes in (
+            (self.matrix_path, dim * self.dtype.itemsize),
+            (self.index_path, INDEX_DTYPE.itemsize),
+        ):
+            if path.exists() and path.stat().st_size > count * row_bytes:
+                with open(path, "r+b") as f:
+                    f.truncate(count * row_bytes)
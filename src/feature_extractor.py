@@ -1,15 +1,24 @@
+import copy
+import threading
+import time
+
 import torch
 import numpy as np
 import satlaspretrain_models
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator
 
-from .transformation import transform_for_inference, tile_image
+from .transformation import (
+    BatchNormalizer,
+    tile_image_stack,
+    transform_batch_for_inference,
+)
 # Assume you implement sar_loader.py to load your actual SAR data - pasul 1
 
 """Configuration"""
 # ID-ul modelului pe care il folosim de la satlaspretrain (Sentinel1, Swin-v2-Base, Single-Image Input)
 S2_MODEL_ID = "Sentinel2_SwinB_SI_RGB"
 CHECKPOINT_PATH = "src/model/marine_placeholder_weights.pth"  # momentan aici am pus weights-urile pt antrenarea modelului de marine pana le facem pe ale noastre
+DEFAULT_BATCH_SIZE = 16  # cate patch-uri trimitem odata prin model
 
 weights_manager = satlaspretrain_models.Weights()
 
@@ -41,32 +50,372 @@ def load_satlas_backbone(model_id: str, checkpoint_path: str | None = None):
         return None
 
 
+"""Moduri de precizie pentru inferenta pe CPU"""
+
+# fp32: modelul original; bf16: autocast bfloat16 (CPU-uri cu AVX512-BF16 / AMX);
+# int8: cuantizare dinamica a straturilor Linear din Swin (doar CPU)
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+
+class _Bf16Autocast(torch.nn.Module):
+    """Runs the wrapped model under CPU bf16 autocast and returns fp32 outputs."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            features = self.model(x)
+        if isinstance(features, (list, tuple)):
+            return [f.float() for f in features]
+        return features.float()
+
+
+def prepare_for_inference(
+    model,
+    precision: str = "fp32",
+    channels_last: bool = False,
+    compile: bool = False,
+    warmup_shape: tuple | None = None,
+):
+    """
+    Returns a copy of model set up for the given precision mode (the original is left
+    untouched, so the fp32 model stays usable as reference).
+    channels_last converts the weights to NHWC; inputs should then be channels_last too
+    (transform_batch_for_inference(..., channels_last=True)). compile wraps the model in
+    torch.compile; warmup_shape (B, C, H, W) runs one forward pass right away so the
+    compile / first-call cost is not paid by the first real batch.
+    """
+    if precision not in PRECISION_MODES:
+        raise ValueError(f"precision must be one of {PRECISION_MODES}, got {precision!r}")
+
+    if precision == "int8":
+        # quantize_dynamic copiaza modelul (inplace=False)
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    elif precision != "fp32" or channels_last or compile:
+        model = copy.deepcopy(model)
+
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if precision == "bf16":
+        model = _Bf16Autocast(model)
+    model.eval()
+    if compile:
+        model = torch.compile(model)
+
+    if warmup_shape is not None:
+        warmup = torch.zeros(warmup_shape)
+        if channels_last:
+            warmup = warmup.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode():
+            model(warmup)
+    return model
+
+
+# modelele incarcate o singura data per proces, cheie = (model_id, checkpoint, mod de inferenta)
+_MODEL_CACHE: Dict[tuple, Any] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def get_cached_backbone(
+    model_id: str = S2_MODEL_ID,
+    checkpoint_path: str | None = CHECKPOINT_PATH,
+    precision: str = "fp32",
+    channels_last: bool = False,
+    compile: bool = False,
+    warmup_shape: tuple | None = None,
+):
+    """
+    Returns the backbone for (model_id, checkpoint_path), loading it only on the
+    first call in this process. Failed loads are not cached so they can be retried.
+    Other precision / layout modes are derived once from the cached fp32 model
+    (see prepare_for_inference) and cached as well.
+    """
+    key = (model_id, checkpoint_path, precision, channels_last, compile)
+    base_key = (model_id, checkpoint_path, "fp32", False, False)
+    with _MODEL_CACHE_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            base = _MODEL_CACHE.get(base_key)
+            if base is None:
+                base = load_satlas_backbone(model_id, checkpoint_path)
+                if base is None:
+                    return None
+                _MODEL_CACHE[base_key] = base
+            model = base
+            if key != base_key:
+                model = prepare_for_inference(
+                    base, precision, channels_last, compile, warmup_shape
+                )
+            _MODEL_CACHE[key] = model
+    return model
+
+
+def clear_model_cache():
+    """Drops every cached backbone (e.g. after swapping checkpoints on disk)."""
+    with _MODEL_CACHE_LOCK:
+        _MODEL_CACHE.clear()
+
+
 """Extragere Features + Transformare pt inferare"""
 
 
+def batch_tiles(
+    tiles: Iterable[tuple], batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[tuple[list, list]]:
+    """
+    Groups the (patch, coords) pairs produced by tile_image into lists of at most
+    batch_size patches. Yields (patches, coords).
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
+
+    patches, coords = [], []
+    for patch, coord in tiles:
+        patches.append(patch)
+        coords.append(coord)
+        if len(patches) == batch_size:
+            yield patches, coords
+            patches, coords = [], []
+    if patches:
+        yield patches, coords
+
+
+def features_to_embeddings(features, batch_len: int) -> np.ndarray:
+    """
+    Flattens the backbone output into one row per patch, shape (N, D).
+    With fpn=True the model returns a list of feature maps, which are concatenated
+    in order (same layout as flattening the output of a batch of 1).
+    """
+    if isinstance(features, (list, tuple)):
+        parts = [f.reshape(batch_len, -1) for f in features]
+        features = torch.cat(parts, dim=1)
+    return features.reshape(batch_len, -1).float().cpu().numpy()
+
+
+def _run_model(model, patches, device, channels_last: bool, normalizer=None) -> np.ndarray:
+    # (B, H, W, C) uint8 -> (B, C, H, W) float, scris in buffer-ul refolosit al normalizer-ului
+    if normalizer is None:
+        input_tensor = transform_batch_for_inference(patches, channels_last=channels_last)
+    else:
+        input_tensor = normalizer(patches)
+    input_tensor = input_tensor.to(device, non_blocking=True)
+
+    with torch.inference_mode():
+        features = model(input_tensor)
+    return features_to_embeddings(features, len(patches))
+
+
+def _run_model_cached(
+    model, patches, tile_cache, device, channels_last: bool, normalizer=None
+) -> np.ndarray:
+    """Runs the model only on tiles missing from tile_cache (each distinct tile once)."""
+    keys, cached = tile_cache.lookup_batch(patches)
+
+    missing = {}  # hash -> index of first tile with that content
+    for i, (key, embedding) in enumerate(zip(keys, cached)):
+        if embedding is None and key not in missing:
+            missing[key] = i
+
+    computed = {}
+    if missing:
+        embeddings = _run_model(
+            model, patches[list(missing.values())], device, channels_last, normalizer
+        )
+        for key, embedding in zip(missing, embeddings):
+            tile_cache.put(key, embedding)
+            computed[key] = embedding
+
+    return np.stack(
+        [emb if emb is not None else computed[key] for key, emb in zip(keys, cached)]
+    )
+
+
+def infer_batches(
+    raw_sar_data: np.ndarray,
+    model=None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    device: str | torch.device = "cpu",
+    stride: int | None = None,
+    edge: str = "shift",
+    channels_last: bool = False,
+    tile_cache=None,
+) -> Iterator[tuple[list, np.ndarray]]:
+    """
+    Runs the backbone over every tile of the scene, batch_size tiles per forward pass.
+    Yields (coords, embeddings) per batch, embeddings having shape (len(coords), D),
+    so callers can persist results incrementally instead of holding the whole scene.
+    stride/edge are passed to tile_image_stack; channels_last should match the model
+    (see prepare_for_inference). With a TileEmbeddingCache (src/tile_cache.py) tiles
+    already seen by the same model are looked up instead of recomputed.
+    """
+    if model is None:
+        model = get_cached_backbone()
+        if model is None:
+            return
+    # intrarile sunt mutate pe device la fiecare batch, modelul o singura data aici (no-op daca e deja acolo)
+    model = model.to(device)
+
+    tiles, tile_coords = tile_image_stack(raw_sar_data, stride=stride, edge=edge)
+    # un singur buffer float pentru toate batch-urile scenei (pinned cand copiem pe GPU)
+    normalizer = BatchNormalizer(channels_last, pin_memory=str(device).startswith("cuda"))
+    for start in range(0, len(tiles), batch_size):
+        patches = tiles[start : start + batch_size]
+        coords = [tuple(c) for c in tile_coords[start : start + batch_size].tolist()]
+
+        if tile_cache is None:
+            embeddings = _run_model(model, patches, device, channels_last, normalizer)
+        else:
+            embeddings = _run_model_cached(
+                model, patches, tile_cache, device, channels_last, normalizer
+            )
+        yield coords, embeddings
+
+
 def integrate_and_infer(
     raw_sar_data: np.ndarray,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    model_id: str = S2_MODEL_ID,
+    checkpoint_path: str | None = CHECKPOINT_PATH,
+    stride: int | None = None,
+    edge: str = "shift",
+    precision: str = "fp32",
+    channels_last: bool = False,
+    tile_cache=None,
+    model=None,
 ) -> Dict[
     tuple, np.ndarray
 ]:  # raw_sar_data este un numpy array care contine datele "raw ale imaginii" -> asta s-ar obtine cu din partea lui Ionut+Dana (alt fisier .py in mod normal)
-    model = load_satlas_backbone(CHECKPOINT_PATH)
+    # model: backbone deja incarcat (ex. modelul mic din benchmarks/), altfel cel din cache
+    if model is None:
+        model = get_cached_backbone(model_id, checkpoint_path, precision, channels_last)
     if model is None:
         return {}
 
     all_features = {}  # retinem caracteristici
+    n_batches = 0
+    start = time.perf_counter()
+
+    # parcurgere toate "bucatile" de 256x256 din imaginea noastra mare, batch_size odata
+    for coords, embeddings in infer_batches(
+        raw_sar_data,
+        model,
+        batch_size,
+        stride=stride,
+        edge=edge,
+        channels_last=channels_last,
+        tile_cache=tile_cache,
+    ):
+        # Stocam trasaturile pentru coordonatele respective (zona) intr-un array NumPy unidimensional
+        for coord, embedding in zip(coords, embeddings):
+            all_features[coord] = embedding
+        n_batches += 1
 
-    # parcurgere toate "bucatile" de 256x256 din imaginea noastra mare
-    for patch, coords in tile_image(raw_sar_data):
-        # 1. transformare in formatul necesar
-        input_tensor = transform_for_inference(patch)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Inference complete. Extracted {len(all_features)} feature vectors "
+        f"in {n_batches} batches ({elapsed:.2f}s)."
+    )
+    if tile_cache is not None:
+        print(f"Tile cache hit rate: {tile_cache.hit_rate:.1%}")
+    return all_features
 
-        # 2. Inferenta
-        with torch.no_grad():
-            # oferim inputul modelului si obtinem vectorul de caracteristici
-            features = model(input_tensor)
 
-        # 3. Stocam trasaturile pentru coordonatele respective (zona) intr-un array NumPy unidimensional
-        all_features[coords] = features.cpu().numpy().flatten()
+def infer_to_store(
+    raw_sar_data: np.ndarray,
+    store,
+    scene_id: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    model_id: str = S2_MODEL_ID,
+    checkpoint_path: str | None = CHECKPOINT_PATH,
+    stride: int | None = None,
+    edge: str = "shift",
+    precision: str = "fp32",
+    channels_last: bool = False,
+    tile_cache=None,
+) -> int:
+    """
+    Like integrate_and_infer, but appends every batch to an EmbeddingStore
+    (src/embedding_store.py) instead of building a dict. Returns the number of rows written.
+    """
+    model = get_cached_backbone(model_id, checkpoint_path, precision, channels_last)
+    if model is None:
+        return 0
 
-    print(f"Inference complete. Extracted {len(all_features)} feature vectors.")
-    return all_features
+    n_rows = 0
+    for coords, embeddings in infer_batches(
+        raw_sar_data,
+        model,
+        batch_size,
+        stride=stride,
+        edge=edge,
+        channels_last=channels_last,
+        tile_cache=tile_cache,
+    ):
+        store.append(scene_id, coords, embeddings)
+        n_rows += len(coords)
+    if n_rows:
+        store.mark_complete(scene_id)
+
+    print(f"Inference complete. Stored {n_rows} feature vectors for scene {scene_id}.")
+    return n_rows
+
+
+def compare_precision_modes(
+    sample_tiles: np.ndarray,
+    modes: Iterable[str] = PRECISION_MODES,
+    model_id: str = S2_MODEL_ID,
+    checkpoint_path: str | None = CHECKPOINT_PATH,
+    channels_last: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, dict]:
+    """
+    Accuracy / speed check of each precision mode against fp32 on a sample of tiles
+    (N, H, W, C), e.g. the first tiles of tile_image_stack(scene).
+    For every mode reports the cosine similarity of its embeddings to the fp32 ones
+    (min and mean over tiles), the relative L2 error, the time per tile and the speedup.
+    """
+
+    def run(model, use_channels_last):
+        outputs = []
+        # un batch de incalzire, netemporizat
+        normalizer = BatchNormalizer(use_channels_last)
+        with torch.inference_mode():
+            model(normalizer(sample_tiles[:batch_size]))
+        start = time.perf_counter()
+        for s in range(0, len(sample_tiles), batch_size):
+            batch = normalizer(sample_tiles[s : s + batch_size])
+            with torch.inference_mode():
+                features = model(batch)
+            outputs.append(features_to_embeddings(features, len(batch)))
+        return np.concatenate(outputs), (time.perf_counter() - start) / len(sample_tiles)
+
+    reference_model = get_cached_backbone(model_id, checkpoint_path)
+    if reference_model is None:
+        return {}
+    reference, reference_time = run(reference_model, False)
+    ref_norm = np.linalg.norm(reference, axis=1)
+
+    results = {}
+    for mode in modes:
+        model = get_cached_backbone(model_id, checkpoint_path, mode, channels_last)
+        embeddings, seconds = run(model, channels_last)
+        cosine = np.sum(embeddings * reference, axis=1) / np.maximum(
+            np.linalg.norm(embeddings, axis=1) * ref_norm, 1e-12
+        )
+        rel_err = np.linalg.norm(embeddings - reference) / max(np.linalg.norm(reference), 1e-12)
+        results[mode] = {
+            "cosine_min": float(cosine.min()),
+            "cosine_mean": float(cosine.mean()),
+            "relative_l2_error": float(rel_err),
+            "seconds_per_tile": seconds,
+            "speedup": reference_time / seconds if seconds else 0.0,
+        }
+        print(
+            f"{mode:>5}: cos min {cosine.min():.4f} / mean {cosine.mean():.4f}, "
+            f"rel err {rel_err:.4f}, {seconds * 1000:.1f} ms/tile, x{results[mode]['speedup']:.2f}"
+        )
+    return results
@@ -0,0 +1,203 @@
+# src/inference_pool.py
+"""
+Inferenta pe CPU cu mai multe procese pentru backbone-ul Satlas (nodurile noastre nu au GPU).
+
+Modelul se incarca o singura data in procesul parinte; parametrii sunt mutati in memorie
+partajata (share_memory), iar workerii (fork) ii folosesc fara sa-i copieze.
+Fiecare worker are un numar fix de thread-uri intra-op, ca sa nu se calce pe picioare
+(workers x threads <= nuclee). Batch-urile unei scene sunt impartite intre workeri.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Iterable, Iterator
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from .feature_extractor import (
+    CHECKPOINT_PATH,
+    DEFAULT_BATCH_SIZE,
+    S2_MODEL_ID,
+    features_to_embeddings,
+    get_cached_backbone,
+)
+from .transformation import BatchNormalizer, tile_image_stack
+
+DEFAULT_THREADS_PER_WORKER = 4  # Swin-B e dominat de GEMM-uri, 4 thread-uri/proces merg bine
+
+_WORKER_MODEL = None  # modelul din procesul worker (setat de _init_worker)
+_WORKER_NORMALIZER = None
+
+
+def available_cores() -> int:
+    """Cores this process may run on (respects taskset / container CPU affinity)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def plan_workers(cores: int | None = None, threads_per_worker: int | None = None) -> tuple[int, int]:
+    """
+    (workers, threads_per_worker) using at most `cores` cores (default: all available).
+    """
+    cores = cores or available_cores()
+    threads = threads_per_worker or min(DEFAULT_THREADS_PER_WORKER, cores)
+    return max(1, cores // threads), threads
+
+
+def candidate_configs(cores: int) -> list[tuple[int, int]]:
+    """Every (workers, threads) split with threads a power of two and workers * threads == cores (or less)."""
+    configs = []
+    threads = 1
+    while threads <= cores:
+        configs.append((cores // threads, threads))
+        threads *= 2
+    return configs
+
+
+def _init_worker(model, threads: int):
+    global _WORKER_MODEL, _WORKER_NORMALIZER
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # poate fi setat o singura data per proces
+    _WORKER_MODEL = model
+    _WORKER_NORMALIZER = BatchNormalizer()
+
+
+def _infer_batch(tiles: np.ndarray) -> np.ndarray:
+    input_tensor = _WORKER_NORMALIZER(tiles)  # buffer refolosit de toate batch-urile worker-ului
+    with torch.inference_mode():
+        features = _WORKER_MODEL(input_tensor)
+    return features_to_embeddings(features, len(tiles))
+
+
+class InferencePool:
+    def __init__(
+        self,
+        model=None,
+        model_id: str = S2_MODEL_ID,
+        checkpoint_path: str | None = CHECKPOINT_PATH,
+        workers: int | None = None,
+        threads_per_worker: int | None = None,
+        start_method: str = "fork",
+    ):
+        """
+        workers / threads_per_worker default to plan_workers() for this machine.
+        Create the pool before running any torch computation in the parent process:
+        forking after OpenMP threads have started can hang the workers.
+        """
+        if model is None:
+            model = get_cached_backbone(model_id, checkpoint_path)
+            if model is None:
+                raise RuntimeError(f"Could not load backbone {model_id}")
+        model.eval()
+        # parametrii in shared memory: cu fork sunt partajati copy-on-write oricum,
+        # cu spawn sunt trimisi ca handle-uri, nu copiati
+        model.share_memory()
+
+        default_workers, default_threads = plan_workers(threads_per_worker=threads_per_worker)
+        self.workers = workers or default_workers
+        self.threads_per_worker = threads_per_worker or default_threads
+
+        ctx = mp.get_context(start_method)
+        self._pool = ctx.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(model, self.threads_per_worker),
+        )
+        self.tiles_done = 0
+        self.seconds = 0.0
+
+    @property
+    def tiles_per_second(self) -> float:
+        return self.tiles_done / self.seconds if self.seconds else 0.0
+
+    def map_batches(self, batches: Iterable[tuple[list, np.ndarray]]) -> Iterator[tuple[list, np.ndarray]]:
+        """
+        batches: (coords, tiles) pairs, tiles being a (B, H, W, C) uint8 stack.
+        Yields (coords, embeddings) in input order while the workers run ahead.
+        """
+        pending_coords = deque()
+
+        def tiles_only():
+            for coords, tiles in batches:
+                pending_coords.append(coords)
+                yield tiles
+
+        seconds_before = self.seconds
+        start = time.perf_counter()
+        for embeddings in self._pool.imap(_infer_batch, tiles_only()):
+            coords = pending_coords.popleft()
+            self.tiles_done += len(coords)
+            self.seconds = seconds_before + time.perf_counter() - start
+            yield coords, embeddings
+
+    def infer_scene(
+        self,
+        raw_sar_data: np.ndarray,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        stride: int | None = None,
+        edge: str = "shift",
+    ) -> Iterator[tuple[list, np.ndarray]]:
+        """Same output as feature_extractor.infer_batches, spread over the worker processes."""
+        tiles, tile_coords = tile_image_stack(raw_sar_data, stride=stride, edge=edge)
+        batches = (
+            (
+                [tuple(c) for c in tile_coords[s : s + batch_size].tolist()],
+                tiles[s : s + batch_size],
+            )
+            for s in range(0, len(tiles), batch_size)
+        )
+        yield from self.map_batches(batches)
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark_configs(
+    sample_tiles: np.ndarray,
+    configs: list[tuple[int, int]] | None = None,
+    model=None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    repeats: int = 4,
+) -> list[dict]:
+    """
+    tiles/sec of each (workers, threads) config on sample_tiles (N, H, W, C), to pick the
+    best split for a given core count. The first batch of every worker is a warmup.
+    """
+    if model is None:
+        model = get_cached_backbone()
+    configs = configs or candidate_configs(available_cores())
+
+    results = []
+    for workers, threads in configs:
+        with InferencePool(model, workers=workers, threads_per_worker=threads) as pool:
+            warmup = [([None] * len(sample_tiles[:batch_size]), sample_tiles[:batch_size])] * workers
+            for _ in pool.map_batches(warmup):
+                pass
+            pool.tiles_done, pool.seconds = 0, 0.0
+
+            batches = [
+                ([None] * len(sample_tiles[s : s + batch_size]), sample_tiles[s : s + batch_size])
+                for _ in range(repeats)
+                for s in range(0, len(sample_tiles), batch_size)
+            ]
+            for _ in pool.map_batches(batches):
+                pass
+            results.append(
+                {"workers": workers, "threads": threads, "tiles_per_second": pool.tiles_per_second}
+            )
+            print(f"workers={workers} threads={threads}: {pool.tiles_per_second:.1f} tiles/s")
+    return results
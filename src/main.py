@@ -19,6 +19,8 @@ from src.core.database import create_db_and_tables
 from src.core.seeder import seed_initial_data
 
 from src.api import user as user_api
+from src.api import detection as detection_api
+from src.api import metrics as metrics_api
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -43,4 +45,6 @@ app = FastAPI(lifespan=lifespan)
 async def root():
     return {"message": "Satlas Detector API is running and GEE is initialized."}
 
-app.include_router(user_api.router, prefix="/api")
\ No newline at end of file
+app.include_router(user_api.router, prefix="/api")
+app.include_router(detection_api.router, prefix="/api")
+app.include_router(metrics_api.router, prefix="/api")
\ No newline at end of file
@@ -1,18 +1,26 @@
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from src.core.database import Base 
 
 class Detection(Base):
     __tablename__ = "detections"
+    __table_args__ = (
+        # GiST for the bbox / ST_Intersects filters (declared here instead of geoalchemy's implicit one)
+        Index("idx_detections_geom", "geom", postgresql_using="gist"),
+        # keyset pagination: newest first inside an AOI, or over all AOIs
+        Index("ix_detections_aoi_timestamp_id", "aoi_id", "timestamp", "id"),
+        Index("ix_detections_timestamp_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, server_default=func.now())
+    # NOT NULL: keyset cursors are built from (timestamp, id); bulk ingest fills missing values with now()
+    timestamp = Column(DateTime, server_default=func.now(), nullable=False)
     score = Column(Float) # Confidence score of the anomaly
     type = Column(String) # e.g., 'construction', 'vehicle_movement'
     
     # PostGIS Column: The precise location/polygon of the detected anomaly within the AOI
-    geom = Column(Geometry(geometry_type='POLYGON', srid=4326), nullable=False)
+    geom = Column(Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False), nullable=False)
     
     # FKs linking to other tables:
     aoi_id = Column(Integer, ForeignKey("areas_of_interest.id"), nullable=False)
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, func, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from src.core.database import Base 
 
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        # scenes of one satellite in a time window, and time windows over all sources in (date, id) order
+        Index("ix_images_source_acquisition_date", "source", "acquisition_date"),
+        Index("ix_images_acquisition_date_id", "acquisition_date", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     # GEE Asset ID or internal tracking ID for the specific satellite scene
@@ -0,0 +1,430 @@
+# src/pipeline.py
+"""
+Pipeline producer/consumer: cautare+descarcare -> citire ferestre -> pregatire tile-uri
+-> inferenta in batch -> salvare embeddings.
+
+Fiecare etapa ruleaza in propriile thread-uri si comunica prin cozi marginite
+(queue.Queue cu maxsize), deci o etapa rapida se blocheaza (backpressure) in loc sa umple
+memoria. Cat timp se descarca o scena, alta e deja in inferenta, asa ca timpul total se
+apropie de cel al celei mai lente etape, nu de suma lor.
+
+Rulare: python -m src.pipeline
+"""
+
+import glob
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+import torch
+
+from .embedding_store import DEFAULT_STORE_DIR, EmbeddingStore
+from .feature_extractor import (
+    CHECKPOINT_PATH,
+    DEFAULT_BATCH_SIZE,
+    S2_MODEL_ID,
+    features_to_embeddings,
+    get_cached_backbone,
+)
+from .scene_reader import iter_scene_batches, scene_grid
+from .transformation import BatchNormalizer
+
+_DONE = object()  # marcheaza sfarsitul cozii
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items_in: int = 0
+    items_out: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0  # timp petrecut in fn (fara asteptari)
+    blocked_seconds: float = 0.0  # asteptare la coada urmatoare plina (backpressure)
+    idle_seconds: float = 0.0  # asteptare dupa input
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def throughput(self) -> float:
+        """Items processed per second of busy time, per worker."""
+        return self.items_in / self.busy_seconds if self.busy_seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.name:<16} workers={self.workers} in={self.items_in} out={self.items_out} "
+            f"err={self.errors} busy={self.busy_seconds:.1f}s blocked={self.blocked_seconds:.1f}s "
+            f"idle={self.idle_seconds:.1f}s ({self.throughput():.2f} items/s/worker)"
+        )
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        workers: int = 1,
+        queue_size: int = 4,
+        on_finish: Callable | None = None,
+    ):
+        """
+        fn(item) returns an iterable of outputs for the next stage (or None).
+        queue_size bounds this stage's input queue; on_finish() is called once, after
+        the last item of the stage has been processed.
+        """
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.on_finish = on_finish
+        self.stats = StageStats(name, workers)
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage]):
+        self.stages = stages
+        self.wall_seconds = 0.0
+
+    def run(self, inputs: Iterable) -> list[StageStats]:
+        """Feeds inputs through every stage and blocks until all of them are drained."""
+        queues = [queue.Queue(maxsize=s.queue_size) for s in self.stages]
+        alive = [s.workers for s in self.stages]
+        alive_lock = threading.Lock()
+
+        def feed():
+            for item in inputs:
+                queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+
+        def work(i: int):
+            stage = self.stages[i]
+            stats = stage.stats
+            in_q = queues[i]
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+
+            while True:
+                t_wait = time.perf_counter()
+                item = in_q.get()
+                t_start = time.perf_counter()
+                blocked = produced = 0
+
+                if item is _DONE:
+                    with stats.lock:
+                        stats.idle_seconds += t_start - t_wait
+                    break
+                try:
+                    for out in stage.fn(item) or ():
+                        produced += 1
+                        if out_q is not None:
+                            t_put = time.perf_counter()
+                            out_q.put(out)
+                            blocked += time.perf_counter() - t_put
+                    failed = False
+                except Exception as e:
+                    print(f"[{stage.name}] Eroare: {e}")
+                    failed = True
+
+                with stats.lock:
+                    stats.idle_seconds += t_start - t_wait
+                    stats.busy_seconds += time.perf_counter() - t_start - blocked
+                    stats.blocked_seconds += blocked
+                    stats.items_in += 1
+                    stats.items_out += produced
+                    stats.errors += failed
+
+            # ultimul worker al etapei anunta etapa urmatoare ca nu mai vine nimic
+            with alive_lock:
+                alive[i] -= 1
+                last = alive[i] == 0
+            if last and stage.on_finish is not None:
+                stage.on_finish()
+            if last and out_q is not None:
+                for _ in range(self.stages[i + 1].workers):
+                    out_q.put(_DONE)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        for i, stage in enumerate(self.stages):
+            threads += [
+                threading.Thread(target=work, args=(i,), name=f"{stage.name}-{w}", daemon=True)
+                for w in range(stage.workers)
+            ]
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.wall_seconds = time.perf_counter() - start
+        return [s.stats for s in self.stages]
+
+    def report(self) -> str:
+        lines = [s.stats.summary() for s in self.stages]
+        lines.append(f"{'total':<16} wall={self.wall_seconds:.1f}s")
+        return "\n".join(lines)
+
+
+@dataclass
+class TileBatch:
+    scene_id: str
+    batch_index: int
+    n_batches: int  # cate batch-uri are scena in total (pentru salvare)
+    coords: np.ndarray
+    transforms: list
+    data: object  # tiles (B, p, p, C) -> tensor (B, C, p, p) -> embeddings (B, D)
+    aborted: bool = False  # marker: citirea scenei a esuat, batch fara date
+    normalizer: BatchNormalizer | None = field(default=None, repr=False)  # buffer-ul din care vine data (prepare -> infer)
+
+    @classmethod
+    def abort_marker(cls, scene_id: str, n_batches: int = 0) -> "TileBatch":
+        """Marker sent downstream when a stage fails on a scene: the persister drops the whole scene."""
+        return cls(scene_id, -1, n_batches, np.zeros((0, 2), dtype=np.int64), [], None, aborted=True)
+
+
+class _ScenePersister:
+    """
+    Appends embeddings to the store while keeping each scene's rows contiguous: one scene
+    (the open one) is written directly, batches of other scenes are spilled to per-scene
+    staging files, so memory holds one batch, and written once the open scene completes.
+    A scene whose read, normalization or inference failed (aborted marker) or that is still
+    incomplete at flush is dropped: its staged batches are deleted and, if it was open, its
+    rows are removed from the store, so it is read again on the next run instead of kept
+    half-written. A finished scene is marked complete in the store; a scene left incomplete
+    by a crash is discarded when the next persister starts.
+    """
+
+    def __init__(self, store: EmbeddingStore, staging_dir=None):
+        self.store = store
+        self.staging_dir = Path(staging_dir) if staging_dir is not None else store.root / "staging"
+        self.lock = threading.Lock()
+        self.open_scene = None
+        self.expected = {}  # scene_id -> batch-uri asteptate
+        self.received = {}  # scene_id -> batch-uri primite (scrise sau puse in staging)
+        self.staged = {}  # scene_id -> fisierele din staging, cate unul per batch
+        self.aborted = set()
+        discarded = store.discard_incomplete_scene()
+        if discarded is not None:
+            print(f"[persist] {discarded}: scena ramasa incompleta de la rularea anterioara, o stergem")
+
+    def __call__(self, batch: TileBatch):
+        with self.lock:
+            scene = batch.scene_id
+            if scene in self.aborted:
+                return ()
+            if batch.aborted:
+                self._abort(scene)
+            else:
+                self.expected.setdefault(scene, batch.n_batches)
+                self.received[scene] = self.received.get(scene, 0) + 1
+                if self.open_scene is None:
+                    self.open_scene = scene
+                if scene == self.open_scene:
+                    self._write(batch)
+                else:
+                    self._stage(batch)
+            self._advance()
+        return ()
+
+    def flush(self):
+        """Drops the scenes left incomplete (failed reads / batches), writes the complete staged ones."""
+        with self.lock:
+            for scene in list(self.expected):
+                if not self._complete(scene):
+                    self._abort(scene)
+            self._advance()
+            self.aborted.clear()
+            if self.staging_dir.exists() and not any(self.staging_dir.iterdir()):
+                self.staging_dir.rmdir()
+
+    def _complete(self, scene: str) -> bool:
+        return self.received.get(scene, 0) == self.expected.get(scene)
+
+    def _advance(self):
+        # scena deschisa s-a terminat -> trecem la urmatoarea (cea cu cele mai multe batch-uri in staging)
+        while True:
+            if self.open_scene is not None:
+                if not self._complete(self.open_scene):
+                    return
+                self.store.mark_complete(self.open_scene)
+                self._forget(self.open_scene)
+            self.open_scene = max(self.staged, key=lambda s: len(self.staged[s]), default=None)
+            if self.open_scene is None:
+                return
+            self._unstage(self.open_scene)
+
+    def _abort(self, scene: str):
+        self.aborted.add(scene)
+        for path in self.staged.pop(scene, []):
+            os.remove(path)
+        if scene == self.open_scene:
+            self.store.discard_last_scene(scene)
+            self.open_scene = None
+        self._forget(scene)
+        print(f"[persist] {scene}: scena incompleta, nu o salvam")
+
+    def _forget(self, scene: str):
+        self.expected.pop(scene, None)
+        self.received.pop(scene, None)
+
+    def _write(self, batch: TileBatch):
+        self.store.append(batch.scene_id, batch.coords, batch.data, batch.transforms)
+
+    def _stage(self, batch: TileBatch):
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        path = self.staging_dir / f"{batch.scene_id}.{batch.batch_index:06d}.npz"
+        transforms = np.full((len(batch.coords), 6), np.nan)
+        if batch.transforms is not None:
+            transforms[:] = [tuple(t)[:6] for t in batch.transforms]
+        np.savez(path, coords=batch.coords, embeddings=batch.data, transforms=transforms)
+        self.staged.setdefault(batch.scene_id, []).append(path)
+
+    def _unstage(self, scene: str):
+        for path in sorted(self.staged.pop(scene)):
+            with np.load(path) as staged:
+                self.store.append(scene, staged["coords"], staged["embeddings"], staged["transforms"])
+            os.remove(path)
+
+
+def is_rgb_scene_file(path: str) -> bool:
+    # modelul Sentinel2_SwinB_SI_RGB foloseste imaginea true-color (TCI, 8 biti)
+    name = os.path.basename(path).upper()
+    return "TCI" in name and name.endswith((".TIF", ".TIFF", ".JP2"))
+
+
+def build_scene_pipeline(
+    store: EmbeddingStore,
+    model_id: str = S2_MODEL_ID,
+    checkpoint_path: str | None = CHECKPOINT_PATH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    download_workers: int = 2,
+    read_workers: int = 2,
+    prepare_workers: int = 2,
+    infer_workers: int = 1,
+    queue_size: int = 4,
+    scene_filter: Callable[[str], bool] = is_rgb_scene_file,
+    device: str = "cpu",
+) -> Pipeline:
+    """
+    Pipeline whose inputs are (location_name, location_dict) pairs as in locations.json.
+
+    Stages: search_download (Spectator search + concurrent download, yields raster paths),
+    read (windowed rasterio reads, yields uint tile batches), prepare (normalization to
+    NCHW float tensors), infer (batched backbone forward), persist (EmbeddingStore append).
+    """
+    # importat aici: sar_loader cere SPECTATOR_API_KEY la import
+    from . import sar_loader
+    from .downloader import ImageryDownloader
+
+    downloader = ImageryDownloader(api_key=sar_loader.API_KEY)
+
+    def search_download(location):
+        loc_name, loc_data = location
+        images = sar_loader.search_images(
+            lat=loc_data["lat"],
+            lon=loc_data["lon"],
+            date_from=loc_data["date_from"],
+            date_to=loc_data["date_to"],
+            name=loc_data.get("name", "#"),
+            type=loc_data.get("type", "default"),
+        )
+        for item in images:
+            downloader.download_packages([item], sar_loader.IMAGES_DIR)
+            package_dir = os.path.join(sar_loader.IMAGES_DIR, item.get("identifier", ""))
+            for path in sorted(glob.glob(os.path.join(package_dir, "**", "*"), recursive=True)):
+                if scene_filter(path):
+                    yield path
+
+    def read(path):
+        scene_id = os.path.splitext(os.path.basename(path))[0]
+        if store.is_complete(scene_id):
+            print(f"[read] {scene_id} deja in store, sarim")
+            return
+        n_batches = 0
+        try:
+            n_batches = -(-len(scene_grid(path)) // batch_size)
+            for i, scene_batch in enumerate(iter_scene_batches(path, batch_size=batch_size)):
+                yield TileBatch(
+                    scene_id=scene_id,
+                    batch_index=i,
+                    n_batches=n_batches,
+                    coords=scene_batch.coords,
+                    transforms=scene_batch.transforms,
+                    data=scene_batch.tiles,
+                )
+        except Exception:
+            # persist-ul afla ca scena e incompleta si arunca ce a primit din ea
+            yield TileBatch.abort_marker(scene_id, n_batches)
+            raise
+
+    # buffere (pinned pe GPU) refolosite intre batch-uri: prepare ia unul din pool, infer il
+    # returneaza dupa forward. Un singur buffer per worker nu ajunge, batch-ul normalizat
+    # asteapta in coada de inferenta cat worker-ul normalizeaza urmatorul; pool-ul acopera
+    # toate batch-urile care pot fi in zbor (cate unul per worker prepare si infer + coada dintre ele)
+    pin_memory = str(device).startswith("cuda")
+    normalizers = queue.Queue()
+    for _ in range(prepare_workers + queue_size + infer_workers):
+        normalizers.put(BatchNormalizer(pin_memory=pin_memory))
+
+    def prepare(batch: TileBatch):
+        if batch.aborted:
+            yield batch
+            return
+        normalizer = normalizers.get()
+        try:
+            batch.data = normalizer(batch.data)
+        except Exception:
+            normalizers.put(normalizer)
+            # fara batch-ul asta scena nu se mai poate termina: persist-ul o arunca imediat
+            yield TileBatch.abort_marker(batch.scene_id, batch.n_batches)
+            raise
+        batch.normalizer = normalizer
+        yield batch
+
+    model = get_cached_backbone(model_id, checkpoint_path)
+    if model is None:
+        raise RuntimeError(f"Could not load backbone {model_id}")
+    model.to(device)
+
+    def infer(batch: TileBatch):
+        if batch.aborted:
+            yield batch
+            return
+        try:
+            with torch.inference_mode():
+                features = model(batch.data.to(device, non_blocking=True))
+            # .cpu() asteapta si copierea asincrona din buffer, abia apoi poate fi refolosit
+            batch.data = features_to_embeddings(features, len(batch.coords))
+        except Exception:
+            yield TileBatch.abort_marker(batch.scene_id, batch.n_batches)
+            raise
+        finally:
+            normalizers.put(batch.normalizer)
+            batch.normalizer = None
+        yield batch
+
+    persister = _ScenePersister(store)
+
+    return Pipeline(
+        [
+            Stage("search_download", search_download, download_workers, queue_size),
+            Stage("read", read, read_workers, queue_size),
+            Stage("prepare", prepare, prepare_workers, queue_size),
+            Stage("infer", infer, infer_workers, queue_size),
+            Stage("persist", persister, 1, queue_size, on_finish=persister.flush),
+        ]
+    )
+
+
+if __name__ == "__main__":
+    from . import sar_loader
+
+    pipeline = build_scene_pipeline(EmbeddingStore(DEFAULT_STORE_DIR))
+    pipeline.run(
+        (name, data) for name, data in sar_loader.LOCATIONS.items() if data
+    )
+    print(pipeline.report())
@@ -7,6 +7,13 @@ from pathlib import Path
 from datetime import date
 from dotenv import load_dotenv
 
+try:
+    from .downloader import ImageryDownloader
+    from .search_cache import SearchCache
+except ImportError:  # rulat ca script: python src/sar_loader.py
+    from downloader import ImageryDownloader
+    from search_cache import SearchCache
+
 
 def load_locations(paths):
     for path in paths:
@@ -31,16 +38,36 @@ BASE_URL = "https://api.spectator.earth"
 DATASET_DIR = Path("dataset")
 IMAGES_DIR = DATASET_DIR / "images"  # imagini descarcate
 FEATURES_DIR = DATASET_DIR / "features"  # pentru vectorii generati ??
+SEARCH_CACHE_DIR = DATASET_DIR / "cache" / "search"  # rezultatele cautarilor, refolosite intre rulari
 IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 FEATURES_DIR.mkdir(parents=True, exist_ok=True)
 
+SEARCH_CACHE = SearchCache(SEARCH_CACHE_DIR)
+
+
+def _fetch_images(params):
+    # un singur request la API; ridica exceptie la erori ca sa nu salvam in cache rezultate goale
+    url = f"{BASE_URL}/imagery/"  # request la API
+    response = requests.get(url, params=params)
+    response.raise_for_status()
+    return response.json().get("results", [])
+
 
 def search_images(
-    lat, lon, date_from, date_to, name="#", type="default", max_cloud=20, bbox_size=0.01
+    lat,
+    lon,
+    date_from,
+    date_to,
+    name="#",
+    type="default",
+    max_cloud=20,
+    bbox_size=0.01,
+    cache=SEARCH_CACHE,
 ):
     # cautare imag satelit pe Spectator
     # max_cloud = procent max de nori acceptat
     # bbox_size = 0.05 inseamna un patrat de 0.1 grade in jurul locatiei
+    # cache = SearchCache sau None; cu cache se cer la API doar intervalele de date noi
 
     print(f"\n Cautare imagini pentru ({lat}, {lon})")
     print(f"   Perioada: {date_from} → {date_to}")
@@ -53,37 +80,33 @@ def search_images(
         lat + bbox_size,
     ]  # bounding box
     bbox = ",".join(f"{crd:.2f}" for crd in bbox)
-
-    # Parametri query
-    params = {
-        "api_key": API_KEY,
-        "bbox": bbox,  # convertire lista în string
-        "date_from": date_from,
-        "date_to": date_to,
-        "cc_less_than": max_cloud,
-        "satellites": "Sentinel-2A,Sentinel-2B",  # si/sau Sentinel-1 ?
-    }
-
-    url = f"{BASE_URL}/imagery/"  # request la API
+    satellites = "Sentinel-2A,Sentinel-2B"  # si/sau Sentinel-1 ?
+
+    def fetch(fetch_from, fetch_to):
+        # Parametri query
+        params = {
+            "api_key": API_KEY,
+            "bbox": bbox,  # convertire lista în string
+            "date_from": fetch_from,
+            "date_to": fetch_to,
+            "cc_less_than": max_cloud,
+            "satellites": satellites,
+        }
+        return _fetch_images(params)
 
     try:
-        response = requests.get(url, params=params)
-        # response.raise_for_status()
-
-        data = response.json()
-
-        file_path = "output.txt"
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
-
-        images = data.get("results", [])
+        if cache is None:
+            images = fetch(date_from, date_to)
+        else:
+            calls_before = cache.api_calls
+            images = cache.search(bbox, max_cloud, satellites, date_from, date_to, fetch)
+            print(f"   Cereri API: {cache.api_calls - calls_before} (restul din cache)")
 
         print(f"Gasite {len(images)} imagini")
         return images
 
     except requests.exceptions.HTTPError as e:
-        if response.status_code == 401:
+        if e.response is not None and e.response.status_code == 401:
             print("Eroare: API key invalid sau lipsa!")
             print("   Verifica fisierul .env")
         else:
@@ -100,7 +123,7 @@ def save_metadata(images, filename="spectator_metadata.json"):
         json.dump(images, f, indent=2)
 
 
-def download_image(filename, output_dir=IMAGES_DIR):
+def download_image(filename, output_dir=IMAGES_DIR, max_workers=8):
     os.makedirs(output_dir, exist_ok=True)
 
     data = None
@@ -109,62 +132,12 @@ def download_image(filename, output_dir=IMAGES_DIR):
     if data == None:
         return
 
-    for item in data:
-        base_url = item.get("download_url")
-        identifier = item.get("identifier")
-
-        if not base_url or not identifier:
-            print("Missing download_url, skipping entry.")
-            continue
-
-        region_output_dir = os.path.join(output_dir, identifier)
-        os.makedirs(region_output_dir, exist_ok=True)
-
-        api_addon = "?api_key={api_key}".format(api_key=API_KEY)
-        base_url_with_api = base_url + api_addon
-
-        print(f"\nFetching file list for: {identifier}")
-
-        # 1. get the list of files inside this imagery package
-        try:
-            file_list_response = requests.get(base_url_with_api)
-            file_list_response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"Failed to fetch file list: {e}")
-            continue
-
-        try:
-            files = file_list_response.json()
-        except ValueError:
-            print("The server did not return valid JSON for file list.")
-            continue
-
-        # 2. download each file inside that imagery folder
-        for file_info in files:
-            file_path = file_info.get("path")
-            file_name = file_info.get("name")
-            file_url = os.path.join(base_url, file_path) + api_addon
-
-            if not file_path or not file_name:
-                continue
-
-            output_path = os.path.join(region_output_dir, file_name)
-            print(f"   → Downloading {file_name}")
-
-            try:
-                file_data = requests.get(file_url)
-                file_data.raise_for_status()
-            except requests.RequestException as e:
-                print(f"Failed: {e}")
-                continue
-
-            # save file to disk
-            with open(output_path, "wb") as out:
-                out.write(file_data.content)
-
-    print("\nALL DONE")
+    # toate fisierele din toate pachetele trec prin acelasi pool de conexiuni / thread-uri
+    downloader = ImageryDownloader(api_key=API_KEY, max_workers=max_workers)
+    report = downloader.download_packages(data, output_dir)
 
-    pass
+    print(f"\nALL DONE: {report.summary()}")
+    return report
 
 
 def display_results(images):
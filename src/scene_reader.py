@@ -0,0 +1,132 @@
+# src/scene_reader.py
+"""
+Citire ferestre (windowed read) direct din GeoTIFF / JP2 cu rasterio,
+ca sa nu incarcam toata scena Sentinel (10980x10980) in memorie.
+Memoria maxima depinde de batch_size, nu de dimensiunea scenei.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Iterator, Sequence
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.windows import Window
+
+from .transformation import TARGET_PATCH_SIZE, tile_origins
+
+
+@dataclass
+class SceneBatch:
+    tiles: np.ndarray  # (B, patch, patch, C), acelasi dtype ca rasterul
+    coords: np.ndarray  # (B, 2) coltul (y, x) al fiecarui tile, in pixeli la nivelul citit
+    transforms: list[Affine]  # geotransform-ul fiecarui tile
+    crs: object = None
+
+
+def _overview_factor(src, overview_level: int | None) -> int:
+    """
+    Decimation factor for the requested overview level (None = full resolution).
+    Rasters without internal overviews use the usual 2 ** (level + 1) pyramid factor:
+    the read is then decimated by GDAL (out_shape), just slower than from a stored overview.
+    """
+    if overview_level is None:
+        return 1
+    if overview_level < 0:
+        raise ValueError(f"overview_level must be >= 0, got {overview_level}")
+    factors = src.overviews(1)
+    if not factors:
+        return 2 ** (overview_level + 1)
+    if overview_level >= len(factors):
+        raise ValueError(
+            f"overview_level {overview_level} not available, raster has {len(factors)} overviews"
+        )
+    return factors[overview_level]
+
+
+def scene_grid(
+    path: str,
+    patch_size: int = TARGET_PATCH_SIZE,
+    stride: int | None = None,
+    edge: str = "shift",
+    overview_level: int | None = None,
+) -> np.ndarray:
+    """Tile corners (N, 2) a scene would be read at, without reading any pixels."""
+    with rasterio.open(path) as src:
+        factor = _overview_factor(src, overview_level)
+        height = math.ceil(src.height / factor)
+        width = math.ceil(src.width / factor)
+    return tile_origins(height, width, patch_size, stride, edge)
+
+
+def iter_scene_batches(
+    path: str,
+    batch_size: int = 16,
+    patch_size: int = TARGET_PATCH_SIZE,
+    stride: int | None = None,
+    edge: str = "shift",
+    bands: Sequence[int] | None = None,
+    overview_level: int | None = None,
+) -> Iterator[SceneBatch]:
+    """
+    Yields SceneBatch objects of at most batch_size tiles read straight from disk.
+
+    bands are 1-based rasterio band indexes (default: all bands, in file order).
+    overview_level picks one of the raster's overviews (0 = first reduced level);
+    for rasters without internal overviews level l means a 2 ** (l + 1) decimation, done by GDAL on read.
+    Tiling follows tile_origins (stride / edge policy); windows past the border
+    are zero-filled.
+    """
+    with rasterio.open(path) as src:
+        indexes = list(bands) if bands else list(src.indexes)
+        factor = _overview_factor(src, overview_level)
+        height = math.ceil(src.height / factor)
+        width = math.ceil(src.width / factor)
+        coords = tile_origins(height, width, patch_size, stride, edge)
+        # transform la nivelul citit (pixel mai mare cu factor)
+        level_transform = src.transform * Affine.scale(factor)
+
+        for start in range(0, len(coords), batch_size):
+            batch_coords = coords[start : start + batch_size]
+            # citim in (B, C, p, p) si expunem (B, p, p, C) ca view, fara copie
+            buf = np.empty(
+                (len(batch_coords), len(indexes), patch_size, patch_size),
+                dtype=src.dtypes[indexes[0] - 1],
+            )
+            transforms = []
+            for i, (y, x) in enumerate(batch_coords.tolist()):
+                window = Window(
+                    x * factor, y * factor, patch_size * factor, patch_size * factor
+                )
+                boundless = (
+                    (y + patch_size) * factor > src.height
+                    or (x + patch_size) * factor > src.width
+                )
+                src.read(
+                    indexes,
+                    window=window,
+                    out=buf[i],
+                    boundless=boundless,
+                    fill_value=0,
+                )
+                transforms.append(level_transform * Affine.translation(x, y))
+
+            yield SceneBatch(
+                tiles=np.moveaxis(buf, 1, -1),
+                coords=batch_coords,
+                transforms=transforms,
+                crs=src.crs,
+            )
+
+
+def iter_scene_tiles(path: str, **kwargs):
+    """
+    Same tiles as iter_scene_batches, one at a time, as (patch, (y, x), transform).
+    Drop-in for tile_image when the scene does not fit in memory.
+    """
+    for batch in iter_scene_batches(path, **kwargs):
+        for tile, (y, x), transform in zip(
+            batch.tiles, batch.coords.tolist(), batch.transforms
+        ):
+            yield tile, (y, x), transform
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field, field_validator
+
+# --- Input Schemas ---
+class DetectionIn(BaseModel):
+    type: str
+    score: float = Field(ge=0, le=1)
+    # geometria ca WKB/EWKB in hex (ce dau ST_AsEWKB / shapely.to_wkb(hex=True)), poligon in EPSG:4326
+    geom_wkb: str
+    timestamp: datetime | None = None # None -> now() in baza de date
+
+    @field_validator("geom_wkb")
+    @classmethod
+    def validate_hex(cls, value: str) -> str:
+        try:
+            bytes.fromhex(value)
+        except ValueError:
+            raise ValueError("geom_wkb must be a hex-encoded WKB geometry")
+        return value
+
+
+class DetectionBatchIn(BaseModel):
+    # all detections of a batch come from the same scene, model and AOI
+    aoi_id: int
+    image_id: int
+    model_id: int
+    create_alerts: bool = True
+    detections: list[DetectionIn] = Field(min_length=1)
+
+# --- Output Schemas ---
+class BatchTiming(BaseModel):
+    rows: int
+    alerts: int
+    copy_ms: float # COPY in tabela temporara
+    insert_ms: float # INSERT ... SELECT in detections + alerts
+    total_ms: float
+
+
+class DetectionBatchOut(BaseModel):
+    inserted: int
+    alerts: int
+    detection_ids: list[int]
+    batches: list[BatchTiming]
+    total_ms: float
+
+
+class DetectionOut(BaseModel):
+    id: int
+    timestamp: datetime
+    score: float | None
+    type: str | None
+    aoi_id: int
+    image_id: int
+    model_id: int
+    geometry: dict # GeoJSON (ST_AsGeoJSON)
+
+
+class DetectionPage(BaseModel):
+    items: list[DetectionOut]
+    next_cursor: str | None = None # None on the last page
@@ -0,0 +1,158 @@
+# src/search_cache.py
+"""
+Cache pe disc pentru cautarile Spectator (/imagery/).
+
+Cheia = (bbox, max_cloud, satellites). Pentru fiecare cheie pastram segmentele de date
+[date_from, date_to] deja interogate, cu rezultatele lor. La o cautare noua cerem la API
+doar sub-intervalele care nu sunt acoperite de segmente inca valide (TTL).
+Fisierele vechi sunt sterse cand cache-ul depaseste max_bytes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+DEFAULT_CACHE_DIR = Path("dataset") / "cache" / "search"
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _to_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def subtract_ranges(start: date, end: date, covered: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    """Parts of [start, end] (inclusive, day granularity) not covered by any range in covered."""
+    gaps = []
+    cursor = start
+    for seg_start, seg_end in sorted(covered):
+        if seg_end < cursor:
+            continue
+        if seg_start > end:
+            break
+        if seg_start > cursor:
+            gaps.append((cursor, seg_start - timedelta(days=1)))
+        cursor = max(cursor, seg_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class SearchCache:
+    def __init__(
+        self,
+        root=DEFAULT_CACHE_DIR,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # cautari concurente pe aceeasi cheie asteapta una dupa alta si refolosesc rezultatul
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self.api_calls = 0
+
+    @staticmethod
+    def make_key(bbox: str, max_cloud, satellites: str) -> str:
+        raw = json.dumps([bbox, max_cloud, satellites])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _load(self, key: str) -> list[dict]:
+        """Segments of key that are still within the TTL."""
+        path = self._path(key)
+        if not path.exists():
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return []
+        now = time.time()
+        return [s for s in entry.get("segments", []) if now - s["fetched_at"] < self.ttl_seconds]
+
+    def _save(self, key: str, query: dict, segments: list[dict]):
+        path = self._path(key)
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"query": query, "segments": segments}, f)
+        os.replace(tmp_path, path)
+
+    def search(
+        self,
+        bbox: str,
+        max_cloud,
+        satellites: str,
+        date_from,
+        date_to,
+        fetch: Callable[[str, str], list],
+    ) -> list[dict]:
+        """
+        Results for [date_from, date_to]; fetch(date_from, date_to) is only called for
+        the sub-ranges not already cached. fetch must raise on errors, so that failed
+        requests are never stored as empty results.
+        """
+        key = self.make_key(bbox, max_cloud, satellites)
+        start, end = _to_date(date_from), _to_date(date_to)
+
+        with self._locks_guard:
+            lock = self._locks[key]
+        with lock:
+            segments = self._load(key)
+            covered = [(_to_date(s["date_from"]), _to_date(s["date_to"])) for s in segments]
+            gaps = subtract_ranges(start, end, covered)
+
+            for gap_start, gap_end in gaps:
+                results = fetch(gap_start.isoformat(), gap_end.isoformat())
+                self.api_calls += 1
+                segments.append(
+                    {
+                        "date_from": gap_start.isoformat(),
+                        "date_to": gap_end.isoformat(),
+                        "fetched_at": time.time(),
+                        "results": results,
+                    }
+                )
+
+            if gaps:
+                query = {"bbox": bbox, "max_cloud": max_cloud, "satellites": satellites}
+                self._save(key, query, segments)
+                self.evict()
+            elif self._path(key).exists():
+                os.utime(self._path(key))  # marcam intrarea ca folosita recent (pentru evict)
+
+        return self._merge(segments, start, end)
+
+    @staticmethod
+    def _merge(segments: list[dict], start: date, end: date) -> list[dict]:
+        """Results of all segments within [start, end], without duplicates, sorted by date."""
+        merged = {}
+        for segment in segments:
+            for image in segment["results"]:
+                image_date = image.get("date")
+                if image_date and not start <= _to_date(image_date) <= end:
+                    continue
+                merged[image.get("id", json.dumps(image, sort_keys=True))] = image
+        return sorted(merged.values(), key=lambda img: str(img.get("date", "")))
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits in max_bytes."""
+        entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.root.glob("*.json")]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,150 @@
+# src/tile_cache.py
+"""
+Cache de embeddings la nivel de tile, cheia fiind un hash al continutului tile-ului + modelul.
+
+Revizitam aceleasi AOI la cateva zile; multe tile-uri sunt identice sau complet no-data
+(zero). Pentru ele nu mai rulam Swin-B, doar citim embedding-ul salvat.
+  - fata: LRU in memorie (OrderedDict) limitat in octeti (embeddings FPN au ~2.8 MB fiecare)
+  - spate: cate un .npy pe disc per hash, sters cel mai vechi cand depasim max_bytes
+
+Hash-ul se face pe octetii tile-ului brut (uint8): normalizarea Satlas e determinista,
+deci doi tile identici raman identici si dupa normalizare.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_TILE_CACHE_DIR = Path("dataset") / "cache" / "tiles"
+DEFAULT_MEMORY_BYTES = 256 * 1024**2
+DEFAULT_MAX_BYTES = 8 * 1024**3
+
+
+def model_cache_key(model_id: str, checkpoint_path: str | None = None, precision: str = "fp32") -> str:
+    """Model part of the cache key; changes when the checkpoint file on disk changes."""
+    version = ""
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        stat = os.stat(checkpoint_path)
+        version = f"{stat.st_size}-{int(stat.st_mtime)}"
+    return f"{model_id}|{checkpoint_path}|{version}|{precision}"
+
+
+class TileEmbeddingCache:
+    def __init__(
+        self,
+        model_key: str,
+        root=DEFAULT_TILE_CACHE_DIR,
+        memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.model_key = model_key
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+
+        self._memory = OrderedDict()
+        self._memory_used = 0  # suma nbytes a intrarilor din memorie
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_bytes = sum(p.stat().st_size for p in self.root.glob("*/*.npy"))
+
+    def tile_hash(self, tile: np.ndarray) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_key.encode("utf-8"))
+        digest.update(f"{tile.shape}{tile.dtype}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(tile).data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npy"
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return embedding
+
+        path = self._path(key)
+        try:
+            embedding = np.load(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(path)  # folosit recent -> ultimul la evict
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding: np.ndarray):
+        embedding = np.asarray(embedding)
+        path = self._path(key)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, embedding)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += path.stat().st_size
+        with self._lock:
+            self._remember(key, embedding)
+            over_budget = self._disk_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        if embedding.nbytes > self.memory_bytes:
+            return  # nu incape deloc, ramane doar pe disc
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= previous.nbytes
+        self._memory[key] = embedding
+        self._memory_used += embedding.nbytes
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.nbytes
+
+    def evict(self, target_fraction: float = 0.9):
+        """Deletes least recently used files until the disk part is under target_fraction * max_bytes."""
+        entries = sorted(
+            (p.stat().st_mtime, p.stat().st_size, p) for p in self.root.glob("*/*.npy")
+        )
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * target_fraction
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def lookup_batch(self, tiles) -> tuple[list[str], list]:
+        """Hashes of a batch of tiles and their cached embeddings (None where missing)."""
+        keys = [self.tile_hash(t) for t in tiles]
+        return keys, [self.get(k) for k in keys]
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "disk_bytes": self._disk_bytes,
+        }
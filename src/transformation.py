@@ -2,8 +2,10 @@
 import torch
 import numpy as np
 import cv2
+from numpy.lib.stride_tricks import sliding_window_view
 
 TARGET_PATCH_SIZE = 256
+EDGE_POLICIES = ("drop", "pad", "shift")
 
 
 def transform_image_to_ndarray(image_path) -> np.ndarray:
@@ -11,13 +13,14 @@ def transform_image_to_ndarray(image_path) -> np.ndarray:
     return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
 
-def transform_for_inference(sar_patch: np.ndarray) -> torch.Tensor:
+def transform_for_inference(sar_patch: np.ndarray, channels_last: bool = False) -> torch.Tensor:
     """
     Aplicare Satlas S-2 Normalization (vezi Normalization.md din repo-ul lor)
     + convertire patch in PyTorch tensor format (1, C, H, W).
+    channels_last=True returneaza tensorul in format de memorie NHWC (pentru modele convertite cu channels_last).
     """
-    # 1. Convertire in PyTorch tensor (must be float idk)
-    tensor = torch.from_numpy(sar_patch).float()
+    # 1. Convertire in PyTorch tensor (must be float idk); astype copiaza, deci merge si pe view-urile read-only din tile_image
+    tensor = torch.from_numpy(sar_patch.astype(np.float32))
 
     # 2. Normalizarea Satlas Sentinel-2: Divide by 255 and clip to 0-1
     tensor = tensor / 255.0
@@ -29,23 +32,205 @@ def transform_for_inference(sar_patch: np.ndarray) -> torch.Tensor:
     # 4. (C, H, W) -> (1, C, H, W); B=batch=1
     tensor_batch = tensor.unsqueeze(0)  # nume amuzant functie lmao
 
+    if channels_last:
+        return tensor_batch.contiguous(memory_format=torch.channels_last)
     return tensor_batch
 
 
-def tile_image(image_data: np.ndarray, patch_size: int = TARGET_PATCH_SIZE):
+def transform_batch_for_inference(
+    tiles: np.ndarray,
+    out: torch.Tensor | None = None,
+    channels_last: bool = False,
+    pin_memory: bool = False,
+) -> torch.Tensor:
+    """
+    Batch version of transform_for_inference: tiles (N, H, W, C) -> float32 (N, C, H, W).
+    Normalizarea e scrisa direct in tensorul destinatie, intr-o singura trecere
+    (torch.div cu out=, citind stiva uint8 printr-un view permutat), fara temporare per tile.
+    out: buffer (>= N, C, H, W) refolosit intre apeluri (vezi BatchNormalizer); se intoarce out[:N].
+    Clip-ul la 0-1 e facut doar pentru tipuri mai late decat uint8 (uint8 / 255 e deja in 0-1).
+    tiles poate fi un view cu stride-uri (ex. o felie din TileStack): nu se copiaza, e citit direct.
+    """
+    src = torch.from_numpy(tiles).permute(0, 3, 1, 2)
+    n = src.shape[0]
+    if out is None:
+        out = _empty_batch(n, *src.shape[1:], channels_last, pin_memory)
+    elif out.shape[0] < n or out.shape[1:] != src.shape[1:]:
+        raise ValueError(f"out has shape {tuple(out.shape)}, need at least {(n, *src.shape[1:])}")
+
+    dst = out[:n]
+    torch.div(src, 255.0, out=dst)
+    if src.dtype != torch.uint8:
+        dst.clamp_(0.0, 1.0)
+    return dst
+
+
+def _empty_batch(n: int, c: int, h: int, w: int, channels_last: bool, pin_memory: bool) -> torch.Tensor:
+    pin_memory = pin_memory and torch.cuda.is_available()
+    if channels_last:
+        # stocare NHWC, vazuta ca (N, C, H, W) -> format channels_last
+        return torch.empty((n, h, w, c), pin_memory=pin_memory).permute(0, 3, 1, 2)
+    return torch.empty((n, c, h, w), pin_memory=pin_memory)
+
+
+class BatchNormalizer:
+    """
+    Keeps one float32 buffer (pinned if requested) for transform_batch_for_inference and
+    reuses it for every batch, growing it only when a larger batch arrives. The returned
+    tensor is a view into the buffer: it is overwritten by the next call, so use it
+    (model forward) before normalizing the next batch.
+    """
+
+    def __init__(self, channels_last: bool = False, pin_memory: bool = False):
+        self.channels_last = channels_last
+        self.pin_memory = pin_memory
+        self._buffer = None
+
+    def __call__(self, tiles: np.ndarray) -> torch.Tensor:
+        n, h, w, c = tiles.shape
+        buffer = self._buffer
+        if buffer is None or buffer.shape[0] < n or buffer.shape[1:] != (c, h, w):
+            buffer = _empty_batch(n, c, h, w, self.channels_last, self.pin_memory)
+            self._buffer = buffer
+        return transform_batch_for_inference(tiles, out=buffer)
+
+
+def _axis_starts(length: int, patch_size: int, stride: int, edge: str) -> np.ndarray:
+    """Start offsets of the tiles along one axis for the given edge policy."""
+    if length < patch_size:
+        # imaginea e mai mica decat un patch: doar pad o poate acoperi
+        return np.zeros(1, dtype=np.int64) if edge != "drop" else np.zeros(0, dtype=np.int64)
+
+    starts = np.arange(0, length - patch_size + 1, stride, dtype=np.int64)
+    if starts[-1] + patch_size < length:
+        if edge == "shift":
+            # ultimul patch e lipit de margine (se suprapune cu penultimul)
+            starts = np.append(starts, length - patch_size)
+        elif edge == "pad":
+            # inca un pas pe grila, completat cu zero dupa margine
+            starts = np.append(starts, starts[-1] + stride)
+    return starts
+
+
+def tile_origins(
+    height: int,
+    width: int,
+    patch_size: int = TARGET_PATCH_SIZE,
+    stride: int | None = None,
+    edge: str = "shift",
+) -> np.ndarray:
+    """
+    Top-left (y, x) corner of every tile, shape (N, 2), in row-major order.
+
+    stride defaults to patch_size (no overlap); stride < patch_size gives overlapping tiles.
+    edge controls the right/bottom remainder when the size is not a multiple of the stride:
+      - "drop":  ignore it (old behaviour)
+      - "shift": add a last tile aligned to the border, overlapping its neighbour
+      - "pad":   add a last tile on the regular grid, zero-padded past the border
+    Images smaller than patch_size are always padded unless edge == "drop".
+    """
+    if edge not in EDGE_POLICIES:
+        raise ValueError(f"edge must be one of {EDGE_POLICIES}, got {edge!r}")
+    stride = patch_size if stride is None else stride
+    if stride < 1:
+        raise ValueError("stride must be >= 1")
+
+    ys = _axis_starts(height, patch_size, stride, edge)
+    xs = _axis_starts(width, patch_size, stride, edge)
+    grid_y, grid_x = np.meshgrid(ys, xs, indexing="ij")
+    return np.stack([grid_y.ravel(), grid_x.ravel()], axis=1)
+
+
+class TileStack:
+    """
+    Lazy (N, patch_size, patch_size, C) stack of the tiles at coords, backed by a strided
+    view of the image: the full stack is never materialized. Indexing one tile returns a
+    view (read-only); slicing a batch (stack[s:e]) gathers just those tiles into a new array,
+    the one copy the normalization needs anyway. Tiles running past the border ("pad" policy,
+    images smaller than a patch) are zero-filled per tile, without padding the whole image.
+    """
+
+    def __init__(self, image_data: np.ndarray, coords: np.ndarray, patch_size: int):
+        self.image = image_data
+        self.coords = coords
+        self.patch_size = patch_size
+        H, W, C = image_data.shape
+        self.shape = (len(coords), patch_size, patch_size, C)
+        self.dtype = image_data.dtype
+        self.ndim = 4
+        # (H - p + 1, W - p + 1, p, p, C), doar daca imaginea are macar un patch intreg
+        self.windows = None
+        if H >= patch_size and W >= patch_size:
+            self.windows = sliding_window_view(image_data, (patch_size, patch_size, C))[:, :, 0]
+        self._inside = (coords[:, 0] + patch_size <= H) & (coords[:, 1] + patch_size <= W)
+
+    def grid(self, stride: int) -> np.ndarray:
+        """Zero-copy (rows, cols, p, p, C) view of the tiles on the regular stride grid (no edge tiles)."""
+        if self.windows is None:
+            return np.zeros((0, 0, *self.shape[1:]), dtype=self.dtype)
+        return self.windows[::stride, ::stride]
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if self._inside[key]:
+                y, x = self.coords[key]
+                return self.windows[y, x]
+            return self._gather(self.coords[key : key + 1] if key >= 0 else self.coords[[key]])[0]
+        return self._gather(self.coords[key])
+
+    def __array__(self, dtype=None, copy=None):
+        tiles = self._gather(self.coords)
+        return tiles if dtype is None else tiles.astype(dtype, copy=False)
+
+    def _gather(self, coords: np.ndarray) -> np.ndarray:
+        coords = coords.reshape(-1, 2)
+        p = self.patch_size
+        H, W = self.image.shape[:2]
+        inside = (coords[:, 0] + p <= H) & (coords[:, 1] + p <= W)
+        if len(coords) == 0:
+            return np.zeros((0, *self.shape[1:]), dtype=self.dtype)
+        if inside.all():
+            return self.windows[coords[:, 0], coords[:, 1]]
+
+        tiles = np.zeros((len(coords), *self.shape[1:]), dtype=self.dtype)
+        if inside.any():
+            tiles[inside] = self.windows[coords[inside, 0], coords[inside, 1]]
+        for i in np.flatnonzero(~inside):
+            y, x = coords[i]
+            h, w = min(p, H - y), min(p, W - x)
+            tiles[i, :h, :w] = self.image[y : y + h, x : x + w]
+        return tiles
+
+
+def tile_image_stack(
+    image_data: np.ndarray,
+    patch_size: int = TARGET_PATCH_SIZE,
+    stride: int | None = None,
+    edge: str = "shift",
+) -> tuple[TileStack, np.ndarray]:
+    """
+    Tiles the whole image in one call.
+    Returns (tiles, coords): tiles is a TileStack of shape (N, patch_size, patch_size, C),
+    a lazy view over the image (batches are gathered only when sliced, tiles[s:e]);
+    np.asarray(tiles) materializes the whole stack. coords has shape (N, 2) with the
+    (y, x) corner of each tile. Batched consumers can slice both directly.
+    """
+    coords = tile_origins(image_data.shape[0], image_data.shape[1], patch_size, stride, edge)
+    return TileStack(image_data, coords, patch_size), coords
+
+
+def tile_image(
+    image_data: np.ndarray,
+    patch_size: int = TARGET_PATCH_SIZE,
+    stride: int | None = None,
+    edge: str = "shift",
+):
     # image_data este imaginea mare (cea de interes selectata), patch_size este dimensiunea fixata (256x256) in care impartim imaginea mare, ulterior pasandu-le modelului
-    H, W, C = (
-        image_data.shape
-    )  # height, width, channels; din ce am inteles C=2 pt ca sunt canale: VV (vertical-vertical) si VH (vertical-horizontal). nu ne batem capul lasam asa cum e
-    for y in range(0, H, patch_size):  # x si y cresc din 256 in 256
-        for x in range(0, W, patch_size):
-            if (
-                y + patch_size <= H and x + patch_size <= W
-            ):  # ne asiguram ca nu depasim la final dimensiunile imaginii mari
-                patch = image_data[
-                    y : y + patch_size, x : x + patch_size, :
-                ]  # salvare bucata de dimensiune patch_size (256x256x2)
-                yield (
-                    patch,
-                    (y, x),
-                )  # yield pentru ca fct asta e apelata in feature_extractor de mai multe ori. Generam fiecare patch la request
+    # C=2 pt SAR (VV, VH) sau 3 pt RGB; patch-urile sunt view-uri in imagine (fara copii), deci read-only:
+    # cine vrea sa le modifice sau sa le dea direct la torch.from_numpy face intai o copie (np.array(patch))
+    stack, coords = tile_image_stack(image_data, patch_size, stride, edge)
+    for i, (y, x) in enumerate(coords.tolist()):
+        yield stack[i], (y, x)  # generam fiecare patch la request
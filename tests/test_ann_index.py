@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import src.ann_index as ann_index
+from src.ann_index import IVFPQIndex
+from src.embedding_store import EmbeddingStore
+
+
+def clustered(n: int, dim: int = 32, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32) * 3
+    return centers[rng.integers(0, clusters, n)] + rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def brute_force(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    data = data / np.linalg.norm(data, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ data.T), axis=1)[:, :k]
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth)) / truth.size
+
+
+@pytest.fixture
+def data():
+    return clustered(8000)
+
+
+@pytest.fixture
+def queries(data):
+    rng = np.random.default_rng(1)
+    return data[rng.choice(len(data), 50, replace=False)] + 0.05 * rng.normal(size=(50, data.shape[1])).astype(np.float32)
+
+
+def build(root, data, batch=1000):
+    index = IVFPQIndex(root, nlist=32, m=8)
+    index.train(data[:4000])
+    for s in range(0, len(data), batch):
+        index.add(data[s : s + batch])
+    return IVFPQIndex(root)
+
+
+def test_recall_against_brute_force(tmp_path, data, queries):
+    index = build(tmp_path, data)
+    truth = brute_force(data, queries, 10)
+
+    _, approx = index.search(queries, k=10, nprobe=32)
+    _, refined = index.search(queries, k=10, nprobe=32, refine=data, refine_factor=10)
+
+    assert recall(approx, truth) >= 0.5
+    assert recall(refined, truth) >= 0.95
+
+
+def test_merged_layout_gives_same_results(tmp_path, data, queries, monkeypatch):
+    tail_only = build(tmp_path / "tail", data)
+    monkeypatch.setattr(ann_index, "MERGE_TAIL_ROWS", 2500)
+    merged = build(tmp_path / "merged", data)
+
+    assert tail_only.meta["sorted_count"] == 0
+    assert 0 < merged.meta["sorted_count"] <= len(data)
+    dist_a, ids_a = tail_only.search(queries, k=10, nprobe=8)
+    dist_b, ids_b = merged.search(queries, k=10, nprobe=8)
+    np.testing.assert_allclose(dist_a, dist_b)
+    np.testing.assert_array_equal(np.sort(ids_a, axis=1), np.sort(ids_b, axis=1))
+
+
+def test_add_from_store_is_idempotent(tmp_path, data, monkeypatch):
+    store = EmbeddingStore(tmp_path / "store", dtype="float32")
+    for i in range(4):
+        store.append(f"s{i}", np.stack(np.divmod(np.arange(2000), 50), axis=1), data[i * 2000 : (i + 1) * 2000])
+    index = IVFPQIndex(tmp_path / "index", nlist=32, m=8)
+    index.train(data[:4000])
+
+    commit = index._commit
+    calls = []
+
+    def crash_on_second_scene(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("crash")
+        commit(*args)
+
+    monkeypatch.setattr(index, "_commit", crash_on_second_scene)
+    with pytest.raises(RuntimeError):
+        index.add_from_store(store, batch_rows=700)
+
+    index = IVFPQIndex(tmp_path / "index")
+    assert index.meta["scenes"] == ["s0"] and len(index) == 2000
+    index.add_from_store(store, batch_rows=700)
+    index.add_from_store(store, batch_rows=700)
+
+    index = IVFPQIndex(tmp_path / "index")
+    _, ids, _ = index._memmaps()
+    assert index.meta["scenes"] == ["s0", "s1", "s2", "s3"]
+    np.testing.assert_array_equal(np.sort(ids), np.arange(8000))
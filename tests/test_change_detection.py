@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from src.change_detection import ChangeDetector, robust_threshold
+
+
+def grid(n: int, width: int = 50) -> np.ndarray:
+    return np.stack(np.divmod(np.arange(n), width), axis=1)
+
+
+def scenes(n_scenes: int, n_tiles: int, dim: int = 8, seed: int = 0) -> list[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return [rng.normal(size=(n_tiles, dim)).astype(np.float32) for _ in range(n_scenes)]
+
+
+def test_welford_matches_numpy(tmp_path):
+    coords, xs = grid(300), scenes(5, 300)
+    detector = ChangeDetector(tmp_path)
+    for i, x in enumerate(xs):
+        detector.process_scene(f"s{i}", coords, x)
+
+    np.testing.assert_allclose(detector.mean, np.mean(xs, axis=0), atol=1e-5)
+    np.testing.assert_allclose(detector.var, np.var(xs, axis=0), atol=1e-4)
+    assert (detector.count == len(xs)).all()
+
+
+def test_ewma_matches_reference(tmp_path):
+    coords, xs = grid(100), scenes(4, 100)
+    decay = 0.3
+    detector = ChangeDetector(tmp_path, decay=decay)
+    for i, x in enumerate(xs):
+        detector.process_scene(f"s{i}", coords, x)
+
+    mean, var = xs[0].astype(np.float64), np.zeros_like(xs[0], dtype=np.float64)
+    for x in xs[1:]:
+        delta = x - mean
+        mean = mean + decay * delta
+        var = (1 - decay) * (var + decay * delta * delta)
+    np.testing.assert_allclose(detector.mean, mean, atol=1e-5)
+    np.testing.assert_allclose(detector.var, var, atol=1e-5)
+
+
+def test_state_survives_reopen_and_growth(tmp_path):
+    xs = scenes(3, 2000)
+    detector = ChangeDetector(tmp_path)
+    detector.process_scene("s0", grid(2000), xs[0])
+    # tile-uri noi: capacitatea creste peste MIN_CAPACITY
+    detector.process_scene("s1", grid(2000) + 1000, xs[1])
+
+    reopened = ChangeDetector(tmp_path)
+    assert reopened.meta["scenes"] == ["s0", "s1"]
+    assert len(reopened.keys) == 4000
+    np.testing.assert_allclose(reopened.mean[:2000], xs[0])
+    np.testing.assert_allclose(reopened.mean[2000:], xs[1])
+    assert reopened.process_scene("s0", grid(2000), xs[2]) is None
+
+
+def test_uncommitted_update_is_rolled_back(tmp_path):
+    coords, xs = grid(200), scenes(3, 200)
+    detector = ChangeDetector(tmp_path)
+    detector.process_scene("s0", coords, xs[0])
+    detector.process_scene("s1", coords, xs[1])
+
+    # procesul moare dupa update, inainte de save
+    detector.update(np.concatenate([coords, coords + 500]), np.concatenate([xs[2], xs[2]]))
+
+    reopened = ChangeDetector(tmp_path)
+    assert reopened.meta["scenes"] == ["s0", "s1"]
+    assert len(reopened.keys) == 200
+    np.testing.assert_allclose(reopened.mean, np.mean(xs[:2], axis=0), atol=1e-5)
+    assert not list(tmp_path.glob("undo.*"))
+
+
+@pytest.mark.parametrize("metric", ["cosine", "mahalanobis"])
+def test_changed_tiles_are_flagged(tmp_path, metric):
+    rng = np.random.default_rng(0)
+    coords = grid(400)
+    base = rng.normal(size=(400, 16)).astype(np.float32)
+    detector = ChangeDetector(tmp_path, metric=metric)
+    for i in range(6):
+        detector.process_scene(f"s{i}", coords, base + 0.1 * rng.normal(size=base.shape).astype(np.float32))
+
+    changed = base + 0.1 * rng.normal(size=base.shape).astype(np.float32)
+    changed[:5] = rng.normal(size=(5, 16))
+    report = detector.process_scene("new", coords, changed)
+    assert report.flagged[:5].all()
+    assert {yx for yx, _ in report.top(5)} == {tuple(yx) for yx in coords[:5].tolist()}
+
+
+def test_robust_threshold_ignores_nan():
+    scores = np.array([np.nan, 1.0, 1.0, 1.0, 10.0])
+    assert robust_threshold(scores) == pytest.approx(1.0)
+    assert robust_threshold(np.full(3, np.nan)) == np.inf
@@ -0,0 +1,130 @@
+import asyncio
+import struct
+from types import SimpleNamespace
+
+import asyncpg
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+# toate modelele, ca relatiile lui User sa poata fi configurate (ca in src.main)
+import src.models.aoi  # noqa: F401
+import src.models.alert  # noqa: F401
+import src.models.detection  # noqa: F401
+import src.models.image  # noqa: F401
+import src.models.model_ai  # noqa: F401
+import src.models.user  # noqa: F401
+from src.api import deps
+from src.api import detection as detection_api
+from src.models.user import User
+from src.schemas.detection import DetectionBatchIn, DetectionIn
+
+# POLYGON((0 0, 1 0, 1 1, 0 0)) ca WKB little-endian, in hex
+RING = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 0.0)]
+POLYGON_WKB = struct.pack("<BIII8d", 1, 3, 1, len(RING), *(v for point in RING for v in point)).hex()
+
+
+def detection(**overrides) -> dict:
+    return {"type": "vehicle", "score": 0.9, "geom_wkb": POLYGON_WKB, **overrides}
+
+
+def test_valid_hex_wkb_is_accepted():
+    assert DetectionIn(**detection()).geom_wkb == POLYGON_WKB
+    assert DetectionIn(**detection(geom_wkb=POLYGON_WKB.upper())).timestamp is None
+
+
+@pytest.mark.parametrize("geom_wkb", ["not hex", "0103zz", "010"])
+def test_invalid_hex_wkb_is_rejected(geom_wkb):
+    with pytest.raises(ValidationError, match="hex-encoded WKB"):
+        DetectionIn(**detection(geom_wkb=geom_wkb))
+
+
+@pytest.mark.parametrize("score", [-0.1, 1.5])
+def test_score_out_of_range_is_rejected(score):
+    with pytest.raises(ValidationError):
+        DetectionIn(**detection(score=score))
+
+
+def test_empty_batch_is_rejected():
+    with pytest.raises(ValidationError):
+        DetectionBatchIn(aoi_id=1, image_id=1, model_id=1, detections=[])
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class FakeSession:
+    """Answers the AOI owner query, then the role name query of is_admin."""
+
+    def __init__(self, owner_id, role_name="user"):
+        self.answers = [owner_id, role_name]
+
+    async def execute(self, stmt):
+        return FakeResult(self.answers.pop(0))
+
+    async def rollback(self):
+        pass
+
+
+def ingest(session, user_id=5, insert_error=None, monkeypatch=None):
+    inserted = []
+
+    async def fake_bulk_insert(rows, **kwargs):
+        if insert_error is not None:
+            raise insert_error
+        inserted.append(kwargs["aoi_id"])
+        return {"inserted": len(rows)}
+
+    monkeypatch.setattr(detection_api, "bulk_insert_detections", fake_bulk_insert)
+    batch = DetectionBatchIn(aoi_id=1, image_id=2, model_id=3, detections=[detection()])
+    result = asyncio.run(detection_api.ingest_detections(batch, session, SimpleNamespace(id=user_id, role_id=2)))
+    return result, inserted
+
+
+def test_owner_can_ingest(monkeypatch):
+    result, inserted = ingest(FakeSession(owner_id=5), monkeypatch=monkeypatch)
+    assert result == {"inserted": 1} and inserted == [1]
+
+
+def test_admin_can_ingest_into_any_aoi(monkeypatch):
+    _, inserted = ingest(FakeSession(owner_id=7, role_name="admin"), monkeypatch=monkeypatch)
+    assert inserted == [1]
+
+
+@pytest.mark.parametrize("owner_id", [7, None])
+def test_other_users_aoi_looks_missing(monkeypatch, owner_id):
+    with pytest.raises(HTTPException) as exc:
+        ingest(FakeSession(owner_id=owner_id), monkeypatch=monkeypatch)
+    assert exc.value.status_code == 404
+
+
+def test_database_error_text_is_not_returned(monkeypatch):
+    error = asyncpg.PostgresError('parse error - invalid geometry near "detections_geom"')
+    with pytest.raises(HTTPException) as exc:
+        ingest(FakeSession(owner_id=5), insert_error=error, monkeypatch=monkeypatch)
+    assert exc.value.status_code == 422
+    assert exc.value.detail == "Invalid detection batch."
+
+
+class NoQuerySession:
+    async def execute(self, stmt):
+        raise AssertionError("is_admin should use the role name of the principal")
+
+
+def test_is_admin_uses_the_cached_role_name():
+    admin = SimpleNamespace(id=1, role_id=1, role_name="admin")
+    assert asyncio.run(deps.is_admin(NoQuerySession(), admin))
+
+
+def test_role_change_drops_the_cached_principal():
+    user = User(email="a@example.com", role_id=1)
+    user.role_name = "admin"
+    deps._user_cache["a@example.com"] = {"email": "a@example.com", "role_id": 1, "role_name": "admin"}
+    user.role_id = 2
+    assert "a@example.com" not in deps._user_cache
+    assert not hasattr(user, "role_name")
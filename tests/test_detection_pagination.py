@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+# toate modelele, ca relatiile lui User sa poata fi configurate (ca in src.main)
+import src.models.aoi  # noqa: F401
+import src.models.alert  # noqa: F401
+import src.models.detection  # noqa: F401
+import src.models.image  # noqa: F401
+import src.models.model_ai  # noqa: F401
+import src.models.user  # noqa: F401
+from src.api.detection import DetectionFilters, _detection_query, _fetch_page, decode_cursor, encode_cursor
+
+
+def filters(**values) -> DetectionFilters:
+    return DetectionFilters(**{"aoi_id": None, "bbox": None, "start": None, "end": None, "type": None, "min_score": None, **values})
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [datetime(2024, 5, 1, 12, 30, 15, 123456), datetime(1999, 12, 31)],
+)
+def test_cursor_round_trip(timestamp):
+    cursor = encode_cursor(timestamp, 123456789)
+    assert decode_cursor(cursor) == (timestamp, 123456789)
+    assert "|" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor(datetime(2024, 1, 1), 1)[:-4] + "AAAA", "fA=="])
+def test_invalid_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+class FakeMappings:
+    def all(self):
+        return []
+
+
+class FakeResult:
+    def mappings(self):
+        return FakeMappings()
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return FakeResult()
+
+
+def fetch_sql(stmt, after, limit=50) -> str:
+    session = RecordingSession()
+    asyncio.run(_fetch_page(session, stmt, after, limit))
+    return compile_sql(session.statements[0])
+
+
+def test_keyset_predicate_follows_the_sort_order():
+    after = (datetime(2024, 5, 1, 12, 0), 42)
+    sql = fetch_sql(_detection_query(filters(), owner_id=None), after)
+
+    assert "(detections.timestamp, detections.id) < ('2024-05-01 12:00:00', 42)" in sql
+    assert "ORDER BY detections.timestamp DESC, detections.id DESC" in sql
+    assert sql.rstrip().endswith("LIMIT 50")
+    assert "OFFSET" not in sql
+
+
+def test_first_page_has_no_keyset_predicate():
+    sql = fetch_sql(_detection_query(filters(), owner_id=None), None, limit=10)
+    assert "(detections.timestamp, detections.id) <" not in sql
+    assert sql.rstrip().endswith("LIMIT 10")
+
+
+def test_non_admin_query_is_restricted_to_own_aois():
+    sql = compile_sql(_detection_query(filters(aoi_id=3, min_score=0.5), owner_id=7))
+    assert "JOIN areas_of_interest ON areas_of_interest.id = detections.aoi_id" in sql
+    assert "areas_of_interest.user_id = 7" in sql
+    assert "detections.aoi_id = 3" in sql
+    assert "detections.score >= 0.5" in sql
+
+
+def test_admin_query_is_not_joined():
+    assert "areas_of_interest" not in compile_sql(_detection_query(filters(), owner_id=None))
+
+
+@pytest.mark.parametrize("bbox", ["1,2,3", "3,0,1,1", "a,b,c,d"])
+def test_invalid_bbox_is_rejected(bbox):
+    with pytest.raises(HTTPException) as exc:
+        _detection_query(filters(bbox=bbox), owner_id=None)
+    assert exc.value.status_code == 400
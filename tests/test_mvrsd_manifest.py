@@ -0,0 +1,73 @@
+from src.MVSRD_dataset.transformation import MANIFEST_NAME, batch_convert
+
+XML = """<annotation>
+  <filename>{name}.jpg</filename>
+  <size><width>640</width><height>640</height></size>
+  <object><name>LMV</name><bndbox><xmin>10</xmin><ymin>20</ymin><xmax>110</xmax><ymax>60</ymax></bndbox></object>
+</annotation>"""
+
+
+def write_xml(folder, name):
+    path = folder / f"{name}.xml"
+    path.write_text(XML.format(name=name), encoding="utf-8")
+    return path
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    xml_dir, out_dir = tmp_path / "xml", tmp_path / "labels"
+    xml_dir.mkdir()
+    write_xml(xml_dir, "a")
+    write_xml(xml_dir, "b")
+
+    first = batch_convert(xml_dir, out_dir)
+    second = batch_convert(xml_dir, out_dir)
+
+    assert (first["converted"], first["skipped"]) == (2, 0)
+    assert (second["converted"], second["skipped"]) == (0, 2)
+    assert (out_dir / MANIFEST_NAME).exists()
+    assert (out_dir / "a.txt").read_text().startswith("1 ")
+
+
+def test_deleted_or_corrupted_output_is_regenerated(tmp_path):
+    xml_dir, out_dir = tmp_path / "xml", tmp_path / "labels"
+    xml_dir.mkdir()
+    write_xml(xml_dir, "a")
+    write_xml(xml_dir, "b")
+    batch_convert(xml_dir, out_dir)
+    expected = (out_dir / "b.txt").read_text()
+
+    (out_dir / "a.txt").unlink()
+    (out_dir / "b.txt").write_text("garbage")
+    stats = batch_convert(xml_dir, out_dir)
+
+    assert stats["converted"] == 2
+    assert (out_dir / "a.txt").exists()
+    assert (out_dir / "b.txt").read_text() == expected
+
+
+def test_outputs_of_removed_xml_are_deleted(tmp_path):
+    xml_dir, out_dir = tmp_path / "xml", tmp_path / "labels"
+    xml_dir.mkdir()
+    write_xml(xml_dir, "a")
+    stale = write_xml(xml_dir, "b")
+    batch_convert(xml_dir, out_dir)
+
+    stale.unlink()
+    stats = batch_convert(xml_dir, out_dir)
+
+    assert stats["removed"] == 1
+    assert not (out_dir / "b.txt").exists()
+    assert (out_dir / "a.txt").exists()
+
+
+def test_changed_xml_is_converted_again(tmp_path):
+    xml_dir, out_dir = tmp_path / "xml", tmp_path / "labels"
+    xml_dir.mkdir()
+    path = write_xml(xml_dir, "a")
+    batch_convert(xml_dir, out_dir)
+
+    path.write_text(XML.format(name="a").replace("LMV", "AFV"), encoding="utf-8")
+    stats = batch_convert(xml_dir, out_dir)
+
+    assert stats["converted"] == 1
+    assert (out_dir / "a.txt").read_text().startswith("2 ")
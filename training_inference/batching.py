@@ -0,0 +1,111 @@
+"""
+Batch-uri cu mai multe imagini pentru Faster R-CNN.
+
+Imaginile MVRSD nu au toate aceeasi dimensiune, asa ca le grupam in bucket-uri dupa
+aspect ratio si arie (AspectRatioBucketSampler): intr-un batch imaginile au forme apropiate,
+deci padding-ul facut de collate_padded e mic.
+collate_padded pune imaginile intr-un singur tensor (B, C, H, W) -> o singura copiere
+host->device pe pas, apoi split_padded_batch da inapoi imaginile (view-uri, fara copii).
+"""
+
+import math
+import os
+import random
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+import torch
+from torch.utils.data import Sampler
+
+SIZE_DIVISIBLE = 32  # la fel ca GeneralizedRCNNTransform
+
+
+def dataset_image_sizes(dataset) -> list[tuple[int, int]]:
+    """
+    (H, W) of every image of an AerialDataset without decoding it: from the dataset cache
+    when there is one, otherwise from the <size> tag of the VOC annotation.
+    """
+    if getattr(dataset, "cache", None) is not None:
+        return [dataset.cache.image_shape(i)[:2] for i in range(len(dataset))]
+
+    sizes = []
+    for img_id in dataset.ids:
+        size = ET.parse(os.path.join(dataset.ann_dir, img_id + ".xml")).getroot().find("size")
+        sizes.append((int(size.find("height").text), int(size.find("width").text)))
+    return sizes
+
+
+def bucket_key(height: int, width: int) -> tuple[int, int]:
+    # aspect ratio si arie pe scara log2, rotunjite -> bucket-uri de forme asemanatoare
+    return round(math.log2(width / height) * 2), round(math.log2(height * width) * 2)
+
+
+class AspectRatioBucketSampler(Sampler):
+    def __init__(
+        self,
+        sizes: list[tuple[int, int]],
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        seed: int = 0,
+    ):
+        """Yields lists of dataset indexes; every batch comes from a single size bucket."""
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+        self.buckets = defaultdict(list)
+        for idx, (h, w) in enumerate(sizes):
+            self.buckets[bucket_key(h, w)].append(idx)
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def _batches(self) -> list[list[int]]:
+        rng = random.Random(self.seed + self.epoch)
+        batches = []
+        for key in sorted(self.buckets):
+            indexes = list(self.buckets[key])
+            if self.shuffle:
+                rng.shuffle(indexes)
+            for start in range(0, len(indexes), self.batch_size):
+                batch = indexes[start : start + self.batch_size]
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch)
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches())
+
+    def __len__(self):
+        if self.drop_last:
+            return sum(len(b) // self.batch_size for b in self.buckets.values())
+        return sum(math.ceil(len(b) / self.batch_size) for b in self.buckets.values())
+
+
+def collate_padded(batch):
+    """
+    (images (B, C, H, W) zero-padded to the largest image rounded up to SIZE_DIVISIBLE,
+    image_sizes [(h, w), ...], targets). Accepts the (1, C, H, W) images of AerialDataset.
+    """
+    images, targets = list(zip(*batch))
+    images = [img.squeeze(0) if img.dim() == 4 else img for img in images]
+
+    image_sizes = [tuple(img.shape[-2:]) for img in images]
+    h = math.ceil(max(s[0] for s in image_sizes) / SIZE_DIVISIBLE) * SIZE_DIVISIBLE
+    w = math.ceil(max(s[1] for s in image_sizes) / SIZE_DIVISIBLE) * SIZE_DIVISIBLE
+
+    padded = images[0].new_zeros((len(images), images[0].shape[0], h, w))
+    for i, img in enumerate(images):
+        padded[i, :, : img.shape[-2], : img.shape[-1]].copy_(img)
+    return padded, image_sizes, list(targets)
+
+
+def split_padded_batch(padded: torch.Tensor, image_sizes) -> list[torch.Tensor]:
+    """The images of a padded batch, cropped back to their size (views, no copies)."""
+    return [img[:, :h, :w] for img, (h, w) in zip(padded, image_sizes)]
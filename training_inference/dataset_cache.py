@@ -0,0 +1,220 @@
+"""
+Cache pre-procesat pentru AerialDataset (MVRSD).
+
+Construit o singura data, inainte de antrenare:
+  - boxes.npy / labels.npy: toate bounding box-urile si etichetele, pe coloane,
+    cu box_offsets.npy (N+1) -> box-urile imaginii i sunt [box_offsets[i], box_offsets[i+1])
+  - images_XXX.u8: imaginile decodate (RGB uint8, H x W x C), puse una dupa alta in shard-uri
+    citite cu np.memmap; image_index.npy tine (shard, offset, H, W, C) pentru fiecare imagine
+  - meta.json: id-urile imaginilor (in ordine), clasele folosite si amprenta surselor
+    (mtime + dimensiune pentru fiecare .jpg / .xml)
+
+Astfel __getitem__ nu mai parseaza XML si nu mai decodeaza JPEG la fiecare epoca.
+cache_is_current compara amprenta cu img_dir / ann_dir: dupa un re-split sau o corectura
+de etichete cache-ul e reconstruit, nu citit invechit.
+
+Rulare: python training_inference/dataset_cache.py <img_dir> <ann_dir> <cache_dir>
+"""
+
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.transformation import transform_image_to_ndarray
+
+CLASSES = ["SMV", "LMV", "AFV", "MCV", "CV"]
+NAME_TO_ID = {name: i + 1 for i, name in enumerate(CLASSES)}
+
+CACHE_VERSION = 2  # 2: amprenta surselor in meta.json
+DEFAULT_SHARD_BYTES = 1 << 30  # 1 GiB per shard
+
+
+def parse_voc_annotation(ann_path: str, name_to_id: dict = NAME_TO_ID) -> tuple[np.ndarray, np.ndarray]:
+    """Boxes (K, 4) as xmin, ymin, xmax, ymax and labels (K,) of one Pascal VOC file."""
+    boxes = []
+    labels = []
+
+    root = ET.parse(ann_path).getroot()
+    for obj in root.findall("object"):
+        name = obj.find("name").text
+        if name not in name_to_id:
+            continue
+        bnd = obj.find("bndbox")
+        boxes.append(
+            [
+                float(bnd.find("xmin").text),
+                float(bnd.find("ymin").text),
+                float(bnd.find("xmax").text),
+                float(bnd.find("ymax").text),
+            ]
+        )
+        labels.append(name_to_id[name])
+
+    return (
+        np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+        np.asarray(labels, dtype=np.int64),
+    )
+
+
+def cache_exists(cache_dir: str) -> bool:
+    return os.path.exists(os.path.join(cache_dir, "meta.json"))
+
+
+def _image_ids(img_dir: str) -> list[str]:
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(img_dir) if f.endswith(".jpg"))
+
+
+def _file_stamp(path: str) -> list[int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def source_fingerprint(img_dir: str, ann_dir: str, ids: list[str] | None = None) -> dict:
+    """{image id: [[jpg mtime_ns, size], [xml mtime_ns, size]]} of the files the cache is built from."""
+    ids = _image_ids(img_dir) if ids is None else ids
+    return {
+        img_id: [
+            _file_stamp(os.path.join(img_dir, img_id + ".jpg")),
+            _file_stamp(os.path.join(ann_dir, img_id + ".xml")),
+        ]
+        for img_id in ids
+    }
+
+
+def cache_is_current(cache_dir: str, img_dir: str, ann_dir: str, name_to_id: dict = NAME_TO_ID) -> bool:
+    """True if cache_dir holds a complete cache of exactly the current images, annotations and classes."""
+    if not cache_exists(cache_dir):
+        return False
+    with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return (
+        meta.get("version") == CACHE_VERSION
+        and meta.get("classes") == name_to_id
+        and meta.get("sources") == source_fingerprint(img_dir, ann_dir)
+    )
+
+
+def build_dataset_cache(
+    img_dir: str,
+    ann_dir: str,
+    cache_dir: str,
+    name_to_id: dict = NAME_TO_ID,
+    shard_bytes: int = DEFAULT_SHARD_BYTES,
+):
+    """Decodes every .jpg in img_dir and parses its .xml from ann_dir into cache_dir (replacing an old cache)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    # un cache vechi nu mai e valid din momentul in care incepem sa-l rescriem
+    if cache_exists(cache_dir):
+        os.remove(os.path.join(cache_dir, "meta.json"))
+    ids = _image_ids(img_dir)
+    # amprenta luata inainte de citire: un fisier modificat in timpul build-ului declanseaza alt build
+    sources = source_fingerprint(img_dir, ann_dir, ids)
+
+    image_index = np.zeros((len(ids), 5), dtype=np.int64)  # shard, offset, H, W, C
+    box_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    all_boxes, all_labels = [], []
+
+    shard, shard_size = 0, 0
+    shard_file = open(os.path.join(cache_dir, f"images_{shard:03d}.u8"), "wb")
+    try:
+        for i, img_id in enumerate(ids):
+            img = transform_image_to_ndarray(os.path.join(img_dir, img_id + ".jpg"))
+            img = np.ascontiguousarray(img, dtype=np.uint8)
+
+            if shard_size and shard_size + img.nbytes > shard_bytes:
+                shard_file.close()
+                shard, shard_size = shard + 1, 0
+                shard_file = open(os.path.join(cache_dir, f"images_{shard:03d}.u8"), "wb")
+            shard_file.write(img.tobytes())
+            image_index[i] = (shard, shard_size, *img.shape)
+            shard_size += img.nbytes
+
+            boxes, labels = parse_voc_annotation(os.path.join(ann_dir, img_id + ".xml"), name_to_id)
+            all_boxes.append(boxes)
+            all_labels.append(labels)
+            box_offsets[i + 1] = box_offsets[i] + len(boxes)
+    finally:
+        shard_file.close()
+
+    np.save(os.path.join(cache_dir, "image_index.npy"), image_index)
+    np.save(os.path.join(cache_dir, "box_offsets.npy"), box_offsets)
+    np.save(
+        os.path.join(cache_dir, "boxes.npy"),
+        np.concatenate(all_boxes) if all_boxes else np.zeros((0, 4), np.float32),
+    )
+    np.save(
+        os.path.join(cache_dir, "labels.npy"),
+        np.concatenate(all_labels) if all_labels else np.zeros(0, np.int64),
+    )
+    # shard-uri ramase de la un cache mai mare
+    for name in os.listdir(cache_dir):
+        if name.startswith("images_") and name.endswith(".u8") and int(name[7:-3]) > shard:
+            os.remove(os.path.join(cache_dir, name))
+    # meta.json la final: un cache fara meta.json e considerat incomplet
+    with open(os.path.join(cache_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": CACHE_VERSION,
+                "ids": ids,
+                "classes": name_to_id,
+                "shards": shard + 1,
+                "sources": sources,
+            },
+            f,
+        )
+    print(f"[ok] dataset cache: {len(ids)} imagini, {box_offsets[-1]} box-uri -> {cache_dir}")
+
+
+class DatasetCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != CACHE_VERSION:
+            raise ValueError(f"Dataset cache in {cache_dir} has an old format, rebuild it")
+
+        self.ids = self.meta["ids"]
+        self.image_index = np.load(os.path.join(cache_dir, "image_index.npy"))
+        self.box_offsets = np.load(os.path.join(cache_dir, "box_offsets.npy"))
+        self.boxes = np.load(os.path.join(cache_dir, "boxes.npy"))
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"))
+        # shard-urile sunt deschise la prima folosire, in fiecare worker al DataLoader-ului
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _shard(self, shard: int) -> np.ndarray:
+        if shard not in self._shards:
+            path = os.path.join(self.cache_dir, f"images_{shard:03d}.u8")
+            # mode "c" (copy-on-write): array-ul e scriibil pentru torch.from_numpy, fisierul nu se modifica
+            self._shards[shard] = np.memmap(path, dtype=np.uint8, mode="c")
+        return self._shards[shard]
+
+    def image_shape(self, idx: int) -> tuple[int, int, int]:
+        return tuple(int(v) for v in self.image_index[idx, 2:])
+
+    def image(self, idx: int) -> np.ndarray:
+        """Decoded RGB image (H, W, C) as a view into the memory-mapped shard."""
+        shard, offset, h, w, c = (int(v) for v in self.image_index[idx])
+        return self._shard(shard)[offset : offset + h * w * c].reshape(h, w, c)
+
+    def target(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        start, stop = self.box_offsets[idx], self.box_offsets[idx + 1]
+        return self.boxes[start:stop], self.labels[start:stop]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python dataset_cache.py <img_dir> <ann_dir> <cache_dir>")
+        sys.exit(1)
+
+    build_dataset_cache(sys.argv[1], sys.argv[2], sys.argv[3])
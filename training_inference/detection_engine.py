@@ -0,0 +1,232 @@
+"""
+Detectie pe scene satelitare mari cu Faster R-CNN, prin ferestre glisante.
+
+  1. scena e impartita in tile-uri care se suprapun (overlap pixeli), citite direct din
+     raster cu scene_reader.iter_scene_batches (sau din array cu tile_image_stack)
+  2. tile-urile trec prin detector cate batch_size odata (normalizare in buffer refolosit)
+  3. box-urile sunt mutate in coordonatele scenei; cele lipite de o margine interioara a
+     tile-ului sunt aruncate (obiectul apare intreg in tile-ul vecin, datorita suprapunerii)
+  4. duplicatele din zonele de suprapunere sunt unite cu un NMS pe clase (batched_nms)
+  5. box-urile devin poligoane EPSG:4326 (EWKT), cu aceleasi campuri ca modelul Detection
+
+Rulare: python training_inference/detection_engine.py <scena.tif> <detector.pth> [out.jsonl]
+"""
+
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import rasterio
+import torch
+from affine import Affine
+from pyproj import Transformer
+from torchvision.ops import batched_nms
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.scene_reader import iter_scene_batches
+from src.transformation import BatchNormalizer, tile_image_stack
+from training_inference.dataset_cache import CLASSES
+
+DEFAULT_TILE_SIZE = 640  # marimea imaginilor MVRSD pe care a fost antrenat detectorul
+DEFAULT_OVERLAP = 128
+DEFAULT_BATCH_SIZE = 4
+BORDER_MARGIN = 2  # pixeli: box-urile mai aproape de o margine interioara sunt trunchiate
+
+
+@dataclass
+class SceneDetections:
+    boxes: np.ndarray  # (K, 4) xmin, ymin, xmax, ymax in pixeli ai scenei
+    scores: np.ndarray  # (K,)
+    labels: np.ndarray  # (K,) 1..len(CLASSES)
+    transform: Affine | None = None  # pixel -> CRS-ul scenei
+    crs: object = None
+    stats: dict = field(default_factory=dict)
+
+    def to_records(self, class_names: list[str] = CLASSES) -> list[dict]:
+        """One dict per detection with the Detection columns type, score and geom (EWKT, SRID 4326)."""
+        if self.transform is None:
+            raise ValueError("Scene has no geotransform, detections cannot be georeferenced")
+        polygons = boxes_to_polygons(self.boxes, self.transform, self.crs)
+        return [
+            {"type": class_names[label - 1], "score": float(score), "geom": polygon}
+            for label, score, polygon in zip(self.labels.tolist(), self.scores, polygons)
+        ]
+
+
+def boxes_to_polygons(boxes: np.ndarray, transform: Affine, crs=None) -> list[str]:
+    """
+    Pixel boxes (K, 4) -> EWKT polygons in EPSG:4326. The 4 corners of every box go through
+    the affine transform and a single vectorized pyproj call (crs=None means the transform
+    already gives lon/lat).
+    """
+    if len(boxes) == 0:
+        return []
+    # colturile in ordine: (xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)
+    px = boxes[:, [0, 2, 2, 0]]
+    py = boxes[:, [1, 1, 3, 3]]
+    a, b, c, d, e, f = transform[:6]
+    xs = a * px + b * py + c
+    ys = d * px + e * py + f
+    if crs is not None:
+        transformer = Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+        xs, ys = transformer.transform(xs, ys)
+        xs, ys = np.asarray(xs), np.asarray(ys)
+
+    polygons = []
+    for x, y in zip(xs, ys):
+        ring = ", ".join(f"{x[i]:.8f} {y[i]:.8f}" for i in (0, 1, 2, 3, 0))
+        polygons.append(f"SRID=4326;POLYGON(({ring}))")
+    return polygons
+
+
+def _interior_border_mask(
+    boxes: torch.Tensor, tile_size: int, origin: tuple[int, int], scene_shape: tuple[int, int]
+) -> torch.Tensor:
+    """True for boxes not touching an edge of the tile that lies inside the scene."""
+    y, x = origin
+    height, width = scene_shape
+    keep = torch.ones(len(boxes), dtype=torch.bool)
+    limit = tile_size - BORDER_MARGIN
+    if x > 0:
+        keep &= boxes[:, 0] > BORDER_MARGIN
+    if y > 0:
+        keep &= boxes[:, 1] > BORDER_MARGIN
+    if x + tile_size < width:
+        keep &= boxes[:, 2] < limit
+    if y + tile_size < height:
+        keep &= boxes[:, 3] < limit
+    return keep
+
+
+class DetectionEngine:
+    def __init__(
+        self,
+        model,
+        tile_size: int = DEFAULT_TILE_SIZE,
+        overlap: int = DEFAULT_OVERLAP,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        score_threshold: float = 0.5,
+        nms_iou: float = 0.5,
+        device: str = "cpu",
+    ):
+        if not 0 <= overlap < tile_size:
+            raise ValueError("overlap must be in [0, tile_size)")
+        self.model = model.eval()
+        self.tile_size = tile_size
+        self.stride = tile_size - overlap
+        self.batch_size = batch_size
+        self.score_threshold = score_threshold
+        self.nms_iou = nms_iou
+        self.device = device
+        self.normalizer = BatchNormalizer(pin_memory=str(device).startswith("cuda"))
+
+    def _detect_batch(self, tiles: np.ndarray, coords: np.ndarray, scene_shape) -> tuple[list, list, list]:
+        """Boxes in scene pixels (K, 4), scores, labels of one batch of tiles."""
+        if tiles.shape[-1] > 3:
+            tiles = tiles[..., :3]  # detectorul e antrenat pe RGB
+        images = self.normalizer(tiles).to(self.device, non_blocking=True)
+        with torch.inference_mode():
+            outputs = self.model(list(images))
+
+        boxes, scores, labels = [], [], []
+        for output, (y, x) in zip(outputs, coords.tolist()):
+            keep = output["scores"] >= self.score_threshold
+            b = output["boxes"][keep].cpu()
+            inside = _interior_border_mask(b, self.tile_size, (y, x), scene_shape)
+            b = b[inside] + torch.tensor([x, y, x, y], dtype=b.dtype)
+            boxes.append(b)
+            scores.append(output["scores"][keep].cpu()[inside])
+            labels.append(output["labels"][keep].cpu()[inside])
+        return boxes, scores, labels
+
+    def _merge(self, boxes, scores, labels) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        boxes = torch.cat(boxes) if boxes else torch.zeros((0, 4))
+        scores = torch.cat(scores) if scores else torch.zeros(0)
+        labels = torch.cat(labels) if labels else torch.zeros(0, dtype=torch.int64)
+        # NMS separat pe fiecare clasa, intr-un singur apel
+        keep = batched_nms(boxes, scores, labels, self.nms_iou)
+        return boxes[keep].numpy(), scores[keep].numpy(), labels[keep].numpy()
+
+    def detect_array(self, scene: np.ndarray, transform: Affine | None = None, crs=None) -> SceneDetections:
+        """Detections of a scene already in memory, (H, W, C) uint8."""
+        start = time.perf_counter()
+        scene_shape = scene.shape[:2]
+        tiles, coords = tile_image_stack(scene, self.tile_size, self.stride, edge="shift")
+        boxes, scores, labels = [], [], []
+        for s in range(0, len(tiles), self.batch_size):
+            b, sc, lb = self._detect_batch(
+                tiles[s : s + self.batch_size], coords[s : s + self.batch_size], scene_shape
+            )
+            boxes += b
+            scores += sc
+            labels += lb
+        return self._finish(boxes, scores, labels, transform, crs, len(tiles), start)
+
+    def detect_scene(self, path: str, bands=None) -> SceneDetections:
+        """Detections of a raster on disk, read window by window (memory bounded by batch_size)."""
+        start = time.perf_counter()
+        with rasterio.open(path) as src:
+            scene_shape = (src.height, src.width)
+            transform, crs = src.transform, src.crs
+
+        boxes, scores, labels = [], [], []
+        n_tiles = 0
+        for batch in iter_scene_batches(
+            path,
+            batch_size=self.batch_size,
+            patch_size=self.tile_size,
+            stride=self.stride,
+            edge="shift",
+            bands=bands,
+        ):
+            b, sc, lb = self._detect_batch(batch.tiles, batch.coords, scene_shape)
+            boxes += b
+            scores += sc
+            labels += lb
+            n_tiles += len(batch.coords)
+        return self._finish(boxes, scores, labels, transform, crs, n_tiles, start)
+
+    def _finish(self, boxes, scores, labels, transform, crs, n_tiles, start) -> SceneDetections:
+        before_nms = sum(len(b) for b in boxes)
+        boxes, scores, labels = self._merge(boxes, scores, labels)
+        seconds = time.perf_counter() - start
+        stats = {
+            "tiles": n_tiles,
+            "detections_before_nms": before_nms,
+            "detections": len(boxes),
+            "seconds": seconds,
+            "tiles_per_second": n_tiles / seconds if seconds else 0.0,
+            "scenes_per_hour": 3600 / seconds if seconds else 0.0,
+        }
+        return SceneDetections(boxes, scores, labels, transform, crs, stats)
+
+
+if __name__ == "__main__":
+    from training_inference.detector import load_detector
+
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python detection_engine.py <scene.tif> <detector.pth> [out.jsonl]")
+        sys.exit(1)
+
+    model = load_detector(
+        sys.argv[2],
+        os.getenv("MODEL_ID", "Sentinel2_SwinB_SI_RGB"),
+        os.getenv("CHECKPOINT", ""),
+    )
+    engine = DetectionEngine(model)
+    result = engine.detect_scene(sys.argv[1])
+    print(
+        f"{result.stats['detections']} detections ({result.stats['detections_before_nms']} before NMS) "
+        f"in {result.stats['tiles']} tiles, {result.stats['seconds']:.1f}s "
+        f"-> {result.stats['scenes_per_hour']:.1f} scenes/hour"
+    )
+
+    out_path = sys.argv[3] if len(sys.argv) == 4 else os.path.splitext(sys.argv[1])[0] + "_detections.jsonl"
+    with open(out_path, "w", encoding="utf-8") as f:
+        for record in result.to_records():
+            f.write(json.dumps(record) + "\n")
+    print(f"Saved {out_path}")
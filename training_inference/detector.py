@@ -0,0 +1,79 @@
+"""
+Detectorul Faster R-CNN cu backbone Satlas (FPN), comun pentru antrenare (train.py)
+si pentru inferenta pe scene mari (detection_engine.py).
+"""
+
+import os
+import sys
+
+import torch
+from torchvision.models.detection import FasterRCNN
+from torchvision.ops import MultiScaleRoIAlign
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.feature_extractor import load_satlas_backbone
+from training_inference.dataset_cache import CLASSES
+
+SATLAS_FPN_CHANNELS = 128
+
+
+class SatlasBackboneWrapper(torch.nn.Module):
+    def __init__(self, satlas_model, out_channels=256):
+        super().__init__()
+        self.backbone = satlas_model
+        self.out_channels = out_channels
+
+    def forward(self, x):
+        feats = self.backbone(x)
+        if isinstance(feats, (list, tuple)):
+            return {str(i): f for i, f in enumerate(feats)}
+        return {"0": feats}
+
+
+def build_detector(
+    model_id: str,
+    checkpoint_path: str | None = None,
+    device: str = "cpu",
+    compile: bool = False,
+    num_classes: int = len(CLASSES) + 1,
+) -> FasterRCNN:
+    """Faster R-CNN on the frozen Satlas backbone (only RPN + ROI heads are trainable)."""
+    satlas_model = load_satlas_backbone(model_id, checkpoint_path)
+    if satlas_model is None:
+        raise RuntimeError(f"Could not load Satlas backbone {model_id}")
+    satlas_model.to(device)
+    backbone = SatlasBackboneWrapper(satlas_model, out_channels=SATLAS_FPN_CHANNELS)
+    if compile:
+        backbone = torch.compile(backbone, mode="max-autotune")
+    for p in backbone.parameters():
+        p.requires_grad = False
+
+    return FasterRCNN(
+        backbone=backbone,
+        num_classes=num_classes,
+        box_roi_pool=MultiScaleRoIAlign(
+            featmap_names=["0", "1", "2", "3"],  # keys produced in wrapper
+            output_size=7,
+            sampling_ratio=2,
+        ),
+    ).to(device)
+
+
+def detector_state_dict(model) -> dict:
+    """state_dict without the "_orig_mod." prefix torch.compile adds to the backbone keys."""
+    return {k.replace("._orig_mod", ""): v for k, v in model.state_dict().items()}
+
+
+def load_detector(
+    weights_path: str,
+    model_id: str,
+    checkpoint_path: str | None = None,
+    device: str = "cpu",
+) -> FasterRCNN:
+    """Detector with the weights saved by train.py, in eval mode (not compiled, for CPU inference)."""
+    model = build_detector(model_id, checkpoint_path, device)
+    state = torch.load(weights_path, map_location=device, weights_only=True)
+    model.load_state_dict({k.replace("._orig_mod", ""): v for k, v in state.items()})
+    model.eval()
+    return model
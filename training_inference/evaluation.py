@@ -0,0 +1,128 @@
+"""
+Evaluare Faster R-CNN pe setul de validare: AP per clasa si mAP@[.5:.95] (ca la COCO).
+
+Modelul ruleaza in batch-uri, fara gradient, pe val_loader (batch-urile padate din
+batching.collate_padded). Pentru fiecare imagine si clasa calculam o singura matrice IoU
+(torchvision.ops.box_iou) si potrivim predictiile cu ground truth-ul pentru toate pragurile
+IoU deodata; AP-ul vine din sumele cumulative TP/FP ale predictiilor sortate dupa scor,
+cu interpolarea COCO in 101 puncte de recall.
+"""
+
+import numpy as np
+import torch
+from torchvision.ops import box_iou
+
+from training_inference.batching import split_padded_batch
+
+IOU_THRESHOLDS = np.round(np.arange(0.5, 0.951, 0.05), 2)  # 0.50, 0.55, ..., 0.95
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+
+
+def match_detections(
+    pred_boxes: torch.Tensor,
+    pred_scores: torch.Tensor,
+    gt_boxes: torch.Tensor,
+    iou_thresholds: np.ndarray = IOU_THRESHOLDS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Greedy matching of the predictions of one image and one class, highest score first.
+    Returns (scores (P,), tp (P, T) bool), one column per IoU threshold: a prediction is a
+    true positive if its best still-unmatched ground truth box has IoU >= threshold.
+    """
+    order = torch.argsort(pred_scores, descending=True)
+    scores = pred_scores[order].numpy()
+    tp = np.zeros((len(order), len(iou_thresholds)), dtype=bool)
+    if len(order) == 0 or len(gt_boxes) == 0:
+        return scores, tp
+
+    iou = box_iou(pred_boxes[order], gt_boxes).numpy()  # (P, G)
+    matched = np.zeros((len(iou_thresholds), len(gt_boxes)), dtype=bool)  # (T, G)
+    for i in range(len(order)):
+        # IoU-ul predictiei i cu fiecare GT, pentru fiecare prag; GT-urile deja folosite sunt excluse
+        candidates = np.where(matched, -1.0, iou[i][None, :])  # (T, G)
+        best = candidates.argmax(axis=1)
+        best_iou = candidates[np.arange(len(iou_thresholds)), best]
+        hit = best_iou >= iou_thresholds
+        tp[i] = hit
+        matched[np.nonzero(hit)[0], best[hit]] = True
+    return scores, tp
+
+
+def average_precision(scores: np.ndarray, tp: np.ndarray, num_gt: int) -> np.ndarray:
+    """AP for every IoU threshold (T,) from the concatenated (scores, tp) of one class."""
+    if num_gt == 0:
+        return np.full(tp.shape[1], np.nan)
+    if len(scores) == 0:
+        return np.zeros(tp.shape[1])
+
+    order = np.argsort(-scores, kind="stable")
+    tp = tp[order]
+    cum_tp = np.cumsum(tp, axis=0)  # (P, T)
+    cum_fp = np.cumsum(~tp, axis=0)
+    recall = cum_tp / num_gt
+    precision = cum_tp / np.maximum(cum_tp + cum_fp, 1)
+    # anvelopa: precizia maxima la orice recall >= r
+    precision = np.maximum.accumulate(precision[::-1], axis=0)[::-1]
+
+    ap = np.zeros(tp.shape[1])
+    for t in range(tp.shape[1]):
+        idx = np.searchsorted(recall[:, t], RECALL_POINTS, side="left")
+        valid = idx < len(recall)
+        ap[t] = precision[idx[valid], t].sum() / len(RECALL_POINTS)
+    return ap
+
+
+@torch.no_grad()
+def evaluate_detector(model, loader, device: str, class_names: list[str]) -> dict:
+    """
+    Runs model over loader (batches from collate_padded) and returns
+    {"mAP", "mAP_50", "mAP_75", "AP_<class>"...}; AP_<class> is averaged over IoU 0.5:0.95.
+    Classes without ground truth in the split are left out of the mean.
+    """
+    was_training = model.training
+    model.eval()
+
+    num_classes = len(class_names)
+    per_class = {c: {"scores": [], "tp": [], "num_gt": 0} for c in range(1, num_classes + 1)}
+
+    for images, image_sizes, targets in loader:
+        images = split_padded_batch(images.to(device, non_blocking=True), image_sizes)
+        with torch.autocast("cuda", dtype=torch.float16, enabled=str(device).startswith("cuda")):
+            outputs = model(images)
+
+        for output, target in zip(outputs, targets):
+            boxes = output["boxes"].float().cpu()
+            scores = output["scores"].float().cpu()
+            labels = output["labels"].cpu()
+            gt_boxes = target["boxes"]
+            gt_labels = target["labels"]
+
+            for c in torch.unique(torch.cat([labels, gt_labels])).tolist():
+                if c not in per_class:
+                    continue
+                pred_mask = labels == c
+                gt_mask = gt_labels == c
+                s, tp = match_detections(boxes[pred_mask], scores[pred_mask], gt_boxes[gt_mask])
+                per_class[c]["scores"].append(s)
+                per_class[c]["tp"].append(tp)
+                per_class[c]["num_gt"] += int(gt_mask.sum())
+
+    model.train(was_training)
+
+    ap = {}  # clasa -> AP pe fiecare prag IoU
+    for c, acc in per_class.items():
+        scores = np.concatenate(acc["scores"]) if acc["scores"] else np.zeros(0)
+        tp = np.concatenate(acc["tp"]) if acc["tp"] else np.zeros((0, len(IOU_THRESHOLDS)), bool)
+        ap[c] = average_precision(scores, tp, acc["num_gt"])
+
+    evaluated = [a for a in ap.values() if not np.isnan(a).all()]
+    all_ap = np.stack(evaluated) if evaluated else np.zeros((1, len(IOU_THRESHOLDS)))
+    metrics = {
+        "mAP": float(all_ap.mean()),
+        "mAP_50": float(all_ap[:, 0].mean()),
+        "mAP_75": float(all_ap[:, np.searchsorted(IOU_THRESHOLDS, 0.75)].mean()),
+    }
+    for c, a in ap.items():
+        if not np.isnan(a).all():
+            metrics[f"AP_{class_names[c - 1]}"] = float(a.mean())
+    return metrics
@@ -0,0 +1,179 @@
+"""
+Mod de antrenare cu backbone inghetat: caracteristicile FPN calculate o singura data.
+
+Backbone-ul Satlas are toti parametrii cu requires_grad = False, deci iesirea lui pentru o
+imagine e aceeasi in fiecare epoca. Le calculam o data (dupa model.transform, exact ca in
+FasterRCNN.forward), le salvam pe disc in float16 si antrenam doar RPN + ROI heads din ele.
+
+Augmentarea e determinista: pentru fiecare imagine salvam variantele din `variants`
+("orig", "hflip"), iar epoca e foloseste varianta e % len(variants).
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+import torch
+import torch.utils.data as data
+from torchvision.models.detection.image_list import ImageList
+
+FEATURE_CACHE_VERSION = 1
+VARIANTS = ("orig", "hflip")
+CACHE_DTYPES = {"float16": torch.float16, "bfloat16": torch.bfloat16}
+
+
+def feature_cache_exists(cache_dir: str) -> bool:
+    return os.path.exists(os.path.join(cache_dir, "meta.json"))
+
+
+def _apply_variant(img: torch.Tensor, target: dict, variant: str):
+    if variant == "orig":
+        return img, target
+    if variant == "hflip":
+        width = img.shape[-1]
+        boxes = target["boxes"].clone()
+        boxes[:, [0, 2]] = width - target["boxes"][:, [2, 0]]
+        return img.flip(-1), {**target, "boxes": boxes}
+    raise ValueError(f"Unknown augmentation variant {variant!r}")
+
+
+@torch.no_grad()
+def build_feature_cache(
+    model,
+    dataset,
+    cache_dir: str,
+    device: str,
+    variants=VARIANTS,
+    dtype: str = "float16",
+):
+    """
+    Runs model.transform + model.backbone once per (image, variant) of dataset and saves
+    the FPN feature maps (in dtype), the transformed target and the image sizes.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    was_training = model.training
+    model.eval()
+
+    padded_sizes = []
+    for idx in range(len(dataset)):
+        img, target = dataset[idx]
+        img = img.squeeze(0)  # AerialDataset intoarce (1, C, H, W)
+        for variant in variants:
+            img_v, target_v = _apply_variant(img, target, variant)
+            target_v = {k: v.to(device) for k, v in target_v.items()}
+            image_list, targets_t = model.transform([img_v.to(device)], [target_v])
+            features = model.backbone(image_list.tensors)
+
+            torch.save(
+                {
+                    "features": OrderedDict(
+                        (k, v[0].to(CACHE_DTYPES[dtype]).cpu()) for k, v in features.items()
+                    ),
+                    "image_size": tuple(image_list.image_sizes[0]),
+                    "padded_size": tuple(image_list.tensors.shape[-2:]),
+                    "target": {k: v.cpu() for k, v in targets_t[0].items()},
+                },
+                os.path.join(cache_dir, f"{idx:06d}_{variant}.pt"),
+            )
+        # hflip nu schimba dimensiunea: una per imagine, pentru bucketing la antrenare
+        padded_sizes.append(tuple(image_list.tensors.shape[-2:]))
+
+    with open(os.path.join(cache_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": FEATURE_CACHE_VERSION,
+                "count": len(dataset),
+                "variants": list(variants),
+                "dtype": dtype,
+                "padded_sizes": padded_sizes,
+            },
+            f,
+        )
+    model.train(was_training)
+    print(f"[ok] feature cache: {len(dataset)} imagini x {len(variants)} variante -> {cache_dir}")
+
+
+class CachedFeatureDataset(data.Dataset):
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FEATURE_CACHE_VERSION:
+            raise ValueError(f"Feature cache in {cache_dir} has an old format, rebuild it")
+        self.variants = self.meta["variants"]
+        self.variant = self.variants[0]
+
+    def set_epoch(self, epoch: int):
+        """Selects the augmentation variant used in this epoch."""
+        self.variant = self.variants[epoch % len(self.variants)]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def padded_sizes(self) -> list[tuple[int, int]]:
+        """(H, W) after model.transform of every image, for AspectRatioBucketSampler."""
+        if "padded_sizes" not in self.meta:
+            # cache construit inainte ca meta.json sa le tina: citite o data din fisierele .pt
+            self.meta["padded_sizes"] = [
+                tuple(self[idx]["padded_size"]) for idx in range(len(self))
+            ]
+        return [tuple(size) for size in self.meta["padded_sizes"]]
+
+    def __getitem__(self, idx):
+        return torch.load(
+            os.path.join(self.cache_dir, f"{idx:06d}_{self.variant}.pt"),
+            weights_only=True,
+        )
+
+
+def collate_cached_features(batch):
+    """Stacks the feature maps of a batch, zero-padding each level to the largest size."""
+    features = OrderedDict()
+    for name in batch[0]["features"]:
+        maps = [sample["features"][name] for sample in batch]
+        h = max(m.shape[-2] for m in maps)
+        w = max(m.shape[-1] for m in maps)
+        stacked = maps[0].new_zeros((len(maps), maps[0].shape[0], h, w))
+        for i, m in enumerate(maps):
+            stacked[i, :, : m.shape[-2], : m.shape[-1]] = m
+        features[name] = stacked
+
+    padded_h = max(s["padded_size"][0] for s in batch)
+    padded_w = max(s["padded_size"][1] for s in batch)
+    return {
+        "features": features,
+        "image_sizes": [s["image_size"] for s in batch],
+        "padded_size": (padded_h, padded_w),
+        "targets": [s["target"] for s in batch],
+    }
+
+
+def cached_batch_to_device(batch: dict, device: str) -> dict:
+    """Copies the feature maps (as float32) and the targets of a cached batch to device."""
+    return {
+        **batch,
+        "features": OrderedDict(
+            (k, v.to(device, non_blocking=True).float()) for k, v in batch["features"].items()
+        ),
+        "targets": [{k: v.to(device) for k, v in t.items()} for t in batch["targets"]],
+    }
+
+
+def head_forward(model, batch: dict, device: str) -> dict:
+    """
+    FasterRCNN.forward in training mode, starting after the backbone:
+    RPN + ROI heads on the cached feature maps. Returns the loss dict.
+    """
+    # no-op daca batch-ul a fost deja mutat cu cached_batch_to_device
+    batch = cached_batch_to_device(batch, device)
+    features = batch["features"]
+    targets = batch["targets"]
+
+    # RPN-ul (AnchorGenerator) foloseste doar forma tensorului de imagini, nu valorile
+    n = len(targets)
+    placeholder = features[next(iter(features))].new_zeros(()).expand(n, 3, *batch["padded_size"])
+    image_list = ImageList(placeholder, [tuple(s) for s in batch["image_sizes"]])
+
+    proposals, proposal_losses = model.rpn(image_list, features, targets)
+    _, detector_losses = model.roi_heads(features, proposals, image_list.image_sizes, targets)
+    return {**detector_losses, **proposal_losses}
@@ -0,0 +1,119 @@
+"""
+Masuratori de throughput pentru bucla de antrenare (planificare de capacitate).
+
+StepTimer masoara pentru fiecare pas: asteptarea dupa date (DataLoader), copierea
+host->device, forward, backward si pasul optimizer-ului, plus imagini/s si memoria maxima.
+summary() intoarce mediile de la ultimul apel, gata pentru mlflow.log_metrics.
+
+make_profiler construieste un torch.profiler care captureaza o fereastra de pasi
+intr-un trace Chrome (deschis cu chrome://tracing sau Perfetto).
+"""
+
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+import torch
+
+STAGES = ("data_wait", "h2d", "forward", "backward", "optimizer")
+
+
+def current_rss_mb() -> float:
+    """Current resident memory of the process (MB); ru_maxrss (lifetime peak) where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss e in KB pe Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StepTimer:
+    def __init__(self, device: str):
+        self.device = device
+        # pe GPU operatiile sunt asincrone: sincronizam ca timpii sa fie ai etapei respective
+        self.sync = device == "cuda" and torch.cuda.is_available()
+        self._reset()
+
+    def _reset(self):
+        self.totals = {stage: 0.0 for stage in STAGES}
+        self.steps = 0
+        self.images = 0
+        self.window_start = time.perf_counter()
+        if self.sync:
+            torch.cuda.reset_peak_memory_stats()
+        else:
+            # pe CPU maximul e esantionat la sfarsitul fiecarui pas, doar in fereastra curenta
+            self.peak_rss_mb = current_rss_mb()
+
+    def _now(self) -> float:
+        if self.sync:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = self._now()
+        try:
+            yield
+        finally:
+            self.totals[name] += self._now() - start
+
+    def timed_iter(self, loader):
+        """Iterates loader, counting the time spent waiting for each batch as data_wait."""
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.totals["data_wait"] += time.perf_counter() - start
+            yield batch
+
+    def end_step(self, n_images: int):
+        self.steps += 1
+        self.images += n_images
+        if not self.sync:
+            self.peak_rss_mb = max(self.peak_rss_mb, current_rss_mb())
+
+    def peak_memory_mb(self) -> float:
+        """Peak memory since the last summary: allocated CUDA memory, or RSS sampled per step on CPU."""
+        if self.sync:
+            return torch.cuda.max_memory_allocated() / 2**20
+        return max(self.peak_rss_mb, current_rss_mb())
+
+    def summary(self) -> dict:
+        """Per-step averages (ms) since the last summary, images/sec and peak memory; then resets."""
+        elapsed = time.perf_counter() - self.window_start
+        steps = max(self.steps, 1)
+        metrics = {f"time_{stage}_ms": 1000 * total / steps for stage, total in self.totals.items()}
+        metrics["images_per_sec"] = self.images / elapsed if elapsed else 0.0
+        metrics["peak_memory_mb"] = self.peak_memory_mb()
+        self._reset()
+        return metrics
+
+
+def make_profiler(trace_dir: str, wait: int = 5, warmup: int = 2, active: int = 5):
+    """
+    torch.profiler capturing `active` steps after `wait` + `warmup` steps (call .step() every
+    training step); the trace is written to trace_dir/trace.json.
+    """
+    os.makedirs(trace_dir, exist_ok=True)
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    def on_trace_ready(prof):
+        prof.export_chrome_trace(os.path.join(trace_dir, "trace.json"))
+        print(f"Profiler trace saved to {trace_dir}")
+
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+        on_trace_ready=on_trace_ready,
+        record_shapes=True,
+        profile_memory=True,
+    )
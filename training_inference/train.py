@@ -1,28 +1,62 @@
 import os
 import sys
-import xml.etree.ElementTree as ET
 
 import torch
 import torch.utils.data as data
 from torch.utils.data import DataLoader
 import torch.optim as optim
 
-from torchvision.models.detection import FasterRCNN
-from torchvision.ops import MultiScaleRoIAlign
-
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.feature_extractor import load_satlas_backbone
 from src.transformation import transform_image_to_ndarray, transform_for_inference
+from training_inference.dataset_cache import (
+    CLASSES,
+    NAME_TO_ID,
+    DatasetCache,
+    build_dataset_cache,
+    cache_exists,
+    cache_is_current,
+    parse_voc_annotation,
+)
+from training_inference.batching import (
+    AspectRatioBucketSampler,
+    collate_padded,
+    dataset_image_sizes,
+    split_padded_batch,
+)
+from training_inference.feature_cache import (
+    CachedFeatureDataset,
+    build_feature_cache,
+    cached_batch_to_device,
+    collate_cached_features,
+    feature_cache_exists,
+    head_forward,
+)
+from training_inference.detector import build_detector, detector_state_dict
+from training_inference.evaluation import evaluate_detector
+from training_inference.instrumentation import StepTimer, make_profiler
 
 import mlflow
 from tqdm import tqdm
 from torch.cuda.amp import autocast, GradScaler
 
-CLASSES = ["SMV", "LMV", "AFV", "MCV", "CV"]
-NAME_TO_ID = {name: i + 1 for i, name in enumerate(CLASSES)}
-
 EXPERIMENT_NAME = os.getenv("MLFLOW_EXPERIMENT_NAME", "satlas_experiments")
+# folder pentru cache-ul pre-procesat (vezi dataset_cache.py); gol = citim direct XML/JPEG
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "")
+# folder pentru caracteristicile FPN pre-calculate (vezi feature_cache.py); gol = backbone rulat la fiecare pas
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "")
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 4))
+# la cati pasi logam in MLflow timpii pe etape, imagini/s si memoria maxima
+LOG_INTERVAL = int(os.getenv("LOG_INTERVAL", 50))
+# PROFILE=1 -> torch.profiler pe o fereastra de pasi, trace-ul e salvat ca artifact MLflow
+PROFILE = os.getenv("PROFILE", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiler_traces")
+# la cate epoci evaluam mAP pe setul de validare (0 = fara evaluare)
+EVAL_INTERVAL = int(os.getenv("EVAL_INTERVAL", 1))
+# unde salvam weights-urile detectorului la final (citite de detection_engine.py)
+DETECTOR_OUT = os.getenv(
+    "DETECTOR_OUT", "/workspace/training_inference/models/faster_rcnn_satlas.pth"
+)
 
 print(f"MLFLOW_TRACKING_URI: {os.getenv('MLFLOW_TRACKING_URI', '(not set)')}")
 print(f"MLFLOW_EXPERIMENT_NAME: {EXPERIMENT_NAME}")
@@ -32,108 +66,96 @@ if EXPERIMENT_NAME:
 
 
 class AerialDataset(data.Dataset):
-    def __init__(self, root, img_dir="images", ann_dir="annotations", transforms=None):
+    def __init__(
+        self,
+        root,
+        img_dir="images",
+        ann_dir="annotations",
+        transforms=None,
+        cache_dir=None,
+    ):
         self.root = root
         self.img_dir = os.path.join(root, img_dir)
         self.ann_dir = os.path.join(root, ann_dir)
-        self.ids = [
-            os.path.splitext(f)[0]
-            for f in os.listdir(self.img_dir)
-            if f.endswith(".jpg")
-        ]
         self.transforms = transforms
 
+        # cu cache: imaginile decodate + box-urile sunt citite din dataset_cache, fara listdir/XML/JPEG
+        self.cache = None
+        if cache_dir:
+            if not cache_is_current(cache_dir, self.img_dir, self.ann_dir, NAME_TO_ID):
+                # lipsa, format vechi sau imagini / adnotari schimbate de la build
+                action = "Rebuilding stale" if cache_exists(cache_dir) else "Building"
+                print(f"{action} dataset cache in {cache_dir}...")
+                build_dataset_cache(self.img_dir, self.ann_dir, cache_dir, NAME_TO_ID)
+            self.cache = DatasetCache(cache_dir)
+            self.ids = self.cache.ids
+        else:
+            self.ids = [
+                os.path.splitext(f)[0]
+                for f in os.listdir(self.img_dir)
+                if f.endswith(".jpg")
+            ]
+
     def __len__(self):
         return len(self.ids)
 
     def __getitem__(self, idx):
-        img_id = self.ids[idx]
-        img_path = os.path.join(self.img_dir, img_id + ".jpg")
-        ann_path = os.path.join(self.ann_dir, img_id + ".xml")
+        if self.cache is not None:
+            img = self.cache.image(idx)
+            boxes, labels = self.cache.target(idx)
+        else:
+            img_id = self.ids[idx]
+            img_path = os.path.join(self.img_dir, img_id + ".jpg")
+            ann_path = os.path.join(self.ann_dir, img_id + ".xml")
 
-        img = transform_image_to_ndarray(img_path)
-        img = transform_for_inference(img)
+            img = transform_image_to_ndarray(img_path)
+            boxes, labels = parse_voc_annotation(ann_path, NAME_TO_ID)
 
-        boxes = []
-        labels = []
-
-        tree = ET.parse(ann_path)
-        root = tree.getroot()
-        for obj in root.findall("object"):
-            name = obj.find("name").text
-            if name not in NAME_TO_ID:
-                continue
-            label = NAME_TO_ID[name]
-
-            bnd = obj.find("bndbox")
-            xmin = float(bnd.find("xmin").text)
-            ymin = float(bnd.find("ymin").text)
-            xmax = float(bnd.find("xmax").text)
-            ymax = float(bnd.find("ymax").text)
-
-            boxes.append([xmin, ymin, xmax, ymax])
-            labels.append(label)
-
-        if len(boxes) == 0:
-            boxes = torch.zeros((0, 4), dtype=torch.float32)
-            labels = torch.zeros((0,), dtype=torch.int64)
-        else:
-            boxes = torch.tensor(boxes, dtype=torch.float32)
-            labels = torch.tensor(labels, dtype=torch.int64)
+        img = transform_for_inference(img)
 
         target = {
-            "boxes": boxes,
-            "labels": labels,
+            "boxes": torch.tensor(boxes, dtype=torch.float32),
+            "labels": torch.tensor(labels, dtype=torch.int64),
             "image_id": torch.tensor([idx]),
         }
 
         return img, target
 
 
-class SatlasBackboneWrapper(torch.nn.Module):
-    def __init__(self, satlas_model, out_channels=256):
-        super().__init__()
-        self.backbone = satlas_model
-        self.out_channels = out_channels
-
-    def forward(self, x):
-        feats = self.backbone(x)
-        if isinstance(feats, (list, tuple)):
-            return {str(i): f for i, f in enumerate(feats)}
-        return {"0": feats}
-
-
-def collate_fn(batch):
-    images, targets = list(zip(*batch))
-    return list(images), list(targets)
-
-
 train_dataset = AerialDataset(
     root="/workspace/training_inference/data/MVRSD/",
     img_dir="images/train",
     ann_dir="labels/train/xml",
+    cache_dir=os.path.join(DATASET_CACHE_DIR, "train") if DATASET_CACHE_DIR else None,
 )
 
 val_dataset = AerialDataset(
     root="/workspace/training_inference/data/MVRSD/",
     img_dir="images/val",
     ann_dir="labels/val/xml",
+    cache_dir=os.path.join(DATASET_CACHE_DIR, "val") if DATASET_CACHE_DIR else None,
 )
 
+# batch-uri cu imagini de forme apropiate (aspect ratio + arie), padate intr-un singur tensor
+train_sampler = AspectRatioBucketSampler(
+    dataset_image_sizes(train_dataset), BATCH_SIZE, shuffle=True
+)
 train_loader = DataLoader(
     train_dataset,
-    batch_size=1,
-    shuffle=False,
+    batch_sampler=train_sampler,
     num_workers=4,
-    collate_fn=collate_fn,
+    collate_fn=collate_padded,
+    pin_memory=torch.cuda.is_available(),
 )
 
 val_loader = DataLoader(
     val_dataset,
-    batch_size=1,
-    shuffle=False,
+    batch_sampler=AspectRatioBucketSampler(
+        dataset_image_sizes(val_dataset), BATCH_SIZE, shuffle=False
+    ),
     num_workers=4,
-    collate_fn=collate_fn,
+    collate_fn=collate_padded,
+    pin_memory=torch.cuda.is_available(),
 )
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
@@ -145,26 +167,27 @@ print(f"Using device: {DEVICE}")
 print(f"Model ID: {MODEL_ID}")
 print(f"Checkpoint: {CHECKPOINT_PATH if CHECKPOINT_PATH else 'None'}")
 
-satlas_model = load_satlas_backbone(MODEL_ID, CHECKPOINT_PATH)
-satlas_model.to(DEVICE)
-backbone = SatlasBackboneWrapper(satlas_model, out_channels=128)
-backbone = torch.compile(backbone, mode="max-autotune")
+print("Building detector (Satlas backbone frozen)...")
+model = build_detector(MODEL_ID, CHECKPOINT_PATH, DEVICE, compile=True)
 print(
-    f"Backbone number of parameters {sum([p.numel() for p in backbone.parameters()])}"
+    f"Backbone number of parameters {sum([p.numel() for p in model.backbone.parameters()])}"
 )
-num_classes = len(CLASSES) + 1
-print("Freezing Satlas backbone...")
-for name, p in backbone.named_parameters():
-    p.requires_grad = False
-model = FasterRCNN(
-    backbone=backbone,
-    num_classes=num_classes,
-    box_roi_pool=MultiScaleRoIAlign(
-        featmap_names=["0", "1", "2", "3"],  # keys produced in wrapper
-        output_size=7,
-        sampling_ratio=2,
-    ),
-).to(DEVICE)
+
+# backbone-ul e inghetat -> iesirile lui sunt calculate o singura data si refolosite in fiecare epoca
+feature_dataset = None
+if FEATURE_CACHE_DIR:
+    if not feature_cache_exists(FEATURE_CACHE_DIR):
+        print(f"Building feature cache in {FEATURE_CACHE_DIR}...")
+        build_feature_cache(model, train_dataset, FEATURE_CACHE_DIR, DEVICE)
+    feature_dataset = CachedFeatureDataset(FEATURE_CACHE_DIR)
+    # aceleasi bucket-uri ca pe calea normala, dupa dimensiunea padata din cache; ordine noua la fiecare epoca
+    train_sampler = AspectRatioBucketSampler(feature_dataset.padded_sizes(), BATCH_SIZE, shuffle=True)
+    train_loader = DataLoader(
+        feature_dataset,
+        batch_sampler=train_sampler,
+        num_workers=4,
+        collate_fn=collate_cached_features,
+    )
 
 params = [p for p in model.parameters() if p.requires_grad]
 
@@ -179,33 +202,86 @@ print(
 )
 
 scaler = GradScaler()
+timer = StepTimer(DEVICE)
+profiler = make_profiler(PROFILE_DIR) if PROFILE else None
+global_step = 0
 
 with mlflow.start_run():
-    # mlflow.log_param("model_id", MODEL_ID)
-    # mlflow.log_param("lr", 1e-4)
-    # mlflow.log_param("epochs", num_epochs)
-    # mlflow.log_param("device", DEVICE)
+    mlflow.log_param("model_id", MODEL_ID)
+    mlflow.log_param("lr", 1e-4)
+    mlflow.log_param("epochs", num_epochs)
+    mlflow.log_param("device", DEVICE)
+    mlflow.log_param("batch_size", BATCH_SIZE)
+    mlflow.log_param("feature_cache", feature_dataset is not None)
+
+    if profiler is not None:
+        profiler.start()
 
     for epoch in range(num_epochs):
         running_loss = 0.0
+        if feature_dataset is not None:
+            feature_dataset.set_epoch(epoch)  # varianta de augmentare a epocii
+        train_sampler.set_epoch(epoch)
+
+        for batch in tqdm(timer.timed_iter(train_loader), total=len(train_loader)):
+            with timer.stage("h2d"):
+                if feature_dataset is not None:
+                    batch = cached_batch_to_device(batch, DEVICE)
+                    n_images = len(batch["targets"])
+                else:
+                    images, image_sizes, targets = batch
+                    # o singura copiere host->device pentru tot batch-ul
+                    images = images.to(DEVICE, non_blocking=True)
+                    images = split_padded_batch(images, image_sizes)
+                    targets = [{k: v.to(DEVICE) for k, v in t.items()} for t in targets]
+                    n_images = len(images)
 
-        for images, targets in tqdm(train_loader):
-            images = [img.squeeze(0).to(DEVICE) for img in images]
-
-            targets = [{k: v.to(DEVICE) for k, v in t.items()} for t in targets]
             optimizer.zero_grad()
 
-            with autocast(dtype=torch.float16, enabled=(DEVICE == "cuda")):
-                loss_dict = model(images, targets)  # Faster R-CNN
-                loss = sum(loss for loss in loss_dict.values())
+            with timer.stage("forward"):
+                with autocast(dtype=torch.float16, enabled=(DEVICE == "cuda")):
+                    if feature_dataset is not None:
+                        loss_dict = head_forward(model, batch, DEVICE)  # doar RPN + ROI heads
+                    else:
+                        loss_dict = model(images, targets)  # Faster R-CNN
+                    loss = sum(loss for loss in loss_dict.values())
+
+            with timer.stage("backward"):
+                scaler.scale(loss).backward()
 
-            scaler.scale(loss).backward()
-            scaler.step(optimizer)
-            scaler.update()
+            with timer.stage("optimizer"):
+                scaler.step(optimizer)
+                scaler.update()
 
             running_loss += loss.item()
+            timer.end_step(n_images)
+            global_step += 1
+
+            if global_step % LOG_INTERVAL == 0:
+                mlflow.log_metrics(timer.summary(), step=global_step)
+                mlflow.log_metric("step_loss", loss.item(), step=global_step)
+            if profiler is not None:
+                profiler.step()
 
         # lr_scheduler.step()
         avg_loss = running_loss / max(1, len(train_loader))
         print(f"Epoch {epoch + 1}/{num_epochs}, train loss: {avg_loss:.4f}")
-        mlflow.log_metric("train_loss", avg_train_loss, step=epoch)
+        mlflow.log_metric("train_loss", avg_loss, step=epoch)
+
+        if EVAL_INTERVAL and (epoch + 1) % EVAL_INTERVAL == 0:
+            val_metrics = evaluate_detector(model, val_loader, DEVICE, CLASSES)
+            print(
+                f"Epoch {epoch + 1}/{num_epochs}, val mAP: {val_metrics['mAP']:.4f}, "
+                f"mAP@0.5: {val_metrics['mAP_50']:.4f}"
+            )
+            mlflow.log_metrics({f"val_{k}": v for k, v in val_metrics.items()}, step=epoch)
+
+    if profiler is not None:
+        profiler.stop()
+        if os.path.isdir(PROFILE_DIR):
+            mlflow.log_artifacts(PROFILE_DIR, artifact_path="profiler")
+
+    os.makedirs(os.path.dirname(DETECTOR_OUT) or ".", exist_ok=True)
+    torch.save(detector_state_dict(model), DETECTOR_OUT)
+    mlflow.log_artifact(DETECTOR_OUT, artifact_path="detector")
+    print(f"Detector weights saved to {DETECTOR_OUT}")